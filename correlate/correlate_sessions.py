@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Correlate all the sessions found in a root folder, in batch mode (see correlate_with_log.py --batch).
+Several sessions are processed at the same time, each one in its own process, and each session
+keeps its own correlate.log file.
+'''
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from correlate_with_log import correlate_session, failed_reports, logger, formatter, stream_handler, logfile_name
+
+SESSION_LOG_PREFIX = "cam_log_"
+SUMMARY_FILENAME = "correlate_summary.json"
+
+
+def find_sessions(root):
+    '''
+    Find the session folders under root. A session folder contains a cam_log_*.log file
+    written by the Raspberry Pi. The subfolders of a session aren't searched.
+    :param root: the folder to search in
+    :return: a sorted list of session folders
+    '''
+    sessions = []
+    for folder, sub_folders, files in os.walk(root):
+        if any(f.startswith(SESSION_LOG_PREFIX) and f.lower().endswith(".log") for f in files):
+            sessions.append(folder)
+            sub_folders[:] = []
+        else:
+            sub_folders.sort()
+    return sorted(sessions)
+
+
+@contextlib.contextmanager
+def session_log(path):
+    '''
+    Send the prints and the log messages to a session log file, instead of the console
+    '''
+    with open(path, "w") as log_file, contextlib.redirect_stdout(log_file):
+        handler = logging.StreamHandler(log_file)
+        handler.setFormatter(formatter)
+        logger.removeHandler(stream_handler)
+        logger.addHandler(handler)
+        try:
+            yield log_file
+        finally:
+            logger.removeHandler(handler)
+            logger.addHandler(stream_handler)
+
+
+def run_session(source, profile, options, allow_missing=False):
+    '''
+    Correlate a session folder. This function runs inside the worker processes, so nothing is
+    raised: the errors are written in the session log and returned in the summary.
+    :param source: the session folder
+    :param profile: Profile's name of the multicam settings
+    :param options: a dict with the correlate_session keyword arguments
+    :param allow_missing: a camera without pictures or without log isn't an error
+    :return: a dict with the session summary
+    '''
+    summary = {"session": source, "status": "ok", "error": None, "reports": [], "duration": None}
+    start = time.time()
+    with session_log(os.path.join(source, logfile_name)):
+        try:
+            summary["reports"] = correlate_session(source, profile, **options)
+            failed = failed_reports(summary["reports"], allow_missing)
+            if failed:
+                summary["status"] = ", ".join(sorted(set(report["status"] for report in failed)))
+        except Exception as e:
+            traceback.print_exc(file=sys.stdout)
+            summary["status"] = "error"
+            summary["error"] = "{0}: {1}".format(type(e).__name__, e)
+    summary["duration"] = round(time.time() - start, 1)
+    return summary
+
+
+def correlate_sessions(sessions, profile, options, jobs=None, allow_missing=False):
+    '''
+    Correlate several sessions with a process pool
+    :param sessions: the list of the session folders
+    :param profile: Profile's name of the multicam settings
+    :param options: a dict with the correlate_session keyword arguments
+    :param jobs: how many sessions are processed at the same time. None means one per cpu
+    :param allow_missing: a camera without pictures or without log isn't an error
+    :return: the list of the session summaries, in the same order as sessions
+    '''
+    summaries = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(run_session, source, profile, options, allow_missing): source for source in sessions}
+        for future in as_completed(futures):
+            summary = future.result()
+            summaries[futures[future]] = summary
+            print("{0:>3}/{1} {2} : {3}".format(len(summaries), len(sessions), summary["session"], summary["status"]))
+    return [summaries[source] for source in sessions]
+
+
+def print_summary(summaries, root):
+    '''
+    Print a table with the result of each session and each camera
+    '''
+    print("=" * 80)
+    print("{0:40} {1:20} {2:>8}  {3}".format("Session", "Status", "Time (s)", "Cameras (algorithm deviation)"))
+    print("-" * 80)
+    for summary in summaries:
+        cameras = ", ".join("{0}: {1} {2}".format(report["camera"], report["algorithm"],
+                                                  "-" if report["deviation"] is None else "{0:.3f}".format(report["deviation"]))
+                            for report in summary["reports"])
+        print("{0:40} {1:20} {2:>8}  {3}".format(os.path.relpath(summary["session"], root), summary["status"],
+                                                 summary["duration"], cameras or summary["error"]))
+    print("=" * 80)
+    failed = [summary for summary in summaries if summary["status"] != "ok"]
+    print("{0} sessions, {1} ok, {2} failed".format(len(summaries), len(summaries) - len(failed), len(failed)))
+
+
+def arg_parse():
+    parser = argparse.ArgumentParser(description="Correlate all the V4MPOD sessions found in a folder, in batch mode")
+    parser.add_argument('--version', action='version', version='0.1')
+    parser.add_argument("root", help="Folder containing the sessions folders")
+    parser.add_argument("profile", help="Profile's name of the multicam settings")
+    parser.add_argument("-j", "--jobs", help="Number of sessions processed at the same time. Default is one per cpu",
+                        default=None, type=int)
+    parser.add_argument("--workers", help="Number of processes used to read the pictures exif data, for each session",
+                        default=1, type=int)
+    parser.add_argument("-t", "--time_offset",
+                        help="Time offset between GPX and photos. If your camera is ahead by one minute, time_offset is 60.",
+                        default=0, type=float)
+    parser.add_argument("--delta", help="Delta between the log and the pictures, in seconds, for the nearest time algorithm",
+                        default=None, type=float)
+    parser.add_argument("--max_deviation", help="Maximum standard deviation between the log and the pictures, in seconds",
+                        default=None, type=float)
+    parser.add_argument("-w", "--write_exif", help="Write the new exif tags in the images", action="store_true")
+    parser.add_argument("--resume", help="When writing the exif data, skip the pictures already written by a previous run",
+                        action="store_true")
+    parser.add_argument("-x", "--exclude_close_pic", help="Move the too close pictures to the exluded folder", action="store_true")
+    parser.add_argument("--no_cache", help="Don't use the exif cache file stored in the sessions folders", action="store_true")
+    parser.add_argument("--allow_missing", help="A camera without pictures or without log isn't an error",
+                        action="store_true")
+
+    args = parser.parse_args()
+    print(args)
+    return args
+
+
+if __name__ == '__main__':
+    args = arg_parse()
+    sessions = find_sessions(args.root)
+    if not sessions:
+        print("No session found in {0}... Exiting...".format(args.root))
+        sys.exit()
+    print("{0} sessions found".format(len(sessions)))
+
+    options = {"time_offset": args.time_offset, "delta": args.delta, "max_deviation": args.max_deviation,
+               "write_exif": args.write_exif, "resume": args.resume, "exclude_close_pic": args.exclude_close_pic,
+               "workers": args.workers, "use_cache": not args.no_cache}
+    summaries = correlate_sessions(sessions, args.profile, options, args.jobs, args.allow_missing)
+    print_summary(summaries, args.root)
+    with open(os.path.join(args.root, SUMMARY_FILENAME), "w") as summary_file:
+        json.dump(summaries, summary_file, indent=2)
+    sys.exit(1 if any(summary["status"] != "ok" for summary in summaries) else 0)
@@ -5,22 +5,31 @@
 
 import argparse
 import datetime
+import json
+import math
 import os
 import sys
 import time
-import pyproj
 import urllib.request, urllib.parse, urllib.error
 import urllib.parse
 import logging
 import xml.etree.ElementTree as ET
 from builtins import input
-from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 from dateutil.tz import tzlocal
 from lib.exif_read import ExifRead as EXIF
-from lib.exif_write import ExifEdit
-from lib.geo import interpolate_lat_lon
-from lib.gps_parser import get_lat_lon_time_from_gpx, get_lat_lon_time_from_nmea
+from lib.exif_scan import list_jpeg, scan_capture_times
+from lib.exif_cache import ExifCache
+from lib.camera_table import CameraTable, Master_Picture_infos, Picture_infos, New_Picture_infos, log_infos, datetimes_to_epoch, \
+    epoch_to_datetime
+from lib.scoring import delta_stats, stats_of_deltas, IncrementalScore
+from lib.log_parser import iter_log
+from lib.align import align_times, find_missing_pictures, consensus_missing_pictures
+from lib.exif_write import ExifEdit, WriteJournal, WRITE_IN_PLACE, WRITE_REWRITE
+from lib.geo import Track, WGS84_GEOD
+from lib.gps_parser import load_track
 
 logfile_name = "correlate.log"
 # source for logging : http://sametmax.com/ecrire-des-logs-en-python/
@@ -32,28 +41,37 @@ logger.setLevel(logging.INFO)
 # création d'un formateur qui va ajouter le temps, le niveau
 # de chaque message quand on écrira un message dans le log
 formatter = logging.Formatter('%(asctime)s :: %(levelname)s :: %(message)s')
-# création d'un handler qui va rediriger une écriture du log vers
-# un fichier
-file_handler = logging.FileHandler(logfile_name, 'w')
-# on lui met le niveau sur DEBUG, on lui dit qu'il doit utiliser le formateur
-# créé précédement et on ajoute ce handler au logger
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
- 
 # création d'un second handler qui va rediriger chaque écriture de log
 # sur la console
 stream_handler = logging.StreamHandler()
 stream_handler.setLevel(logging.INFO)
 logger.addHandler(stream_handler)
 
-Master_Picture_infos = namedtuple('Picture_infos', ['path', 'DateTimeOriginal', 'SubSecTimeOriginal', 'Latitude', 'Longitude', 'Ele'])
-Picture_infos = Master_Picture_infos(path=None, DateTimeOriginal=None, SubSecTimeOriginal=None, Latitude=None, Longitude=None, Ele=None)
-New_Picture_infos = namedtuple('New_Picture_infos',
-                               ['path', 'DateTimeOriginal', 'SubSecTimeOriginal', "New_DateTimeOriginal",
-                                "New_SubSecTimeOriginal", "Longitude", "Latitude", "Ele", "ImgDirection"])
-log_infos = namedtuple('log_infos',
-                       ['log_timestamp', 'action', 'return_timestamp', 'time_to_answer', 'cam_return', 'pic_number', ])
+
+def set_log_file(path):
+    """Redirect the log to a new file. The previous log file, if any, is closed.
+    Nothing is written in a log file until this function is called.
+    :param path: the log file path
+    :return: the new file handler"""
+    global file_handler
+    if file_handler is not None:
+        logger.removeHandler(file_handler)
+        file_handler.close()
+    # création d'un handler qui va rediriger une écriture du log vers
+    # un fichier
+    file_handler = logging.FileHandler(path, 'w')
+    # on lui met le niveau sur DEBUG, on lui dit qu'il doit utiliser le formateur
+    # créé précédement et on ajoute ce handler au logger
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    return file_handler
+
+file_handler = None
+
+# in batch mode, a correlation with a higher standard deviation (in seconds) is a failure
+DEFAULT_MAX_DEVIATION = 0.5
+REPORT_FILENAME = "correlate_report_{0}.json"
 
 
 # NOTE : modif dans lib.exifedit.py
@@ -81,8 +99,8 @@ class Cam_Infos:
         self.distance_from_center = distance_from_center
         self.log_pos = logpos
         self.log_list = log
-        self.image_list = None
-        self.new_image_list = None
+        self.images = None
+        self.table = None
         self.log_count = None
         self.pic_count = None
         
@@ -90,7 +108,11 @@ class Cam_Infos:
         self.log_count = 0
         self.log_list = []
         for i, log_line in enumerate(loglist):
-            this_cam_return = True if int(log_line.cam_return[0 - (self.log_pos + 1)]) == 1 else False
+            cam_return = log_line.cam_return
+            if isinstance(cam_return, str):
+                # bits string, as in the first versions of parse_log
+                cam_return = int(cam_return, 2)
+            this_cam_return = cam_return >> self.log_pos & 1 == 1
             self.log_list.append(log_infos(log_line.log_timestamp,
                                                 log_line.action,
                                                 log_line.return_timestamp,
@@ -101,38 +123,26 @@ class Cam_Infos:
             if this_cam_return is True:
                 self.log_count += 1
 
-    def get_image_list(self, path_to_pics):
+    def get_image_list(self, path_to_pics, workers=1, cache=None):
         """
         Create a list of image tuples sorted by capture timestamp.
         @param directory: directory with JPEG files
         @return: a list of image tuples with time, directory, lat,long...
         :param path_to_pics:
+        :param workers: number of processes used to read the exif data
+        :param cache: an ExifCache object
         """
         print("Searching for jpeg images in ", path_to_pics, end=" ")
-        file_list = []
-        for root, sub_folders, files in os.walk(path_to_pics):
-            file_list += [os.path.join(root, filename) for filename in files if filename.lower().endswith(".jpg")]
-
-        files = []
-        # get DateTimeOriginal data from the images and sort the list by timestamp
-        for filepath in file_list:
-            #print(filepath)
-            metadata = EXIF(filepath)
-            try:
-                t = metadata.extract_capture_time()
-                s = int(t.microsecond / 1000000)
-                files.append(Picture_infos._replace(path=filepath, DateTimeOriginal = t, SubSecTimeOriginal = s))
-                # print t
-                # print type(t)
-            except KeyError as e:
-                # if any of the required tags are not set the image is not added to the list
-                print("Skipping {0}: {1}".format(filepath, e))
+        files = scan_capture_times([list_jpeg(path_to_pics)], workers, cache=cache)[0]
+        self.set_image_list(files)
 
-        files.sort(key=lambda file: file.DateTimeOriginal)
-        # print_list(files)
-        
-        self.image_list = files
-        self.pic_count = len(self.image_list)
+    def set_image_list(self, files):
+        """
+        Store the result of an exif scan in a CameraTable
+        :param files: a list of (path, capture time) tuples, sorted by capture time
+        """
+        self.images = CameraTable.from_files(files)
+        self.pic_count = len(self.images)
         print("{:5} found".format(self.pic_count))
         
     
@@ -158,31 +168,26 @@ class Cam_Infos:
 
         if self.pic_count > self.log_count:
             print("1st log - 1st image :        {0} - {1}".format(self.log_list[0].log_timestamp,
-                                                                  self.image_list[0].DateTimeOriginal))
+                                                                  epoch_to_datetime(self.images.time[0])))
             print("2th log - 2th image :        {0} - {1}".format(self.log_list[1].log_timestamp,
-                                                                  self.image_list[1].DateTimeOriginal))
+                                                                  epoch_to_datetime(self.images.time[1])))
             print("...")
             print("last-1 log - last-1 image : {0} - {1}".format(self.log_list[-2].log_timestamp,
-                                                                 self.image_list[-2].DateTimeOriginal))
+                                                                 epoch_to_datetime(self.images.time[-2])))
             print("last log - last image :       {0} - {1}".format(self.log_list[-1].log_timestamp,
-                                                                   self.image_list[-1].DateTimeOriginal))
+                                                                   epoch_to_datetime(self.images.time[-1])))
 
     def filter_images(self):
         """
-        Filter the new_image list to remove the "False" and "path=None" items
+        Filter the correlated pictures (self.table) to remove the empty rows and the virtual pictures
         """
-        #TODO vérfier pourquoi j'ai du False et du None. Peut-être tout basculer
-        #sur la même valeur None OU False.
-        piclist = [j for j in self.new_image_list if isinstance(j, New_Picture_infos)]
-        piclist = [j for j in piclist if j.path is not None]
-        self.new_image_list = piclist
+        self.table = self.table.filter()
 
     def filter_no_latlon(self):
         """
-        Filter the new_image_list to remove the pictures without lat/long data
+        Filter the correlated pictures to remove the pictures without lat/long data
         """
-        piclist = [j for j in self.new_image_list if j.Latitude]
-        self.new_image_list = piclist
+        self.table = self.table.filter_no_latlon()
         
 class Cam_Group(list):
     def __init__(self, cam_list=[], name=None):
@@ -200,9 +205,18 @@ class Cam_Group(list):
         for cam in self:
             cam.add_log(loglist)
             
-    def get_image_list(self):
-        for cam in self:
-            cam.get_image_list(cam.source_dir)
+    def get_image_list(self, workers=None, cache=None):
+        """
+        Read the exif data of all the cameras at once, with a process pool shared
+        between the cameras.
+        :param workers: number of processes. None means one per cpu.
+        :param cache: an ExifCache object
+        """
+        print("Searching for jpeg images in ", ", ".join(cam.source_dir for cam in self))
+        file_lists = [list_jpeg(cam.source_dir) for cam in self]
+        for cam, files in zip(self, scan_capture_times(file_lists, workers, cache=cache)):
+            print(cam.name, end=" ")
+            cam.set_image_list(files)
         
     def filter_images(self, data=False, latlon=False):
         if data:
@@ -233,60 +247,103 @@ def list_geoimages(directory):
     @param directory: directory with JPEG files
     @return: a list of image tuples with time, directory, lat,long...
     """
-    file_list = []
-    for root, sub_folders, files in os.walk(directory):
-        file_list += [os.path.join(root, filename) for filename in files if filename.lower().endswith(".jpg")]
+    file_list = list_jpeg(directory)
 
     files = []
     # get DateTimeOriginal data from the images and sort the list by timestamp
-    for filepath in file_list:
-        metadata = EXIF(filepath)
-        try:
-            t = metadata.extract_capture_time()
-            s = int(t.microsecond / 1000000)
-            geo = metadata.extract_geo()
-            lat = geo.get("latitude")
-            lon = geo.get("longitude")
-            ele = geo.get("altitude")
-            files.append(Picture_infos._replace(path=filepath, DateTimeOriginal = t, SubSecTimeOriginal = s,
-                                                                Latitude = lat, Longitude = lon, Ele = ele))
-            # print t
-            # print type(t)
-        except KeyError as e:
-            # if any of the required tags are not set the image is not added to the list
-            print("Skipping {0}: {1}".format(filepath, e))
+    with ExifCache(directory) as exif_cache:
+        for filepath in file_list:
+            try:
+                metadata = exif_cache.read(filepath, EXIF)
+                t = metadata.capture_time
+                s = int(t.microsecond / 1000000)
+                files.append(Picture_infos._replace(path=filepath, DateTimeOriginal = t, SubSecTimeOriginal = s,
+                                                                    Latitude = metadata.latitude, Longitude = metadata.longitude,
+                                                                    Ele = metadata.altitude))
+            except KeyError as e:
+                # if any of the required tags are not set the image is not added to the list
+                print("Skipping {0}: {1}".format(filepath, e))
 
     files.sort(key=lambda file: file.DateTimeOriginal)
     # print_list(files)
     return files
 
 
-def write_metadata(image_lists):
+def new_exif_tags(image):
+    """
+    The new exif tags of an image, as stored in the write journal
+    :param image: a New_Picture_infos namedtuple
+    :return: a dict
+    """
+    return {"DateTimeOriginal": image.New_DateTimeOriginal.isoformat(),
+            "Latitude": image.Latitude,
+            "Longitude": image.Longitude,
+            "ImgDirection": image.ImgDirection,
+            "Ele": image.Ele}
+
+
+def write_image_list_metadata(image_list, journal):
+    """
+    Write the exif metadata in the jpeg files of one camera, and record each image in the journal
+    :param image_list: A list of New_Picture_infos namedtuple
+    :param journal: a WriteJournal object, the images already in it are skipped
+    :return: a dict with the count of each write mode (and "skipped"), and the size of the written files
+    """
+    write_modes = {WRITE_IN_PLACE: 0, WRITE_REWRITE: 0, None: 0, "skipped": 0}
+    written_bytes = 0
+    for image in image_list:
+        tags = new_exif_tags(image)
+        if journal.is_done(image.path, tags):
+            write_modes["skipped"] += 1
+            continue
+        # the lists built by the correlation use '' for the missing values, the CameraTable uses None
+        metadata = ExifEdit(image.path)
+        metadata.add_date_time_original(image.New_DateTimeOriginal)
+
+        if image.Latitude not in ("", None) and image.Longitude not in ("", None):
+            metadata.add_lat_lon(image.Latitude, image.Longitude)
+
+        if image.ImgDirection not in ("", None):
+            metadata.add_direction(image.ImgDirection)
+
+        if image.Ele != "" and image.Ele is not None:
+            metadata.add_altitude(image.Ele)
+        write_mode = metadata.write()
+        write_modes[write_mode] += 1
+        if write_mode is not None:
+            journal.add(image.path, tags)
+            written_bytes += os.path.getsize(image.path)
+
+    return write_modes, written_bytes
+
+
+def write_metadata(image_lists, journal_directory, resume=False):
     """
-    Write the exif metadata in the jpeg file
+    Write the exif metadata in the jpeg file.
+    Each camera is written by its own thread, as they are usually on different disks.
     :param image_lists : A list in list of New_Picture_infos namedtuple
+    :param journal_directory: the directory where the write journal is stored
+    :param resume: skip the images already written by a previous run, according to the journal
     """
-    for image_list in image_lists:
-        for image in image_list:
-            #TODO dans ces if, chercher pourquoi j'ai '' comme valeur, au lieu de None, ce qui
-            #rendrait la condition plus lisible (if image.Latitude is not None:)
-            # metadata = pyexiv2.ImageMetadata(image.path)
-            metadata = ExifEdit(image.path)
-            # metadata.read()
-            metadata.add_date_time_original(image.New_DateTimeOriginal)
-            # metadata.add_subsec_time_original(image.New_SubSecTimeOriginal)
-            
-            if image.Latitude != "" and image.Longitude != "":
-                #import pdb; pdb.set_trace()
-                metadata.add_lat_lon(image.Latitude, image.Longitude)
-                
-            if image.ImgDirection != "":
-                metadata.add_direction(image.ImgDirection)
-                
-            if image.Ele != "" and image.Ele is not None:
-                metadata.add_altitude(image.Ele)
-            metadata.write()
-            print('Writing new Exif metadata to ', image.path)
+    start_time = time.time()
+    write_modes = {WRITE_IN_PLACE: 0, WRITE_REWRITE: 0, None: 0, "skipped": 0}
+    written_bytes = 0
+    with WriteJournal(journal_directory, resume) as journal:
+        print("Writing new Exif metadata, journal: {0}".format(journal.path))
+        with ThreadPoolExecutor(max_workers=max(len(image_lists), 1)) as executor:
+            futures = [executor.submit(write_image_list_metadata, image_list, journal) for image_list in image_lists]
+            for future in futures:
+                cam_write_modes, cam_written_bytes = future.result()
+                for mode, count in cam_write_modes.items():
+                    write_modes[mode] += count
+                written_bytes += cam_written_bytes
+
+    duration = max(time.time() - start_time, 1e-6)
+    written = write_modes[WRITE_IN_PLACE] + write_modes[WRITE_REWRITE]
+    print("Exif metadata written in place in {0} images, {1} images fully rewritten, {2} errors, {3} already done".format(
+        write_modes[WRITE_IN_PLACE], write_modes[WRITE_REWRITE], write_modes[None], write_modes["skipped"]))
+    print("{0} images written in {1:.1f} seconds ({2:.1f} files/s, {3:.1f} MB/s)".format(
+        written, duration, written / duration, written_bytes / duration / 1e6))
 
 
 def filter_images(piclists):
@@ -305,155 +362,98 @@ def filter_images(piclists):
 
 
 
-def correlate_nearest_time_exclusive(camera_obj, loglist = None, piclist = None, user_delta = True):
+def _log_times(loglist):
+    """The log's timestamps as a numpy array of POSIX timestamps (see lib.camera_table)"""
+    return datetimes_to_epoch([log_line.log_timestamp for log_line in loglist])
+
+
+def _virtual_rows(piclist):
+    """A boolean array, True for the virtual pictures (without path) of a CameraTable"""
+    return np.array([path is None for path in piclist.path], dtype=bool)
+
+
+def align_log_and_pic(loglist, piclist, avg_delta, band=50):
+    """Find the picture of each log's timestamp, with the optimal monotone alignment between
+    the log and the pictures timestamps (see lib.align).
+    :param loglist: a list of log_infos nametuple
+    :param piclist: a CameraTable, the virtual images (path is None) keep their timestamp
+    :param avg_delta: the usual time difference between the log and the pictures
+    :param band: how many pictures the alignment can drift from the straight path
+    :return: a CameraTable with the picture of each log's timestamp, or an empty row"""
+    log_times = _log_times(loglist)
+    origin = log_times[0]
+    virtual = _virtual_rows(piclist)
+    #S'il s'est passé plus de 60 secondes entre la dernière photo et celle en cours, alors les caméras se sont mise
+    #en veille, ce qui fait que celle en cours aura un timestamp un peu retardé par rapport aux suivantes.
+    standby_delay = np.zeros(len(piclist))
+    standby_delay[1:][np.diff(piclist.time) > 50] = 0.8
+    pic_times = np.where(virtual, piclist.time - origin, piclist.time - origin + avg_delta - standby_delay)
+
+    # A picture alone costs half the usual time between two shutters
+    intervals = np.sort(np.diff(log_times))
+    gap_penalty = intervals[len(intervals) // 2] / 2 if len(intervals) and intervals[len(intervals) // 2] > 0 else 0.5
+
+    matches = align_times(log_times - origin, pic_times, gap_penalty, band, virtual)
+
+    pic_idx = np.array([-1 if idx is None else idx for idx in matches], dtype=int)
+    for log_line, idx in zip(loglist, pic_idx):
+        if idx >= 0:
+            logger.info(__(">>>>Association de log {0} avec pic {1}".format(log_line.log_timestamp, piclist.path[idx])))
+
+    matched = np.flatnonzero(pic_idx >= 0)
+    unmatched = len(piclist) - len(matched)
+    if unmatched:
+        logger.info(__("{0} pictures without log timestamp".format(unmatched)))
+    # the log's timestamps after the last picture are not kept
+    pic_idx = pic_idx[:matched[-1] + 1 if len(matched) else 0]
+    piclist_corrected = piclist.take(pic_idx)
+    piclist_corrected.new_time[pic_idx >= 0] = log_times[:len(pic_idx)][pic_idx >= 0]
+    return piclist_corrected
+
+
+def correlate_nearest_time_exclusive(camera_obj, loglist = None, piclist = None, user_delta = True, delta = None, interactive = True):
     """Try to find the right image for each log's timestamp.
-    Find the closest image for each timestamp in the log.
-    :param user_delta:
+    Find the best monotone alignment between the log's timestamps and the images (see align_log_and_pic).
+    :param user_delta: ask the user for a new delta value
     :param loglist: a list of log_infos nametuple
-    :param piclist: a list of Picture_infos namedtuple
-    :return: a list of New_Picture_infos namedtuple, the standard deviation between log's timestamp
+    :param piclist: a CameraTable
+    :param delta: the delta between the log and the pictures, in seconds. None to compute it from the first pictures
+    :param interactive: False to never wait for the user (no manual_timestamp menu, no delta question)
+    :return: a CameraTable with the new timestamps, the standard deviation between log's timestamp
     and image's timestamp"""
 
     # calcule le delta moyen log-pic sur les premiers 10% des photos
     if loglist == None : loglist = camera_obj.log_list
-    if piclist == None : piclist = camera_obj.image_list
-    piclist = manual_timestamp(camera_obj, loglist, piclist)
+    if piclist == None : piclist = camera_obj.images
+    if interactive:
+        piclist = manual_timestamp(camera_obj, loglist, piclist)
+    log_times = _log_times(loglist)
     delta_list = []
-    try:
-
-        for i, log_line in enumerate(loglist[:int(len(loglist) // 10 + 1)]):
-            if piclist[i].path is not None:
-                delta_list.append((log_line.log_timestamp - piclist[i].DateTimeOriginal).total_seconds())
-            print("{0} : calcul {1} - {2} : {3}".format(i, log_line.log_timestamp, piclist[i].DateTimeOriginal, (log_line.log_timestamp - piclist[i].DateTimeOriginal).total_seconds()))
-    except ZeroDivisionError:
-        # print("except")
-        delta_list.append((loglist[0].log_timestamp - piclist[0].DateTimeOriginal).total_seconds())
-    # print(delta_list)
+    for i, log_line in enumerate(loglist[:int(len(loglist) // 10 + 1)]):
+        if piclist.path[i] is not None:
+            delta_list.append(log_times[i] - piclist.time[i])
+        print("{0} : calcul {1} - {2} : {3}".format(i, log_line.log_timestamp, epoch_to_datetime(piclist.time[i]), log_times[i] - piclist.time[i]))
     #import pdb; pdb.set_trace()
-    try:
-        avg_delta = sum(delta_list) / len(delta_list)
-    except ZeroDivisionError:
-        avg_delta = -0.5
+    # the median, as a missing picture in the first pictures would shift the mean
+    first_stats = stats_of_deltas(delta_list)
+    avg_delta = first_stats.median if first_stats.count else -0.5
     
-    print("ecart moyen entre le log et les photos : ", avg_delta)
-    if user_delta:
+    print("ecart moyen entre le log et les photos : ", first_stats.mean)
+    print("ecart median : {0} (MAD {1})".format(avg_delta, first_stats.mad))
+    if delta is not None:
+        avg_delta = delta
+    elif user_delta and interactive:
         user_delta = input("Enter a new delta value: ")
         if user_delta is not None and len(user_delta) != 0:
             avg_delta = float(user_delta)
     
-    gap = 0
-    piclist_corrected = []
     logger.info(__("len loglist:{0}".format(len(loglist))))
     logger.info(__("len piclist:{0}".format(len(piclist))))
     logger.info(__("avg delta = {0}".format(avg_delta)))
-    #We will use a loglist copy as we will modify it
-    cp_loglist = loglist[:]
-    backup_delta = avg_delta
-    for i, pic in enumerate(piclist):
-        standby_delay = 0
-        n = 1
-        #print("i, gap, n", i, gap, n)
-        #delta = abs((loglist[i + gap].log_timestamp - pic.DateTimeOriginal).total_seconds() - avg_delta)
-        #print("loglist {0} et piclist {1}".format(i+gap + n, i))
-        #if len(piclist_corrected) > 0 and piclist_corrected[-1].new_datetimeoriginal >= log
-        try:
-        
-            #Si le chemin de l'image suivant celle en cours de calcul est None, 
-            # alors c'est une image virtuelle qui a été ajoutée pour recaler.
-            #Dans ce cas, son timestamp est forcément bon, alors on force celle en cours à la position actuelle
-            # en assignant une valeur de 0 à delta. Si on ne le faisait pas, avg_delta pourrait décaler l'image en cours
-            # à la place de l'image virtuelle.
-            if  i + 1 < len(piclist) and piclist[i+1].path is None:
-                delta = 0
-                next_delta = 1
-                logger.info("l'image suivante est une Image virtuelle.")
-            else:
-                #S'il s'est passé plus de 60 secondes entre la dernière photo et celle en cours, alors les caméras se sont mise
-                #en veille, ce qui fait que celle en cours aura un timestamp un peu retardé par rapport aux suivantes.
-                #Pour cette raison, on ajout 0.8s pour éviter que la photo soit calé sur le timestamp suivant.
-                #Le try except est là pour éviter l'erreur pour la toute première photo.
-                try:
-                    standby_delay = 0.8 if (pic.DateTimeOriginal - piclist[i-1].DateTimeOriginal).total_seconds() > 50 else 0
-                    
-                    if standby_delay != 0:
-                        logger.info(__("standby_delay vaut {}".format(standby_delay)))
-                except IndexError:
-                    #TODO la première photo sera en retard uniquement si la cam a eu le temps de se mettre en veille depuis son
-                    # démarrage
-                    logger.info("première photo, elle sera un peu en retard")
-                    standby_delay = 0.8
-
-                short_path = os.path.basename(pic.path) if pic.path is not None else "virtual image"
-                delta = abs((cp_loglist[i + gap].log_timestamp - pic.DateTimeOriginal).total_seconds() - avg_delta + standby_delay)
-                logger.info(__("A Calcul de la diff entre {0} et {1} : {2}".format(cp_loglist[i + gap].log_timestamp, short_path, delta)))
-                
-                # gestion du cas de la dernière photo
-                if i + gap + n < len(cp_loglist):
-                    next_delta = abs((cp_loglist[i + gap + n].log_timestamp - pic.DateTimeOriginal).total_seconds() - avg_delta + standby_delay)
-                    logger.info(__("B Calcul de la diff entre {0} et {1} : {2}".format(cp_loglist[i + gap + n].log_timestamp, short_path, next_delta)))
-                else:
-                    delta = 0
-                    logger.info("Fin de la liste")
-                    
-                
-            while next_delta <= delta:
-                piclist_corrected.insert(len(piclist_corrected), None)
-                delta = next_delta
-                n = n + 1
-                next_delta = abs(
-                    (cp_loglist[i +  gap + n].log_timestamp - pic.DateTimeOriginal).total_seconds() - avg_delta + standby_delay)
-                logger.info("="*10)
-                logger.info(__("delta  = {0} pour loglist {1} et piclist {2}".format(delta, cp_loglist[i + gap + n - 1].log_timestamp, os.path.basename(pic.path))))
-                logger.info(__("delta2 = {0} pour loglist {1} et piclist {2}".format(next_delta, cp_loglist[i + gap + n].log_timestamp, os.path.basename(pic.path))))
-                    
-            new_datetimeoriginal = cp_loglist[i + gap + n - 1].log_timestamp
-            new_subsectimeoriginal = "%.6d" % (cp_loglist[i + gap + n - 1].log_timestamp.microsecond)
-            piclist_corrected.append(New_Picture_infos(pic.path, pic.DateTimeOriginal, pic.SubSecTimeOriginal,
-                                                   new_datetimeoriginal, new_subsectimeoriginal, "", "", "", ""))
-                                                   
-            if pic.path is not None:
-                logger.info(__(">>>>Association de log {0} avec pic {1}".format(cp_loglist[i  + gap + n - 1].log_timestamp, os.path.basename(pic.path))))
-            else:
-                logger.info(__(">>>>Association de log {0} avec pic {1}".format(cp_loglist[i  + gap + n - 1].log_timestamp, pic.path)))
-            """# On recalcule le delta habituel entre le log et les images
-            # TODO peut-être renommer la variable avg_delta, qui n'est plus une moyenne.
-            # ou bien affecter avg_delta vers une autre variable
-            avg_delta = (loglist[i + gap + n - 1].log_timestamp - pic.DateTimeOriginal).total_seconds()
-            print("Average delta : {0}".format(avg_delta))"""
-        except Exception as e:
-            logger.warning(__("Exception: {}".format(e)))
-            #import pdb; pdb.set_trace()
-            #print("i, gap, n")
-            #print("End of list")
-                
+    piclist_corrected = align_log_and_pic(loglist, piclist, avg_delta)
 
-        gap = gap + n - 1
-        """
-        for missing_pic in range(n - 1):
-            piclist_corrected.insert(len(piclist_corrected) - 1, None)
-            # display information
-            try:
-                print("=" * 30)
-                print("Il manque une photo pour {0} :".format(cp_loglist[i + gap]))
-                print(os.path.basename(piclist[i - 1].path))
-                print("et")
-                print(os.path.basename(piclist[i].path))
-                print("-" * 30)
-                #print("index de la photo : ", i)
-                #print(loglist[i + gap + n - 3])
-                #print(loglist[i + gap + n - 2])
-                #print(loglist[i + gap + n - 1])
-                #print("="*30)
-                # add a gap to correlate the next pic with the correct log_timestamp
-            except Exception as e:
-                #print (e)
-                pass
-            #gap += 1
-            #print("Gap est à : ", gap)
-        """    
-     
     # piclist_corrected = [i for i in piclist_corrected if (type(i) == New_Picture_infos and type(i.path) != None) or type(i) == bool]
-    deviation = standard_deviation(compute_delta3(loglist, piclist_corrected))
+    deviation = time_deviation(loglist, piclist_corrected)
     # print("standard deviation : ", deviation)
     
     
@@ -475,8 +475,9 @@ def correlate_nearest_time_exclusive(camera_obj, loglist = None, piclist = None,
     # faire des modifications, puisque qu'il faut refaire la correlation ensuite.
     # trouver une solution élégante pour ça. Soit supprimer la possibilité de faire des
     # modifs, soit refaire la correlation ensuite.
-    piclist_corrected=manual_timestamp(camera_obj, loglist, piclist_corrected)
-    deviation = standard_deviation(compute_delta3(loglist, piclist_corrected))
+    if interactive:
+        piclist_corrected=manual_timestamp(camera_obj, loglist, piclist_corrected)
+    deviation = time_deviation(loglist, piclist_corrected)
     print("standard deviation : ", deviation)
     
     return piclist_corrected, deviation
@@ -486,19 +487,19 @@ def correlate_nearest_time_manual(camera_obj, loglist = None, piclist = None, us
     Find the closest image for each timestamp in the log.
     :param user_delta:
     :param loglist: a list of log_infos nametuple
-    :param piclist: a list of Picture_infos namedtuple
-    :return: a list of New_Picture_infos namedtuple, the standard deviation between log's timestamp
+    :param piclist: a CameraTable
+    :return: a CameraTable with the new timestamps, the standard deviation between log's timestamp
     and image's timestamp"""
 
     # calcule le delta moyen log-pic sur les premiers 5% des photos
     
     if loglist == None : loglist = camera_obj.log_list
-    if piclist == None : piclist = camera_obj.image_list
+    if piclist == None : piclist = camera_obj.images
     idx_start = 0
     idx_range = 200
     total_lenght = len(loglist)
     
-    piclist = manual_timestamp(loglist, piclist)
+    piclist = manual_timestamp(camera_obj, loglist, piclist).to_pictures()
             
     if user_delta:
             user_delta = input("Enter a new delta value: ")
@@ -581,7 +582,7 @@ def correlate_nearest_time_manual(camera_obj, loglist = None, piclist = None, us
         
         
     # piclist_corrected = [i for i in piclist_corrected if (type(i) == New_Picture_infos and type(i.path) != None) or type(i) == bool]
-    deviation = standard_deviation(compute_delta3(loglist, piclist_corrected))
+    deviation = time_deviation(loglist, piclist_corrected)
     # print("standard deviation : ", deviation)
     #import pdb; pdb.set_trace()
     for pic in piclist_corrected:
@@ -591,58 +592,59 @@ def correlate_nearest_time_manual(camera_obj, loglist = None, piclist = None, us
             except Exception as e:
                 print(e)
             
-    return piclist_corrected, deviation
+    return CameraTable.from_pictures(piclist_corrected), deviation
     
+def _picture_times(piclist):
+    """The timestamps of the pictures in seconds, nan for the empty rows and the virtual pictures
+    :param piclist: a CameraTable
+    :return: a numpy array"""
+    return np.where(piclist.valid & ~_virtual_rows(piclist), piclist.time, np.nan)
+
+
 def manual_timestamp(camera_obj, loglist = None, piclist = None, user_delta = True):
 
+    """Show the log's timestamps and the pictures timestamps side by side, to insert or remove pictures by hand
+    :param loglist: a list of log_infos nametuple
+    :param piclist: a CameraTable
+    :return: a new CameraTable, with the changes made by the user"""
     if loglist == None : loglist = camera_obj.log_list
-    if piclist == None : piclist = camera_obj.image_list
+    if piclist == None : piclist = camera_obj.images
     idx_start = 0
     idx_range = 100
     total_lenght = len(loglist)
-    piclist = piclist[:]
+    log_times = _log_times(loglist)
+    score = IncrementalScore(log_times, _picture_times(piclist))
     #import pdb; pdb.set_trace()
     while True:
         delta_list = []
         idx_end = idx_start + idx_range if idx_start + idx_range < total_lenght else total_lenght 
         
         for i, log_line in enumerate(loglist[idx_start:idx_end], idx_start):
-            try:
-                if piclist[i] is not None and piclist[i].path is not None:
-                    delta_list.append((log_line.log_timestamp - piclist[i].DateTimeOriginal).total_seconds())
-                    #TODO ajouter une indication si la cam a répondu (T ou F,  true false) 
-                """print("{0:8} : calcul {1}{2} - {3}{4} : {5}".format(i, 
-                                                                                        log_line.log_timestamp,
-                                                                                        'T' if camera_obj.cam_return[i] == True else 'F',
-                                                                                        piclist[i].DateTimeOriginal,
-                                                                                        'T' if piclist[i] is not None and piclist[i].path is not None else 'F',
-                                                                                        (log_line.log_timestamp - piclist[i].DateTimeOriginal).total_seconds()))"""
-                print("{0:8} : calcul {1}{2} - {3}{4} : {5}".format(i, 
-                                                                                        log_line.log_timestamp,
-                                                                                        'T' if log_line.cam_return == True else 'F',
-                                                                                        piclist[i].DateTimeOriginal,
-                                                                                        'T' if piclist[i] is not None and piclist[i].path is not None else 'F',
-                                                                                        (log_line.log_timestamp - piclist[i].DateTimeOriginal).total_seconds()))
-            except ZeroDivisionError:
-                # print("except")
-                delta_list.append((loglist[0].log_timestamp - piclist[0].DateTimeOriginal).total_seconds())
-            # print(delta_list)
-            except IndexError:
-                print("{0:8} : calcul {1}{2}".format(i, log_line.log_timestamp, 'T' if log_line.cam_return == True else 'F'))
-            except AttributeError:
+            if i >= len(piclist) or not piclist.valid[i]:
                 print("{0:8} : calcul {1}{2}".format(i, log_line.log_timestamp, 'T' if log_line.cam_return == True else 'F'))
-        try:
-            avg_delta = sum(delta_list) / len(delta_list)
-            print("ecart moyen entre le log et les photos : ", avg_delta)
+                continue
+            delta = log_times[i] - piclist.time[i]
+            if piclist.path[i] is not None:
+                delta_list.append(delta)
+                #TODO ajouter une indication si la cam a répondu (T ou F,  true false) 
+            print("{0:8} : calcul {1}{2} - {3}{4} : {5}".format(i, 
+                                                                                    log_line.log_timestamp,
+                                                                                    'T' if log_line.cam_return == True else 'F',
+                                                                                    epoch_to_datetime(piclist.time[i]),
+                                                                                    'T' if piclist.path[i] is not None else 'F',
+                                                                                    delta))
+        range_stats = stats_of_deltas(delta_list)
+        if range_stats.count:
+            print("ecart moyen entre le log et les photos : ", range_stats.mean)
+            print("ecart median : {0} (MAD {1})".format(range_stats.median, range_stats.mad))
             print("ecart min : {}".format(min(delta_list)))
             print("ecart max : {}".format(max(delta_list)))
-        except ZeroDivisionError as e:
-            avg_delta = "ZeroDivisionError"
-        #avg_delta = 1.5
+        print("standard deviation of the whole list : {0}".format(score.std))
         
         
         print("Type 'a10' to insert a virtual pic before index 10")
         print("Type 'r23' to remove a pic at index 23")
+        print("Type 'w' to list the pictures which increase the deviation the most")
         print("Press 'Enter' to go to the next range")
         print("Press 's' to move to the list beginning")
         print("Press 'q' to quit this menu")
@@ -651,11 +653,14 @@ def manual_timestamp(camera_obj, loglist = None, piclist = None, user_delta = Tr
         if len(value) > 1:
             idx = int(value[1:])
             if value[0].lower() == 'a':
-                piclist.insert(idx, New_Picture_infos(None, loglist[idx].log_timestamp, None, None, None, None, None, None, None))
+                piclist = piclist.take(np.insert(np.arange(len(piclist)), idx, -1))
+                piclist.time[idx] = log_times[idx]
+                piclist.valid[idx] = True
             elif value[0].lower() == 'r':
-                del(piclist[idx])
+                piclist = piclist.take(np.delete(np.arange(len(piclist)), idx))
                 
             idx_start = idx -5 if idx > 5 else 0
+            score = IncrementalScore(log_times, _picture_times(piclist))
             
         elif len(value) == 0:
 
@@ -666,8 +671,15 @@ def manual_timestamp(camera_obj, loglist = None, piclist = None, user_delta = Tr
                 idx_start = total_lenght - idx_range
                 
         elif len(value) == 1 and value[0].lower() == 'm':
-            piclist = insert_missing_timestamp(cam)
+            piclist = insert_missing_timestamp(camera_obj)
             idx_start = 0
+            score = IncrementalScore(log_times, _picture_times(piclist))
+            
+        elif len(value) == 1 and value[0].lower() == 'w':
+            # the deviation without each picture, a picture far from the others is near a missing or extra picture
+            deviations = [(score.try_set(i, math.nan), i) for i in range(len(score.deltas)) if not math.isnan(score.deltas[i])]
+            for deviation, i in sorted(deviations)[:10]:
+                print("{0:8} : delta {1:.3f}, deviation without it {2:.3f}".format(i, score.deltas[i], deviation))
             
         elif len(value) == 1 and value[0].lower() == 'q':
             break
@@ -688,26 +700,19 @@ def correlate_manual(camera_obj, loglist = None, piclist = None, user_delta = Tr
     Find the closest image for each timestamp in the log.
     :param user_delta:
     :param loglist: a list of log_infos nametuple
-    :param piclist: a list of Picture_infos namedtuple
-    :return: a list of New_Picture_infos namedtuple, the standard deviation between log's timestamp
+    :param piclist: a CameraTable
+    :return: a CameraTable with the new timestamps, the standard deviation between log's timestamp
     and image's timestamp"""
         
     if loglist == None : loglist = camera_obj.log_list
-    if piclist == None : piclist = camera_obj.image_list
-    piclist = manual_timestamp(cam, loglist, piclist)
-    piclist_corrected = []
-        
-    for log_line, pic in zip(loglist, piclist):
-        new_datetimeoriginal = log_line.log_timestamp
-        new_subsectimeoriginal = "%.6d" % (log_line.log_timestamp.microsecond)
-        # single_cam_image_list[i] = single_cam_image_list[i]._replace(New_DateTimeOriginal=new_datetimeoriginal, New_SubSecTimeOriginal=new_subsectimeoriginal)
-        piclist_corrected.append(New_Picture_infos(pic.path,
-                                                     pic.DateTimeOriginal,
-                                                     pic.SubSecTimeOriginal,
-                                                     new_datetimeoriginal, new_subsectimeoriginal, "", "",
-                                                     "", ""))
+    if piclist == None : piclist = camera_obj.images
+    piclist = manual_timestamp(camera_obj, loglist, piclist)
+    # each picture gets the timestamp of its log line
+    length = min(len(loglist), len(piclist))
+    piclist_corrected = piclist.take(np.arange(length))
+    piclist_corrected.new_time[piclist_corrected.valid] = _log_times(loglist)[:length][piclist_corrected.valid]
     # piclist_corrected = [i for i in piclist_corrected if (type(i) == New_Picture_infos and type(i.path) != None) or type(i) == bool]
-    deviation = standard_deviation(compute_delta3(loglist, piclist_corrected))
+    deviation = time_deviation(loglist, piclist_corrected)
     print("standard deviation : ", deviation)
     #import pdb; pdb.set_trace()
     """
@@ -721,6 +726,55 @@ def correlate_manual(camera_obj, loglist = None, piclist = None, user_delta = Tr
     
     return piclist_corrected, deviation
     
+def _double_diff_times(loglist, piclist):
+    """The log's and pictures timestamps, in seconds from the first log's timestamp"""
+    log_times = _log_times(loglist)
+    return log_times - log_times[0], piclist.time - log_times[0]
+
+
+def _cam_answered(log_line, cam_number):
+    """True if the camera answered to the shutter request. cam_return is a bool in the Cam_Infos log list,
+    or the cameras bits string from the logfile"""
+    if isinstance(log_line.cam_return, bool):
+        return log_line.cam_return
+    return int(log_line.cam_return[0 - (cam_number + 1)]) == 1
+
+
+def _insert_missing_pictures(loglist, piclist, missing, check_cam_return=False, cam_number=0):
+    """Insert a False after each missing picture position, and copy the log's timestamps to the images
+    in a single pass.
+    :param piclist: a CameraTable
+    :param missing: a list of (picture index, double difference) tuples, sorted by picture index
+    :param check_cam_return: only copy the timestamp if the camera answered to the shutter request
+    :return: a CameraTable with the new timestamps (and an empty row for each missing picture), the standard
+    deviation between log's timestamp and image's timestamp"""
+    print("=" * 30)
+    for position, inter_delta in missing:
+        print()
+        print("Il manque la photo entre :")
+        print(piclist.path[position], epoch_to_datetime(piclist.time[position]))
+        print("et")
+        if position + 1 < len(piclist):
+            print(piclist.path[position + 1], epoch_to_datetime(piclist.time[position + 1]), ".\n")
+        else:
+            print(None, ".\n")
+        print("=" * 30)
+
+    missing_after = sorted(set(position for position, inter_delta in missing))
+    pic_idx = np.insert(np.arange(len(piclist)), np.array(missing_after, dtype=int) + 1, -1)[:len(loglist)]
+
+    # C'est bon, on peut recopier les timestamps depuis le log
+    piclist_corrected = piclist.take(pic_idx)
+    pictures = piclist_corrected.valid.copy()
+    piclist_corrected.new_time[pictures] = _log_times(loglist)[:len(pic_idx)][pictures]
+    if check_cam_return:
+        answered = np.array([_cam_answered(log_line, cam_number) for log_line in loglist[:len(pic_idx)]], dtype=bool)
+        piclist_corrected = piclist_corrected.compress(~pictures | answered)
+    deviation = time_deviation(loglist, piclist_corrected)
+
+    return piclist_corrected, deviation
+
+
 def correlate_double_diff_forward(loglist, piclist, pic_count_diff, cam_number):
     """Try to find the right image for each log's timestamp.
     Compute timedelta (from the beginning) between x+1 and x log's timestamp, timedelta between x+1 and x pic timestamp,
@@ -728,97 +782,18 @@ def correlate_double_diff_forward(loglist, piclist, pic_count_diff, cam_number):
     The longest double difference timedelta will be used for the missing images.
     Then the timestamps from the log are copied to the images.
     :param loglist: a list of log_infos nametuple
-    :param piclist: a list of Picture_infos namedtuple
+    :param piclist: a CameraTable
     :param pic_count_diff: how many images are missing
     :param cam_number: cam's number
-    :return: a list of New_Picture_infos namedtuple, the standard deviation between log's timestamp
+    :return: a CameraTable with the new timestamps, the standard deviation between log's timestamp
     and image's timestamp"""
 
-    # On va calculer le delta entre chaque déclenchement du log, et entre les photos
-    # Calcul du delta entre les logs
-    log_pic_delta = []
-    for i, log_line in enumerate(loglist[:-1]):
-        log_pic_delta.append((loglist[i + 1].log_timestamp - loglist[i].log_timestamp).total_seconds())
-
-        # Calcul du delta entre les images
-    pic_delta = []
-    for i, pic_timestamp in enumerate(piclist[:-1]):
-        # On calcule le delta entre 2 images prises par la caméra
-        pic_delta.append((piclist[i + 1].DateTimeOriginal - piclist[i].DateTimeOriginal).total_seconds())
-
-    # print("log_pic_delta : ", log_pic_delta)
-    # print("pic_delta : ", pic_delta)
-    # ========================================================================
-    # Calcul du delta entre les delta, depuis le début vers la fin
-    inter_delta = []
-    for i, delta in enumerate(log_pic_delta):
-        try:
-            inter_delta.append(log_pic_delta[i] - pic_delta[i])
-        except:
-            # print("fin de liste")
-            pass
-    # print("inter_delta", inter_delta)
-    # print(sorted(inter_delta))
-
-    # Dans le cas où on a des variations de vitesse et des images manquantes, les inter_delta peuvent êtres
-    # trompeur. On supprime ceux qui sont incorrectes, en faisant la division de la valeur max par la valeur min.
-    # Si elle est < -1 il ne faut pas tenir compte de ces min max.
-    # print("Max est : ", max(inter_delta))
-    # print ("Min est : ", min(inter_delta))
-    while max(inter_delta) / min(inter_delta) < -1:
-        inter_delta[inter_delta.index(max(inter_delta))] = 0
-        inter_delta[inter_delta.index(min(inter_delta))] = 0
-        # print("On met a 0 inter_delta ", inter_delta.index(max(inter_delta)))
-        # print("On met a 0 inter_delta ", inter_delta.index(min(inter_delta)))
-    # print("inter_delta sans les bad max-min : ")
-    # print(inter_delta)
-
-    # Maintenant, on cherche la ou les valeurs max nécessaires
-    idx = []
-    for i in range(pic_count_diff):
-        idx.append(inter_delta.index(min(inter_delta)))
-        inter_delta[idx[i]] = 0
+    log_times, pic_times = _double_diff_times(loglist, piclist)
+    missing = find_missing_pictures(log_times, pic_times, pic_count_diff)
     print("=" * 30)
-    print("idx ordre normal : ", idx)
-    for i in idx:
-        print()
-        print("Il manque la photo entre :")
-        print(piclist[i])
-        print("et")
-        print(piclist[i + 1], ".\n")
-        print("=" * 30)
-
-    # On trie la liste d'index pour éviter d'insérer au même endroit car
-    # le fait d'insérer décale l'insertion suivante
-    idx.sort()
-    # On insère une "image vide" à "idx +1"
+    print("idx ordre normal : ", [position for position, inter_delta in missing])
 
-    for i, missing_pic in enumerate(idx):
-        piclist.insert(missing_pic + i + 1, False)
-
-    # C'est bon, on peut recopier les timestamps depuis le log
-    piclist_corrected = []
-    for i, log_line in enumerate(loglist):
-        # print ("test int : ", int(log_line.cam_return[0 - (cam_number +1)]) == 1)
-        # print ("test type : ", type(piclist[i]) == Picture_infos)
-        # print("type est : ", type(piclist[i]))
-        # print("retour de isinstance(piclist[i], Picture_infos): ", isinstance(piclist[i], Picture_infos))
-        if type(piclist[i]) == Picture_infos:
-
-            new_datetimeoriginal = log_line.log_timestamp
-            new_subsectimeoriginal = "%.6d" % (log_line.log_timestamp.microsecond)
-            piclist_corrected.append(New_Picture_infos(piclist[i].path,
-                                                       piclist[i].DateTimeOriginal,
-                                                       piclist[i].SubSecTimeOriginal,
-                                                       new_datetimeoriginal,
-                                                       new_subsectimeoriginal,
-                                                       "", "", "", ""))
-        elif type(piclist[i]) == bool:
-            piclist_corrected.append(piclist[i])
-    # print("piclist_corrected : ", piclist_corrected)
-    deviation = standard_deviation(compute_delta3(loglist, piclist_corrected))
-
-    return piclist_corrected, deviation
+    return _insert_missing_pictures(loglist, piclist, missing)
 
 
 def correlate_double_diff_backward(loglist, piclist, pic_count_diff, cam_number):
@@ -828,129 +803,61 @@ def correlate_double_diff_backward(loglist, piclist, pic_count_diff, cam_number)
     The longest double difference timedelta will be used for the missing images.
     Then the timestamps from the log are copied to the images.
     :param loglist: a list of log_infos nametuple
-    :param piclist: a list of Picture_infos namedtuple
+    :param piclist: a CameraTable
     :param pic_count_diff: how many images are missing
     :param cam_number: cam's number
-    :return: a list of New_Picture_infos namedtuple, the standard deviation between log's timestamp
+    :return: a CameraTable with the new timestamps, the standard deviation between log's timestamp
     and image's timestamp"""
 
-    # On va calculer le delta entre chaque déclenchement du log, et entre les photos
-    # Calcul du delta entre les logs
-    log_pic_delta = []
-    for i, log_line in enumerate(loglist[:-1]):
-        log_pic_delta.append((loglist[i + 1].log_timestamp - loglist[i].log_timestamp).total_seconds())
-
-        # Calcul du delta entre les images
-    pic_delta = []
-    for i, pic_timestamp in enumerate(piclist[:-1]):
-        # On calcule le delta entre 2 images prises par la caméra
-        pic_delta.append((piclist[i + 1].DateTimeOriginal - piclist[i].DateTimeOriginal).total_seconds())
-
-    # print("log_pic_delta : ", log_pic_delta)
-    # print("pic_delta : ", pic_delta)
-    # ========================================================================
-    # Calcul du delta entre les delta, depuis la fin vers le début
-    inter_delta_reverse = []
-    log_pic_delta_reversed = log_pic_delta[::-1]
-    pic_delta_reversed = pic_delta[::-1]
-    for i, delta in enumerate(log_pic_delta_reversed):
-        try:
-            inter_delta_reverse.append(log_pic_delta_reversed[i] - pic_delta_reversed[i])
-        except:
-            # print("fin de liste")
-            pass
-    # print("inter_delta_reverse")
-    # print(inter_delta_reverse)
-    # Dans le cas où on a des variations de vitesse et des images manquantes, les inter_delta peuvent êtres
-    # trompeur. On supprime ceux qui sont incorrectes, en faisant la division de la valeur max par la valeur min.
-    # Si elle est < -1 il ne faut pas tenir compte de ces min max.
-    # print("Max reverse est : ", max(inter_delta_reverse))
-    # print ("Min reverse est : ", min(inter_delta_reverse))
-    while max(inter_delta_reverse) / min(inter_delta_reverse) < -1:
-        inter_delta_reverse[inter_delta_reverse.index(max(inter_delta_reverse))] = 0
-        inter_delta_reverse[inter_delta_reverse.index(min(inter_delta_reverse))] = 0
-        # print("On met a 0 inter_delta_reverse ", inter_delta_reverse.index(max(inter_delta_reverse)))
-        # print("On met a 0 inter_delta_reverse ", inter_delta_reverse.index(min(inter_delta_reverse)))
-    # print("inter_delta_reverse sans les bad max-min", inter_delta_reverse)
-
-    idx = []
-    for i in range(pic_count_diff):
-        idx.append(inter_delta_reverse.index(min(inter_delta_reverse)))
-        inter_delta_reverse[idx[i]] = 0
+    log_times, pic_times = _double_diff_times(loglist, piclist)
+    missing = find_missing_pictures(log_times, pic_times, pic_count_diff, reverse=True)
     print("=" * 30)
-    print("idx ordre inverse : ", idx)
-    for i in idx:
-        print("Il manque la photo entre :")
-        print(piclist[-(i + 2)])
-        print("et")
-        print(piclist[-(i + 1)])
-        print("=" * 30)
+    print("idx ordre inverse : ", [position for position, inter_delta in missing])
 
-    # On trie la liste d'index pour éviter d'insérer au même endroit car
-    # le fait d'insérer décale l'insertion suivante
+    return _insert_missing_pictures(loglist, piclist, missing, check_cam_return=True, cam_number=cam_number)
 
-    idx.sort(reverse=True)
-    # On insère une "image vide" à "idx-1"
 
-    for missing_pic in idx:
-        piclist.insert(len(piclist) - missing_pic - 1, False)
-        # print("On insert un False à ", len(piclist)-missing_pic-1)
-        # print(piclist[len(piclist)-missing_pic-1])
-        # print(piclist[len(piclist)-missing_pic-2])
+def correlate_double_diff_consensus(loglist, piclist, pic_count_diff, cam_number):
+    """Try to find the right image for each log's timestamp.
+    Use the missing images found by both the forward and the backward double difference, then
+    the other ones with the longest double difference.
+    :param loglist: a list of log_infos nametuple
+    :param piclist: a CameraTable
+    :param pic_count_diff: how many images are missing
+    :param cam_number: cam's number
+    :return: a CameraTable with the new timestamps, the standard deviation between log's timestamp
+    and image's timestamp"""
 
-    # C'est bon, on peut recopier les timestamps depuis le log
+    log_times, pic_times = _double_diff_times(loglist, piclist)
+    missing = consensus_missing_pictures(log_times, pic_times, pic_count_diff)
+    print("=" * 30)
+    print("idx consensus : ", [position for position, inter_delta in missing])
 
-    # debug
-    # for pic in piclist[40:60]:
-    #   print(pic)
+    return _insert_missing_pictures(loglist, piclist, missing)
 
-    piclist_corrected = []
-    for i, log_line in enumerate(loglist):
-        if int(log_line.cam_return[0 - (cam_number + 1)]) == 1 and type(piclist[i]) == Picture_infos:
-            new_datetimeoriginal = log_line.log_timestamp
-            new_subsectimeoriginal = "%.6d" % (log_line.log_timestamp.microsecond)
-            piclist_corrected.append(New_Picture_infos(piclist[i].path,
-                                                       piclist[i].DateTimeOriginal,
-                                                       piclist[i].SubSecTimeOriginal,
-                                                       new_datetimeoriginal,
-                                                       new_subsectimeoriginal,
-                                                       "", "", "", ""))
-        elif type(piclist[i]) == bool:
-            piclist_corrected.append(piclist[i])
-
-    deviation = standard_deviation(compute_delta3(loglist, piclist_corrected))
-    # print("standard deviation : ", deviation)
+
+def correlate_exact(loglist, piclist):
+    """Give each image the timestamp of its log line, when there are as many images as log's timestamps
+    :param loglist: a list of log_infos nametuple
+    :param piclist: a CameraTable, with the missing timestamps already inserted
+    :return: a CameraTable with the new timestamps, the standard deviation between log's timestamp
+    and image's timestamp"""
+    piclist_corrected = piclist.copy()
+    answered = np.flatnonzero([log_line.cam_return is True for log_line in loglist[:len(piclist)]])
+    piclist_corrected.new_time[answered] = _log_times(loglist)[answered]
+    deviation = time_deviation(loglist, piclist_corrected)
     return piclist_corrected, deviation
 
 
 def insert_missing_timestamp(cam):
     """Insert missing timestamp in the piclists, when the log indicate that the cam didn't answer to the shutter request
     :param cam: a Cam_Infos object
-    :return: the list of Picture_infos namedtuple with the missing timestamp inserted
+    :return: a CameraTable with the missing timestamp inserted
     """
     # On insert les timestamps qu'on sait manquants (caméra qui n'ont pas répondu, donc 0 dans le log).
     # Cela évite de fausser les calculs des différences de temps entre chaque images
-    new_piclist = []
-    gap = 0
-
-    for i, log_line in enumerate(cam.log_list):
-        if log_line.cam_return is True:
-            try:
-                new_piclist.append(cam.image_list[i - gap])
-                # print("Ajout en position {0} de {1}".format(i, piclists[cam][i]))
-            except:
-                # print("End of list")
-                pass
-
-        else:
-            try:
-                new_piclist.append(Picture_infos._replace(path=None, DateTimeOriginal = log_line.log_timestamp))
-                gap += 1
-                # print("Ajout en position {0} de {1}".format(i, Picture_infos(None, log_line.log_timestamp, 0)))
-            except:
-                # print("End of list")
-                pass
-    return new_piclist
+    returned = [log_line.cam_return is True for log_line in cam.log_list]
+    return cam.images.insert_virtual(returned, _log_times(cam.log_list))
 
     
 def correlate_log_and_pic(camera_obj, auto=True):
@@ -960,39 +867,30 @@ def correlate_log_and_pic(camera_obj, auto=True):
 
     :param camera_obj:
     :param auto:
-    :return: a new list of New_Picture_infos namedtuple with the more accurate timestamps.
+    :return: a CameraTable with the more accurate timestamps.
     """
-    piclist_corrected = []
-    pic_count_diff = cam.log_count - cam.pic_count
-    single_cam_image_list = insert_missing_timestamp(cam)
-    original_deviation = standard_deviation(compute_delta3(cam.log_list, single_cam_image_list))
+    piclist_corrected = CameraTable([], [])
+    pic_count_diff = camera_obj.log_count - camera_obj.pic_count
+    single_cam_image_list = insert_missing_timestamp(camera_obj)
+    original_deviation = time_deviation(camera_obj.log_list, single_cam_image_list)
     
     if auto:
         
 
         if pic_count_diff == 0:
             print("Camera {0} : Exact correlation between logfile and pictures".format(camera_obj.name))
-            for i, log_line in enumerate(camera_obj.log_list):
-                if log_line.cam_return is True:
-                    new_datetimeoriginal = log_line.log_timestamp
-                    new_subsectimeoriginal = "%.6d" % (log_line.log_timestamp.microsecond)
-                    # single_cam_image_list[i] = single_cam_image_list[i]._replace(New_DateTimeOriginal=new_datetimeoriginal, New_SubSecTimeOriginal=new_subsectimeoriginal)
-                    single_cam_image_list[i] = New_Picture_infos(single_cam_image_list[i].path,
-                                                                 single_cam_image_list[i].DateTimeOriginal,
-                                                                 single_cam_image_list[i].SubSecTimeOriginal,
-                                                                 new_datetimeoriginal, new_subsectimeoriginal, "", "",
-                                                                 "", "")
+            piclist_corrected, deviation = correlate_exact(camera_obj.log_list, single_cam_image_list)
             
             #piclist_corrected = correlate_nearest_time_manual(camera_obj.log_list, camera_obj.image_list[:])
             
-            #deviation = standard_deviation(compute_delta3(camera_obj.log_list, nearest))
+            #deviation = time_deviation(camera_obj.log_list, nearest)
             #print("standard deviation after correction: ", deviation)
 
             
             #debug :
-            for pic in piclist_corrected:
-                if isinstance(pic, New_Picture_infos):
-                    print(os.path.basename(pic.path), pic.New_DateTimeOriginal, pic.DateTimeOriginal, (pic.New_DateTimeOriginal - pic.DateTimeOriginal).total_seconds())
+            for path, pic_time, new_time in zip(piclist_corrected.path, piclist_corrected.time, piclist_corrected.new_time):
+                if not math.isnan(new_time):
+                    print(os.path.basename(path), epoch_to_datetime(new_time), epoch_to_datetime(pic_time), new_time - pic_time)
 
 
         elif pic_count_diff > 0:
@@ -1000,9 +898,10 @@ def correlate_log_and_pic(camera_obj, auto=True):
             print("{0} : {1} Missing pictures".format(camera_obj.name, pic_count_diff))
 
             # On utilise plusieurs algorithmes différents pour retrouver les images manquantes
-            forward = correlate_double_diff_forward(camera_obj, camera_obj.log_list, single_cam_image_list[:], pic_count_diff, cam)
-            backward = correlate_double_diff_backward(camera_obj, camera_obj.log_list, single_cam_image_list[:], pic_count_diff, cam)
-            nearest = correlate_nearest_time_exclusive(camera_obj, camera_obj.log_list, single_cam_image_list[:])
+            forward = correlate_double_diff_forward(camera_obj.log_list, single_cam_image_list, pic_count_diff, camera_obj.log_pos)
+            backward = correlate_double_diff_backward(camera_obj.log_list, single_cam_image_list, pic_count_diff, camera_obj.log_pos)
+            consensus = correlate_double_diff_consensus(camera_obj.log_list, single_cam_image_list, pic_count_diff, camera_obj.log_pos)
+            nearest = correlate_nearest_time_exclusive(camera_obj, camera_obj.log_list, single_cam_image_list)
             #nearest = correlate_nearest_time_exlusive(camera_obj, loglist[:], image_list[cam][:])
             #nearest = correlate_nearest_time_manual(camera_obj, loglist[:], image_list[cam][:])
             
@@ -1011,9 +910,10 @@ def correlate_log_and_pic(camera_obj, auto=True):
             print("1 : double diff forward deviation: ", forward[1])
             print("2 : double diff backward deviation: ", backward[1])
             print("3 : nearest time deviation: ", nearest[1])
+            print("4 : double diff consensus deviation: ", consensus[1])
 
             user_input = input("The lowest deviation should be the better choice \n"
-                                   "Which algorithm do you want to use ? 1, 2 or 3 ? ")
+                                   "Which algorithm do you want to use ? 1, 2, 3 or 4 ? ")
             while True:
                 if int(user_input) == 1:
                     piclist_corrected = forward[0]
@@ -1024,6 +924,9 @@ def correlate_log_and_pic(camera_obj, auto=True):
                 elif int(user_input) == 3:
                     piclist_corrected = nearest[0]
                     break
+                elif int(user_input) == 4:
+                    piclist_corrected = consensus[0]
+                    break
                 else:
                     print("Invalid choice")
 
@@ -1034,7 +937,7 @@ def correlate_log_and_pic(camera_obj, auto=True):
             print("=" * 80)
             print("{0} : {1} extra pictures".format(camera_obj.name, abs(pic_count_diff)))
             #nearest = correlate_nearest_time(loglist, image_list[cam], user_delta = True)
-            nearest = correlate_nearest_time_exclusive(camera_obj, camera_obj.log_list, camera_obj.image_list[:], user_delta = True)
+            nearest = correlate_nearest_time_exclusive(camera_obj, camera_obj.log_list, camera_obj.images, user_delta = True)
             print("Time deviation before correction : ", original_deviation)
             print("=" * 80)
             #print("1 : double diff forward deviation: ", forward[1])
@@ -1043,7 +946,6 @@ def correlate_log_and_pic(camera_obj, auto=True):
             piclist_corrected = nearest[0]
 
     else:
-        single_cam_image_list = insert_missing_timestamp(cam)
         #nearest, deviation = correlate_nearest_time_exlusive(camera_obj.log_list, camera_obj.image_list[:], user_delta = True)
         #piclist_corrected, deviation = correlate_manual(camera_obj, camera_obj.log_list, nearest, user_delta = True)
         #piclist_corrected, deviation = correlate_manual(camera_obj, camera_obj.log_list, camera_obj.image_list[:], user_delta = True)
@@ -1055,6 +957,100 @@ def correlate_log_and_pic(camera_obj, auto=True):
     return piclist_corrected
 
 
+def correlate_log_and_pic_batch(camera_obj, delta=None, max_deviation=DEFAULT_MAX_DEVIATION):
+    """Correlate the images timestamp with the log timestamps without any question to the user.
+    All the algorithms are tried, and the one with the lowest deviation is kept.
+
+    :param camera_obj: a Cam_Infos object
+    :param delta: the delta between the log and the pictures for the nearest time algorithm, in seconds.
+    None to compute it from the first pictures
+    :param max_deviation: the correlation fails if the deviation is above this value, in seconds
+    :return: a CameraTable with the new timestamps, a dict with the correlation report
+    """
+    report = {"camera": camera_obj.name,
+              "folder": camera_obj.source_dir,
+              "log_count": camera_obj.log_count,
+              "pic_count": camera_obj.pic_count,
+              "pic_count_diff": None,
+              "delta": delta,
+              "original_deviation": None,
+              "deviations": {},
+              "algorithm": None,
+              "deviation": None,
+              "max_deviation": max_deviation,
+              "status": "no pictures"}
+    if not camera_obj.pic_count or not camera_obj.log_count:
+        print("Camera {0} : no pictures or no log, skipping".format(camera_obj.name))
+        return CameraTable([], []), report
+
+    pic_count_diff = camera_obj.log_count - camera_obj.pic_count
+    single_cam_image_list = insert_missing_timestamp(camera_obj)
+    report["pic_count_diff"] = pic_count_diff
+    report["original_deviation"] = time_deviation(camera_obj.log_list, single_cam_image_list)
+
+    print("=" * 80)
+    if pic_count_diff == 0:
+        print("Camera {0} : Exact correlation between logfile and pictures".format(camera_obj.name))
+        candidates = {"exact": lambda: correlate_exact(camera_obj.log_list, single_cam_image_list)}
+    elif pic_count_diff > 0:
+        print("{0} : {1} Missing pictures".format(camera_obj.name, pic_count_diff))
+        candidates = {
+            "forward": lambda: correlate_double_diff_forward(camera_obj.log_list, single_cam_image_list,
+                                                             pic_count_diff, camera_obj.log_pos),
+            "backward": lambda: correlate_double_diff_backward(camera_obj.log_list, single_cam_image_list,
+                                                               pic_count_diff, camera_obj.log_pos),
+            "nearest": lambda: correlate_nearest_time_exclusive(camera_obj, camera_obj.log_list, single_cam_image_list,
+                                                                delta=delta, interactive=False),
+            "consensus": lambda: correlate_double_diff_consensus(camera_obj.log_list, single_cam_image_list,
+                                                                 pic_count_diff, camera_obj.log_pos)}
+    else:
+        print("{0} : {1} extra pictures".format(camera_obj.name, abs(pic_count_diff)))
+        candidates = {"nearest": lambda: correlate_nearest_time_exclusive(camera_obj, camera_obj.log_list, camera_obj.images,
+                                                                          delta=delta, interactive=False)}
+
+    piclist_corrected = CameraTable([], [])
+    for name, algorithm in candidates.items():
+        try:
+            piclist, deviation = algorithm()
+        except (IndexError, ZeroDivisionError) as e:
+            print("{0} : the {1} algorithm failed: {2}".format(camera_obj.name, name, e))
+            report["deviations"][name] = None
+            continue
+        if math.isnan(deviation):
+            print("{0} : the {1} algorithm didn't match any picture".format(camera_obj.name, name))
+            report["deviations"][name] = None
+            continue
+        report["deviations"][name] = deviation
+        if report["deviation"] is None or deviation < report["deviation"]:
+            report["algorithm"], report["deviation"] = name, deviation
+            piclist_corrected = piclist
+
+    print("Time deviation before correction : ", report["original_deviation"])
+    for name, deviation in report["deviations"].items():
+        print("{0} deviation: {1}".format(name, deviation))
+    if report["deviation"] is None:
+        report["status"] = "failed"
+    elif report["deviation"] > max_deviation:
+        report["status"] = "deviation too high"
+    else:
+        report["status"] = "ok"
+    logger.info(__("{0} : {1} algorithm selected, deviation {2} ({3})".format(camera_obj.name, report["algorithm"],
+                                                                             report["deviation"], report["status"])))
+    return piclist_corrected, report
+
+
+def write_correlation_report(report, directory):
+    """Write the correlation report of a camera in a json file
+    :param report: the report dict from correlate_log_and_pic_batch
+    :param directory: the folder where the report is written
+    :return: the report file path"""
+    report_name = os.path.basename(os.path.normpath(report["folder"])) or report["camera"]
+    report_path = os.path.join(directory, REPORT_FILENAME.format(report_name))
+    with open(report_path, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    return report_path
+
+
 def compute_delta(mylist):
     delta = []
     for i, timestamp in enumerate(mylist[:-1]):
@@ -1077,118 +1073,64 @@ def compute_delta2(piclist1, piclist2):
     return delta
 
 
-def compute_delta3(loglist1, piclist2):
-    delta = []
-    # print("loglist1 : ", loglist1)
-    # print("piclist2 : ", piclist2)
-    for i, line in enumerate(loglist1):
-        try:
-            delta.append((loglist1[i].log_timestamp - piclist2[i].DateTimeOriginal).total_seconds())
-        except:
-            pass
-            print("Impossible de calculer le delta")
-    # print("somme des deltas : ", sum(delta))
-    return delta
-
-
-def standard_deviation(list1):
-    """Calculate a standard deviation
-    :param list1: list of values
-    :return: standard deviation value"""
-    # moyenne
-    
-    moy = sum(list1, 0.0) / len(list1)
-    # variance
-    variance = [(x - moy) ** 2 for x in list1]
-    variance = sum(variance, 0.0) / len(variance)
-    # ecart_type
-    deviation = variance ** 0.5
-    return deviation
+def time_deviation(loglist, piclist):
+    """Standard deviation of the time deltas between the log's timestamps and the images timestamps,
+    computed at once with numpy (see lib.scoring). The empty rows of piclist are ignored.
+    :param loglist: a list of log_infos nametuple
+    :param piclist: a CameraTable, or a list of Picture_infos or New_Picture_infos namedtuple
+    :return: the standard deviation in seconds, nan if there isn't any image"""
+    table = piclist if isinstance(piclist, CameraTable) else CameraTable.from_pictures(piclist)
+    return delta_stats(_log_times(loglist), table.time).std
 
 
 def parse_log(path_to_logfile, camera_count):
     """Parse the log file generated by the raspberry pi, to keep only the shutters timestamps
-    and the related informations
+    and the related informations (see lib.log_parser.iter_log)
     :param path_to_logfile: path to the logfile
     :param camera_count: how many camera were used in the logfile
-    :return: a list a log_infos namedtuple"""
-    logfile = open(path_to_logfile, "r")
-    loglist = []
-    for line in logfile:
-        line = line.replace("[", "")
-        line = line.replace("]", "")
-        line = line.replace("'", "")
-        line = line.replace("(", "")
-        line = line.replace(")", "")
-        line = line.replace(" ", "")
-        line = line.split(",")
-        if "KTakepic" in line and not line[0].startswith("#"):
-            try:
-                loglist.append(log_infos(datetime.datetime.fromtimestamp(float(line[0])), line[1],
-                                         datetime.datetime.fromtimestamp(float(line[5])), int(line[3]), bin(int(line[2]))[2:].zfill(camera_count),
-                                         int(line[4])))
-
-            except Exception as e:
-                print("parse error: ", e)
-    logfile.close()
+    :return: a list a log_infos namedtuple, the cameras answer is an int bitfield"""
+    stats = {}
+    loglist = list(iter_log(path_to_logfile, stats))
+    if stats["malformed"]:
+        print("parse error: {0} malformed shutter lines in {1}".format(stats["malformed"], path_to_logfile))
     return loglist
 
 
-def geotag_from_gpx(piclist, gpx_file, offset_time=0, offset_bearing=0, offset_distance=0):
+def geotag_from_gpx(piclist, track, offset_time=0, offset_bearing=0, offset_distance=0):
     """This function will try to find the location (lat lon) for each pictures in each list, compute the direction
     of the pictures with an offset if given, and offset the location with a distance if given. Then, these
     coordinates will be added in the New_Picture_infos namedtuple.
-    :param piclist:
-    :param gpx_file: a gpx or nmea file path
+    :param piclist: a CameraTable, or a list of New_Picture_infos namedtuple
+    :param track: a Track object from load_track, or a gpx or nmea file path
     :param offset_time: time offset between the gpx/nmea file, and the image's timestamp
     :param offset_bearing: the offset angle to add to the direction of the images (for side camera)
     :param offset_distance: a distance (in meter) to move the image from the computed location. (Use this setting to
     not have all the images from a multicam setup at the same exact location
-    :return: nothing, the function update the New_Picture_infos namedtuple inside the lists"""
+    :return: nothing, the function update the CameraTable, or the New_Picture_infos namedtuple inside the list"""
     now = datetime.datetime.now(tzlocal())
     
     print("Your local timezone is {0}, if this is not correct, your geotags will be wrong.".format(
         now.strftime('%Y-%m-%d %H:%M:%S %z')))
 
     # read gpx file to get track locations
-    if gpx_file.lower().endswith(".gpx"):
-        gpx = get_lat_lon_time_from_gpx(gpx_file)
-    elif gpx_file.lower().endswith(".nmea"):
-        gpx = get_lat_lon_time_from_nmea(gpx_file)
-    else:
-        print("\nWrong gnss file! It should be a .gpx or .nmea file.")
-        sys.exit()
+    if not isinstance(track, Track):
+        try:
+            track = load_track(track)
+        except ValueError as e:
+            print("\n{0}".format(e))
+            sys.exit()
 
     #for piclist, offset_bearing in zip(piclists, offset_bearings):
 
     start_time = time.time()
-    print("===\nStarting geotagging of {0} images using {1}.\n===".format(len(piclist), gpx_file))
+    print("===\nStarting geotagging of {0} images using {1}.\n===".format(len(piclist), track.path))
 
-    # for filepath, filetime in zip(piclist.path, piclist.New_DateTimeOriginal):
-    for i, pic in enumerate(piclist):
-        # add_exif_using_timestamp(filepath, filetime, gpx, time_offset, bearing_offset)
-        # metadata = ExifEdit(filename)
-        #import pdb; pdb.set_trace()
-        t = pic.New_DateTimeOriginal - datetime.timedelta(seconds=offset_time)
-        t = t.replace(tzinfo=tzlocal()) # <-- TEST pour cause de datetime aware vs naive
-        
-        try:
-            lat, lon, bearing, elevation = interpolate_lat_lon(gpx, t)
-            corrected_bearing = (bearing + offset_bearing) % 360
-            # Apply offset to the coordinates if distance_offset exists
-            if offset_distance != 0:
-                #new_Coords = LatLon(lat, lon).offset(corrected_bearing, offset_distance / 1000)
-                #lat = new_Coords.lat.decimal_degree
-                #lon = new_Coords.lon.decimal_degree
-                lon, lat, unusedbackazimuth = (pyproj.Geod(ellps='WGS84').fwd(lon, lat, corrected_bearing, offset_distance))
-            # Add coordinates, elevation and bearing to the New_Picture_infos namedtuple
-            piclist[i] = pic._replace(Longitude=lon, Latitude=lat, Ele=elevation, ImgDirection=corrected_bearing)
-
-        except ValueError as e:
-            print("Skipping {0}: {1}".format(pic.path, e))
-            
-        except TypeError as f:
-            print("Skipping {0}: {1} - {2}".format(pic.path, f, i))
+    table = piclist if isinstance(piclist, CameraTable) else CameraTable.from_pictures(piclist)
+    geotagged = table.geotag(track, offset_time, offset_bearing, offset_distance)
+    for path in table.path[table.valid & ~geotagged]:
+        print("Skipping {0}: time t not in scope of gpx file".format(path))
+    if not isinstance(piclist, CameraTable):
+        piclist[:] = table.to_pictures()
 
     print("Done geotagging {0} images in {1:.1f} seconds.".format(len(piclist), time.time() - start_time))
 
@@ -1215,8 +1157,7 @@ def move_too_close_pic(piclists, min_distance):
         for i, pic in enumerate(piclist):
             try:
                 next_pic = piclist[i+1]
-                wgs84_geod = Geod(ellps='WGS84')
-                azimuth1, azimuth2, distance = wgs84_geod.inv(next_pic.Longitude, next_pic.Latitude, pic.Longitude, pic.Latitude)
+                azimuth1, azimuth2, distance = WGS84_GEOD.inv(next_pic.Longitude, next_pic.Latitude, pic.Longitude, pic.Latitude)
                
                 #distance = vincenty((next_pic.Latitude, next_pic.Longitude), (pic.Latitude, pic.Longitude)).meters
                 distance = distance + dist_since_start
@@ -1355,7 +1296,7 @@ def arg_parse():
     parser.add_argument("profile", help="Profile's name of the multicam settings", default="v4mbike")
     parser.add_argument("-l", "--logfile", help="Path to the log file. Without this parameter, "
                                                 "the script will search in the current directory")
-    parser.add_argument("-g", "--gpxfile", help="Path to the gpx/nmea file. Without this parameter, "
+    parser.add_argument("-g", "--gpxfile", help="Path to the gpx/nmea/ubx file. Without this parameter, "
                                                 "the script will search in the current directory")
     parser.add_argument("-t", "--time_offset",
                         help="Time offset between GPX and photos. If your camera is ahead by one minute, time_offset is 60.",
@@ -1365,6 +1306,23 @@ def arg_parse():
     parser.add_argument("-w", "--write_exif", help="Ask to write the new exif tags in the images", action="store_true")
     parser.add_argument("-x", "--exclude_close_pic", help="Move the too close pictures to the exluded folder", action="store_true")
     parser.add_argument("-c", "--compare", help="Compare Lat/Lon from a cam with another folder, path will be ask during the script", action="store_true")
+    parser.add_argument("--workers", help="Number of processes used to read the pictures exif data. Default is one per cpu",
+                        default=None, type=int)
+    parser.add_argument("--no_cache", help="Don't use the exif cache file stored in the source folder", action="store_true")
+    parser.add_argument("--resume", help="When writing the exif data, skip the pictures already written by a previous "
+                                         "run (according to the journal in the source folder)", action="store_true")
+    parser.add_argument("-b", "--batch", help="Don't ask anything: the correlation algorithm with the lowest deviation is "
+                                              "selected, a json report is written for each camera, and the exif data are "
+                                              "written with -w. Exit code is 1 if a deviation is too high, or if a camera "
+                                              "has no pictures or no log", action="store_true")
+    parser.add_argument("--allow_missing", help="In batch mode, a camera without pictures or without log isn't an error",
+                        action="store_true")
+    parser.add_argument("--delta", help="Delta between the log and the pictures, in seconds, for the nearest time algorithm. "
+                                        "Default is the profile's log_pic_delta, or computed from the first pictures",
+                        default=None, type=float)
+    parser.add_argument("--max_deviation", help="In batch mode, maximum standard deviation between the log and the pictures, "
+                                                "in seconds. Default is the profile's max_deviation, or {0}".format(DEFAULT_MAX_DEVIATION),
+                        default=None, type=float)
 
     args = parser.parse_args()
     print(args)
@@ -1405,6 +1363,21 @@ def config_parse(profile_name):
     return folder_string, cam_names, cam_log_position, cam_bearing, cam_log_count, distance_from_center, min_pic_distance
 
 
+def batch_config_parse(profile_name):
+    """Parse the optional batch mode settings of a profile in the profile.cfg file.
+    :param profile_name: Profile's name
+    :return: the delta between the log and the pictures (None if not set), the maximum deviation"""
+
+    import configparser
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.dirname(sys.argv[0]), "profile.cfg"))
+
+    delta = config.getfloat(profile_name, "log_pic_delta", fallback=None)
+    max_deviation = config.getfloat(profile_name, "max_deviation", fallback=DEFAULT_MAX_DEVIATION)
+
+    return delta, max_deviation
+
+
 def find_file(directory, file_extension):
     """Try to find the files with the given extension in a directory
     :param directory: the directory to look in
@@ -1438,7 +1411,7 @@ def find_directory(working_dir, strings_to_find):
     :param strings_to_find: a list of strings to find in the folder's names
     :return: a list of folder with the string_to_find in their name"""
     images_path = []
-    dir_list = [i for i in os.listdir(working_dir) if os.path.isdir(i)]
+    dir_list = [i for i in os.listdir(working_dir) if os.path.isdir(os.path.join(working_dir, i))]
     for string in strings_to_find:
         try:
             idx = [i.lower() for i in dir_list].index(string.lower())
@@ -1449,13 +1422,105 @@ def find_directory(working_dir, strings_to_find):
             #sys.exit()
     return images_path
 
+def find_session_files(source, logfile=None, gnss_file=None):
+    """Find the log file and the gnss file of a session folder, when they aren't already known
+    :param source: the session folder
+    :param logfile: the path to the log file, or None to search it in source
+    :param gnss_file: the path to the nmea/gpx/ubx file, or None to search it in source
+    :return: the log file path, the gnss file path"""
+    if logfile is None:
+        print("=" * 30)
+        logfile = find_file(source, "log")
+    if logfile is None:
+        raise ValueError("No logfile found")
+
+    # a nmea file, or a gpx file if there is no nmea file, or a binary u-blox log
+    if gnss_file is None:
+        print("=" * 30)
+        for extension in ("nmea", "gpx", "ubx"):
+            gnss_file = find_file(source, extension)
+            if gnss_file is not None:
+                break
+    if gnss_file is None:
+        raise ValueError("No gpx/nmea/ubx file found")
+    return logfile, gnss_file
+
+
+def correlate_session(source, profile, logfile=None, gnss_file=None, time_offset=0, delta=None, max_deviation=None,
+                      write_exif=False, resume=False, exclude_close_pic=False, josm=False, workers=None, use_cache=True):
+    """Process a whole session folder without any question to the user (batch mode): log parsing,
+    exif scan, correlation, geotag, and optionally exif writing.
+    :param source: the session folder
+    :param profile: Profile's name of the multicam settings
+    :param delta: the delta between the log and the pictures, default is the profile's log_pic_delta
+    :param max_deviation: default is the profile's max_deviation. If a camera deviation is higher,
+    the exif data are not written
+    :param workers: number of processes used to read the pictures exif data
+    :return: the list of the correlation reports, one per camera
+    """
+    logfile, gnss_file = find_session_files(source, logfile, gnss_file)
+    folder_string, cam_names, cam_log_position, cam_bearings, cam_log_count, distances_from_center, min_pic_distance = config_parse(profile)
+    profile_delta, profile_max_deviation = batch_config_parse(profile)
+    if delta is None:
+        delta = profile_delta
+    if max_deviation is None:
+        max_deviation = profile_max_deviation
+
+    cam_group = Cam_Group()
+    for cam in zip(cam_names, find_directory(source, folder_string), cam_bearings, cam_log_position):
+        cam_group.append(Cam_Infos(cam[0], cam[1], cam[2], distances_from_center, cam[3]))
+    cam_group.add_log(parse_log(logfile, cam_log_count))
+    if use_cache:
+        with ExifCache(source) as exif_cache:
+            cam_group.get_image_list(workers, exif_cache)
+    else:
+        cam_group.get_image_list(workers)
+
+    reports = []
+    for cam in cam_group:
+        cam.table, report = correlate_log_and_pic_batch(cam, delta, max_deviation)
+        reports.append(report)
+        print("Report written in {0}".format(write_correlation_report(report, source)))
+    cam_group.filter_images(data=True)
+
+    print("=" * 80)
+    track = load_track(gnss_file)
+    for cam in cam_group:
+        geotag_from_gpx(cam.table, track, time_offset, cam.bearing, cam.distance_from_center)
+        print("=" * 80)
+    # the output functions use the namedtuple lists
+    piclists = [cam.table.to_pictures() for cam in cam_group]
+
+    if josm:
+        session_file_path = os.path.abspath(os.path.join(source, "session.jos"))
+        write_josm_session(piclists, session_file_path, [i.name for i in cam_group], gnss_file)
+        open_session_in_josm(session_file_path)
+
+    too_high = [report["camera"] for report in failed_reports(reports, allow_missing=True)]
+    if write_exif and too_high:
+        print("Deviation too high for {0}, the exif data won't be written".format(", ".join(too_high)))
+    elif write_exif:
+        write_metadata(piclists, source, resume)
+    if exclude_close_pic:
+        print("Moving pictures too close to each other")
+        move_too_close_pic(piclists, min_pic_distance)
+    return reports
+
+
+def failed_reports(reports, allow_missing=False):
+    """Return the correlation reports with a deviation too high, without any working algorithm, or
+    without pictures or log (a missing camera)
+    :param allow_missing: don't return the reports of the cameras without pictures or log"""
+    failed_status = ("deviation too high", "failed") if allow_missing else ("deviation too high", "failed", "no pictures")
+    return [report for report in reports if report["status"] in failed_status]
+
+
 def compare_latlon(piclist1, piclist2, max_distance = 0):
     distance_list=[]
     for pics in zip(piclist1, piclist2):
         pic1, pic2 = pics
         #try:
-        wgs84_geod = Geod(ellps='WGS84')
-        azimuth1, azimuth2, distance = wgs84_geod.inv(pic2.Longitude, pic2.Latitude, pic1.Longitude, pic1.Latitude)
+        azimuth1, azimuth2, distance = WGS84_GEOD.inv(pic2.Longitude, pic2.Latitude, pic1.Longitude, pic1.Latitude)
         #distance = vincenty((pic1.Latitude, pic1.Longitude), (pic2.Latitude, pic2.Longitude)).meters
         
         if distance > max_distance:
@@ -1468,27 +1533,23 @@ def compare_latlon(piclist1, piclist2, max_distance = 0):
 if __name__ == '__main__':
     # Parsing the command line arguments
     args = arg_parse()
+    set_log_file(logfile_name)
 
-    # Trying to find the logfile in the working directory if none is given in the command line
-    if args.logfile is None:
-        print("=" * 30)
-        args.logfile = find_file(args.source, "log")
-        
-    if args.logfile is None:
-        print("No logfile found... Exiting...")
-        sys.exit()
-
-
-    # Trying to find a nmea file in the working directory if none is given in the command line
-    if args.gpxfile is None:
-        print("=" * 30)
-        args.gpxfile = find_file(args.source, "nmea")
-    # Or a gpx file if there is no nmea file
-    if args.gpxfile is None:
-        args.gpxfile = find_file(args.source, "gpx")
+    if args.batch:
+        try:
+            reports = correlate_session(args.source, args.profile, args.logfile, args.gpxfile, args.time_offset,
+                                        args.delta, args.max_deviation, args.write_exif, args.resume,
+                                        args.exclude_close_pic, args.josm, args.workers, not args.no_cache)
+        except ValueError as e:
+            sys.exit("{0}... Exiting...".format(e))
+        print("End of correlation")
+        sys.exit(1 if failed_reports(reports, args.allow_missing) else 0)
 
-    if args.gpxfile is None:
-        print("No gpx/nmea file found... Exiting...")
+    # Trying to find the logfile and the gnss file in the working directory if none is given in the command line
+    try:
+        args.logfile, args.gpxfile = find_session_files(args.source, args.logfile, args.gpxfile)
+    except ValueError as e:
+        print("{0}... Exiting...".format(e))
         sys.exit()
 
     #Parsing the multicam profile
@@ -1515,11 +1576,15 @@ if __name__ == '__main__':
     loglist = parse_log(args.logfile, cam_log_count)
     
     cam_group.add_log(loglist)
-    cam_group.get_image_list()
+    if args.no_cache:
+        cam_group.get_image_list(args.workers)
+    else:
+        with ExifCache(args.source) as exif_cache:
+            cam_group.get_image_list(args.workers, exif_cache)
       
     # Trying to correlate the shutter's timestamps with the images timestamps.
     for cam in cam_group:
-        cam.new_image_list = correlate_log_and_pic(cam, auto=False)
+        cam.table = correlate_log_and_pic(cam, auto=False)
 
         # Remove the unuseful value in the lists
         #piclists_corrected = filter_images(piclists_corrected)
@@ -1529,15 +1594,23 @@ if __name__ == '__main__':
     cam_group.filter_images(data=True)
     #import pdb; pdb.set_trace()
     print("=" * 80)
+    # The gnss file is parsed only once, for all the cameras and the retag loop
+    try:
+        track = load_track(args.gpxfile)
+    except ValueError as e:
+        print("\n{0}".format(e))
+        sys.exit()
     for cam in cam_group:
-        geotag_from_gpx(cam.new_image_list, args.gpxfile, args.time_offset, cam.bearing, cam.distance_from_center)
+        geotag_from_gpx(cam.table, track, args.time_offset, cam.bearing, cam.distance_from_center)
         print("=" * 80)
+    # the output functions use the namedtuple lists
+    piclists = [cam.table.to_pictures() for cam in cam_group]
 
     
     # Write a josm session file to check the picture's location before writing the new exif data
     if args.josm:
         session_file_path = os.path.abspath(os.path.join(args.source, "session.jos"))
-        write_josm_session([i.new_image_list for i in cam_group], session_file_path, [i.name for i in cam_group], args.gpxfile)
+        write_josm_session(piclists, session_file_path, [i.name for i in cam_group], args.gpxfile)
         open_session_in_josm(session_file_path)
 
     if not args.no_retag:
@@ -1554,23 +1627,24 @@ if __name__ == '__main__':
                 input_time_offset = float(user_geo_input)
                 print("=" * 80)
                 for cam in cam_group:
-                    geotag_from_gpx(cam.new_image_list, args.gpxfile, args.time_offset + input_time_offset,
+                    geotag_from_gpx(cam.table, track, args.time_offset + input_time_offset,
                                 cam.bearing, cam.distance_from_center)
                 print("=" * 80)
+                piclists = [cam.table.to_pictures() for cam in cam_group]
                 if args.josm:
                     cam_names = [i.name for i in cam_group]
                     new_cam_names = [name + " | " + str(input_time_offset) for name in cam_names]
-                    write_josm_session([i.new_image_list for i in cam_group], session_file_path, new_cam_names)
+                    write_josm_session(piclists, session_file_path, new_cam_names)
                     open_session_in_josm(session_file_path)
             except ValueError:
                 print("Invalid input")
                 
     if args.compare:
-        for cam in cam_group:
+        for cam, piclist in zip(cam_group, piclists):
             max_distance = 1
             user_input = input("Enter the path to compare lat/lon with  {}:\n ".format(cam.name))
             piclist2 = list_geoimages(str(user_input))
-            compare_result = compare_latlon(cam.new_image_list, piclist2, max_distance)
+            compare_result = compare_latlon(piclist, piclist2, max_distance)
             for result in compare_result:
                 logger.info(__("{0} meters between {1} and {2}".format(result[0], os.path.basename(result[1].path), os.path.basename(result[2].path))))
             logger.info(__("{} pictures couple have more than {} meters between them".format(len(compare_result), max_distance)))
@@ -1583,12 +1657,12 @@ if __name__ == '__main__':
         if user_input == "y":
             #remove pictures without lat/long
             #cam_group.filter_images(latlon = True)
-            write_metadata([i.new_image_list for i in cam_group])
+            write_metadata(piclists, args.source, args.resume)
     # Move the duplicate pictures to the excluded folder
     if args.exclude_close_pic:
         print("Moving pictures too close to each other")
-        move_too_close_pic([i.new_image_list for i in cam_group], min_pic_distance)
-print("End of correlation")
+        move_too_close_pic(piclists, min_pic_distance)
+    print("End of correlation")
 
 
 
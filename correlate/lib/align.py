@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+'''
+Alignment between the shutter timestamps from the log, and the pictures timestamps.
+'''
+
+# cost of a match between a picture which must keep its timestamp, and another log timestamp
+ANCHOR_MISMATCH_COST = 1e9
+# a picture which must keep its timestamp is matched if the difference is below this value (in seconds)
+ANCHOR_TOLERANCE = 1e-3
+
+MOVE_MATCH = 0
+MOVE_SKIP_LOG = 1
+MOVE_SKIP_PIC = 2
+
+
+def align_times(log_times, pic_times, gap_penalty, band=50, anchors=None):
+    '''
+    Find the optimal monotone alignment between the log timestamps and the pictures timestamps
+    (Needleman-Wunsch style). A log timestamp can stay without picture (the camera missed the shot)
+    and a picture can stay without log timestamp (extra picture), each one costs gap_penalty.
+    Matching a picture with a log timestamp costs their time difference.
+
+    Only the cells with min(0, m - n) - band <= i - j <= max(0, m - n) + band are computed, so
+    the memory used is O(m * band).
+
+    :param log_times: the m log timestamps in seconds, sorted
+    :param pic_times: the n pictures timestamps in seconds, already corrected with the usual delta
+    between the log and the pictures, sorted
+    :param gap_penalty: the cost of a log timestamp or a picture left alone, in seconds
+    :param band: how far the alignment can be from the straight path, in pictures
+    :param anchors: optional list of booleans, True for the pictures which can only be matched with a log
+    timestamp equal to their own timestamp (the virtual pictures)
+    :return: a list with, for each log timestamp, the index of its picture or None
+    '''
+    log_times = np.asarray(log_times, dtype=float)
+    pic_times = np.asarray(pic_times, dtype=float)
+    anchors = np.zeros(len(pic_times), dtype=bool) if anchors is None else np.asarray(anchors, dtype=bool)
+    m, n = len(log_times), len(pic_times)
+    matches = [None] * m
+    if m == 0 or n == 0:
+        return matches
+
+    # diagonal k = i - j is stored at index w = k_max - k, so in row i, j = i - k_max + w
+    k_min = min(0, m - n) - band
+    k_max = max(0, m - n) + band
+    width = k_max - k_min + 1
+    offsets = np.arange(width)
+    gaps = offsets * gap_penalty
+
+    moves = np.empty((m + 1, width), dtype=np.uint8)
+    j = -k_max + offsets
+    valid = (j >= 0) & (j <= n)
+    row = np.where(valid, j * gap_penalty, np.inf)
+    moves[0] = MOVE_SKIP_PIC
+
+    for i in range(1, m + 1):
+        j = i - k_max + offsets
+        valid = (j >= 0) & (j <= n)
+        previous = row
+
+        # match log i - 1 with picture j - 1: same w in the previous row
+        pic_idx = np.clip(j - 1, 0, n - 1)
+        cost = np.abs(log_times[i - 1] - pic_times[pic_idx])
+        cost = np.where(anchors[pic_idx], np.where(cost < ANCHOR_TOLERANCE, 0, ANCHOR_MISMATCH_COST), cost)
+        match = np.where(j >= 1, previous + cost, np.inf)
+        # log i - 1 without picture: w + 1 in the previous row
+        skip_log = np.append(previous[1:], np.inf) + gap_penalty
+        best = np.minimum(match, skip_log)
+        best[~valid] = np.inf
+
+        # picture j - 1 without log: w - 1 in the same row. The chain of skipped pictures is
+        # computed at once with a running minimum.
+        with np.errstate(invalid='ignore'):
+            chained = np.minimum.accumulate(best - gaps) + gaps
+        skip_pic = chained < best - 1e-9
+        row = np.where(skip_pic, chained, best)
+        row[~valid] = np.inf
+        moves[i] = np.where(skip_pic, MOVE_SKIP_PIC, np.where(match <= skip_log, MOVE_MATCH, MOVE_SKIP_LOG))
+
+    # backtrack from the last log and the last picture
+    i, w = m, n - m + k_max
+    while i > 0 or i - k_max + w > 0:
+        move = moves[i, w]
+        if i == 0 or move == MOVE_SKIP_PIC:
+            w -= 1
+        elif move == MOVE_MATCH:
+            matches[i - 1] = i - 1 - k_max + w
+            i -= 1
+        else:
+            i -= 1
+            w += 1
+    return matches
+
+
+def _double_diff(log_times, pic_times, reverse=False):
+    '''
+    Difference between the time deltas of two consecutive log timestamps and of two consecutive pictures,
+    starting from the beginning or from the end (reverse) of the lists.
+    '''
+    log_delta = np.diff(np.asarray(log_times, dtype=float))
+    pic_delta = np.diff(np.asarray(pic_times, dtype=float))
+    if reverse:
+        log_delta = log_delta[::-1]
+        pic_delta = pic_delta[::-1]
+    length = min(len(log_delta), len(pic_delta))
+    return log_delta[:length] - pic_delta[:length]
+
+
+def _prune_double_diff(inter_delta):
+    '''
+    With speed variations and missing pictures, the double differences can be misleading.
+    While the largest value is bigger than the opposite of the smallest one, both are set to 0.
+    '''
+    inter_delta = inter_delta.copy()
+    length = len(inter_delta)
+    ascending = np.argsort(inter_delta, kind='stable')
+    descending = np.argsort(-inter_delta, kind='stable')
+    zeroed = np.zeros(length, dtype=bool)
+    low = high = 0
+    while True:
+        while high < length and zeroed[descending[high]]:
+            high += 1
+        while low < length and zeroed[ascending[low]]:
+            low += 1
+        if high == length or low == length:
+            break
+        max_value = inter_delta[descending[high]]
+        min_value = inter_delta[ascending[low]]
+        if zeroed.any():
+            max_value, min_value = max(max_value, 0), min(min_value, 0)
+        if not (min_value < 0 and max_value > -min_value):
+            break
+        zeroed[descending[high]] = True
+        if ascending[low] != descending[high]:
+            zeroed[ascending[low]] = True
+    inter_delta[zeroed] = 0
+    return inter_delta
+
+
+def find_missing_pictures(log_times, pic_times, missing_count, reverse=False):
+    '''
+    Double difference detector: find where the missing pictures are, from the time deltas between
+    the log timestamps and between the pictures. The deltas are compared from the beginning of the lists,
+    or from the end (reverse), and the missing_count lowest double differences are the missing pictures.
+
+    :param log_times: the log timestamps in seconds
+    :param pic_times: the pictures timestamps in seconds
+    :param missing_count: how many pictures are missing
+    :param reverse: compare the deltas from the end of the lists
+    :return: a list of (picture index, double difference) tuples, sorted by picture index. A picture is missing
+    just after each of these pictures.
+    '''
+    inter_delta = _prune_double_diff(_double_diff(log_times, pic_times, reverse))
+    missing_count = min(missing_count, len(inter_delta))
+    if missing_count <= 0:
+        return []
+    lowest = np.argpartition(inter_delta, missing_count - 1)[:missing_count]
+    if reverse:
+        # the reversed delta r is between the pictures n - r - 2 and n - r - 1
+        positions = len(pic_times) - lowest - 2
+    else:
+        positions = lowest
+    return sorted((int(position), float(inter_delta[delta_idx])) for position, delta_idx in zip(positions, lowest))
+
+
+def consensus_missing_pictures(log_times, pic_times, missing_count):
+    '''
+    Combine the forward and backward double difference detectors. The positions found by both are kept first,
+    then the other positions with the lowest double difference.
+
+    :return: a list of (picture index, double difference) tuples, sorted by picture index.
+    '''
+    forward = dict(find_missing_pictures(log_times, pic_times, missing_count))
+    backward = dict(find_missing_pictures(log_times, pic_times, missing_count, reverse=True))
+    scores = {position: min(forward.get(position, np.inf), backward.get(position, np.inf))
+              for position in set(forward) | set(backward)}
+    agreed = [position for position in scores if position in forward and position in backward]
+    others = sorted((position for position in scores if position not in agreed),
+                    key=lambda position: (scores[position], position))
+    selected = agreed + others[:max(missing_count - len(agreed), 0)]
+    return sorted((position, scores[position]) for position in selected)
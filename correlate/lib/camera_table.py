@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import datetime
+from collections import namedtuple
+
+import numpy as np
+
+'''
+Columnar storage of the pictures of a camera: one numpy array per field instead of one namedtuple
+per picture, so the filter and geotag stages work on the whole camera at once.
+The times are POSIX timestamps (float seconds) of the naive local datetimes stored in the exif data,
+and the missing values are nan, instead of the mix of None, False and "" of the namedtuple lists.
+'''
+
+Master_Picture_infos = namedtuple('Picture_infos', ['path', 'DateTimeOriginal', 'SubSecTimeOriginal', 'Latitude', 'Longitude', 'Ele'])
+Picture_infos = Master_Picture_infos(path=None, DateTimeOriginal=None, SubSecTimeOriginal=None, Latitude=None, Longitude=None, Ele=None)
+New_Picture_infos = namedtuple('New_Picture_infos',
+                               ['path', 'DateTimeOriginal', 'SubSecTimeOriginal', "New_DateTimeOriginal",
+                                "New_SubSecTimeOriginal", "Longitude", "Latitude", "Ele", "ImgDirection"])
+log_infos = namedtuple('log_infos',
+                       ['log_timestamp', 'action', 'return_timestamp', 'time_to_answer', 'cam_return', 'pic_number', ])
+
+
+def datetimes_to_epoch(dates):
+    '''
+    Convert a list of naive local datetime objects to a numpy array of POSIX timestamps.
+    None values become nan.
+    '''
+    return np.array([np.nan if date is None else date.timestamp() for date in dates], dtype=float)
+
+
+def epoch_to_datetime(t):
+    '''
+    Convert a POSIX timestamp to a naive local datetime object, or None if t is nan
+    '''
+    if np.isnan(t):
+        return None
+    return datetime.datetime.fromtimestamp(round(float(t), 6))
+
+
+def _value(column, idx):
+    '''
+    A float value of a column, or None if it's missing
+    '''
+    value = column[idx]
+    return None if np.isnan(value) else float(value)
+
+
+def _float(value):
+    '''
+    Convert a namedtuple field to a float, the missing values ("", None, False) become nan
+    '''
+    if value is None or value == "" or value is False:
+        return np.nan
+    return float(value)
+
+
+class CameraTable(object):
+    '''
+    The pictures of a camera, stored as numpy arrays.
+
+    Each row is a picture. A row without path is a virtual picture (a timestamp inserted where
+    the camera didn't take a picture), a row with valid set to False is an empty slot of a
+    correlated list (None or False in the namedtuple lists).
+    '''
+
+    COLUMNS = ("path", "time", "new_time", "lat", "lon", "ele", "direction", "valid")
+
+    def __init__(self, path, time, new_time=None, lat=None, lon=None, ele=None, direction=None, valid=None):
+        self.path = np.asarray(path, dtype=object)
+        self.time = np.asarray(time, dtype=float)
+        length = len(self.path)
+        self.new_time = np.full(length, np.nan) if new_time is None else np.asarray(new_time, dtype=float)
+        self.lat = np.full(length, np.nan) if lat is None else np.asarray(lat, dtype=float)
+        self.lon = np.full(length, np.nan) if lon is None else np.asarray(lon, dtype=float)
+        self.ele = np.full(length, np.nan) if ele is None else np.asarray(ele, dtype=float)
+        self.direction = np.full(length, np.nan) if direction is None else np.asarray(direction, dtype=float)
+        self.valid = np.ones(length, dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+
+    def __len__(self):
+        return len(self.path)
+
+    @classmethod
+    def from_files(cls, files):
+        '''
+        Create a table from the result of an exif scan
+        :param files: a list of (path, capture time) tuples
+        '''
+        return cls([path for path, capture_time in files], datetimes_to_epoch([capture_time for path, capture_time in files]))
+
+    @classmethod
+    def from_pictures(cls, piclist):
+        '''
+        Create a table from a list of Picture_infos or New_Picture_infos namedtuple.
+        The other items (None, False) are stored as invalid rows.
+        '''
+        length = len(piclist)
+        table = cls(np.empty(length, dtype=object), np.full(length, np.nan), valid=np.zeros(length, dtype=bool))
+        for i, pic in enumerate(piclist):
+            if not isinstance(pic, (Master_Picture_infos, New_Picture_infos)):
+                continue
+            table.valid[i] = True
+            table.path[i] = pic.path
+            table.time[i] = _float(pic.DateTimeOriginal and pic.DateTimeOriginal.timestamp())
+            table.lat[i] = _float(pic.Latitude)
+            table.lon[i] = _float(pic.Longitude)
+            table.ele[i] = _float(pic.Ele)
+            if isinstance(pic, New_Picture_infos):
+                table.new_time[i] = _float(pic.New_DateTimeOriginal and pic.New_DateTimeOriginal.timestamp())
+                table.direction[i] = _float(pic.ImgDirection)
+        return table
+
+    def to_pictures(self):
+        '''
+        Convert the table to a list of namedtuple: New_Picture_infos for the rows with a new timestamp,
+        Picture_infos for the others, and None for the invalid rows.
+        '''
+        piclist = []
+        for i in range(len(self)):
+            if not self.valid[i]:
+                piclist.append(None)
+                continue
+            date = epoch_to_datetime(self.time[i])
+            subsec = None if date is None else "%.6d" % date.microsecond
+            if np.isnan(self.new_time[i]):
+                piclist.append(Master_Picture_infos(self.path[i], date, subsec,
+                                                    _value(self.lat, i), _value(self.lon, i), _value(self.ele, i)))
+            else:
+                new_date = epoch_to_datetime(self.new_time[i])
+                piclist.append(New_Picture_infos(self.path[i], date, subsec, new_date, "%.6d" % new_date.microsecond,
+                                                 _value(self.lon, i), _value(self.lat, i), _value(self.ele, i),
+                                                 _value(self.direction, i)))
+        return piclist
+
+    def compress(self, mask):
+        '''
+        Return a new table with only the rows selected by mask (a boolean array or an array of indices)
+        '''
+        return CameraTable(*(getattr(self, column)[mask] for column in self.COLUMNS))
+
+    def take(self, indices):
+        '''
+        Return a new table with the rows at indices, in this order. An index of -1 gives an empty row
+        (invalid, None or False in the namedtuple lists).
+        '''
+        indices = np.asarray(indices, dtype=int)
+        empty = indices < 0
+        if len(self):
+            table = self.compress(np.maximum(indices, 0))
+        else:
+            table = CameraTable(np.full(len(indices), None, dtype=object), np.full(len(indices), np.nan))
+        table.path[empty] = None
+        for column in ("time", "new_time", "lat", "lon", "ele", "direction"):
+            getattr(table, column)[empty] = np.nan
+        table.valid[empty] = False
+        return table
+
+    def copy(self):
+        '''
+        Return a copy of the table
+        '''
+        return self.take(np.arange(len(self)))
+
+    def insert_virtual(self, returned, log_times):
+        '''
+        Insert a virtual picture for each log timestamp without answer from the camera, so the picture
+        at index i goes with the log timestamp at index i.
+        :param returned: a boolean array, True when the camera answered to the log's shutter request
+        :param log_times: the log timestamps (POSIX timestamps)
+        :return: a new table. The log timestamps after the last picture are dropped.
+        '''
+        returned = np.asarray(returned, dtype=bool)
+        log_times = np.asarray(log_times, dtype=float)
+        # index of the picture of each log timestamp, or -1 for a virtual picture
+        pic_idx = np.where(returned, np.cumsum(returned) - 1, -1)
+        keep = pic_idx < len(self)
+        pic_idx, returned, log_times = pic_idx[keep], returned[keep], log_times[keep]
+        table = self.take(pic_idx)
+        table.time[~returned] = log_times[~returned]
+        table.valid[~returned] = True
+        return table
+
+    def filter(self):
+        '''
+        Keep only the real pictures with a new timestamp
+        '''
+        has_path = np.array([path is not None for path in self.path], dtype=bool)
+        return self.compress(self.valid & has_path & ~np.isnan(self.new_time))
+
+    def filter_no_latlon(self):
+        '''
+        Remove the pictures without lat/long data
+        '''
+        return self.compress(self.valid & ~np.isnan(self.lat) & ~np.isnan(self.lon))
+
+    def geotag(self, track, offset_time=0, offset_bearing=0, offset_distance=0):
+        '''
+        Compute the location and direction of all the pictures with a new timestamp at once
+        :param track: a geo.Track object
+        :param offset_time: time offset between the track and the pictures new timestamps, in seconds
+        :param offset_bearing: the angle to add to the direction of travel (for side cameras)
+        :param offset_distance: distance in meter to move the pictures, in the corrected direction
+        :return: a boolean array, True for the rows which were geotagged
+        '''
+        rows = np.flatnonzero(self.valid & ~np.isnan(self.new_time))
+        lat, lon, bearing, ele, located = track.geotag(self.new_time[rows] - offset_time, offset_bearing, offset_distance)
+        rows = rows[located]
+        self.lat[rows] = lat[located]
+        self.lon[rows] = lon[located]
+        self.ele[rows] = ele[located]
+        self.direction[rows] = bearing[located]
+        geotagged = np.zeros(len(self), dtype=bool)
+        geotagged[rows] = True
+        return geotagged
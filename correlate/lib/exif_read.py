@@ -2,8 +2,10 @@
 
 import os
 import sys
+import struct
 import exifread
 import datetime
+from collections import namedtuple
 from .geo import normalize_bearing
 import uuid
 sys.path.insert(0, os.path.abspath(
@@ -44,6 +46,154 @@ def gps_to_decimal(values, reference):
     return sign * (degrees + minutes / 60 + seconds / 3600)
 
 
+# Minimal stand-ins for the exifread tag objects, so the header reader
+# can fill ExifRead.tags and reuse all the extract_* methods.
+Ratio = namedtuple('Ratio', ['num', 'den'])
+HeaderTag = namedtuple('HeaderTag', ['values'])
+
+# (tag id, exifread name) of the tags read by the header reader, for each IFD
+HEADER_IFD0_TAGS = {0x0132: "Image DateTime",
+                    0x010F: "Image Make",
+                    0x0110: "Image Model",
+                    0x0112: "Image Orientation"}
+HEADER_EXIF_TAGS = {0x9003: "EXIF DateTimeOriginal",
+                    0x9004: "EXIF DateTimeDigitized",
+                    0x9290: "EXIF SubSecTime",
+                    0x9291: "EXIF SubSecTimeOriginal",
+                    0x9292: "EXIF SubSecTimeDigitized"}
+HEADER_GPS_TAGS = {0x0001: "GPS GPSLatitudeRef",
+                   0x0002: "GPS GPSLatitude",
+                   0x0003: "GPS GPSLongitudeRef",
+                   0x0004: "GPS GPSLongitude",
+                   0x0005: "GPS GPSAltitudeRef",
+                   0x0006: "GPS GPSAltitude",
+                   0x0007: "GPS GPSTimeStamp",
+                   0x000B: "GPS GPSDOP",
+                   0x000E: "GPS GPSTrackRef",
+                   0x000F: "GPS GPSTrack",
+                   0x0010: "GPS GPSImgDirectionRef",
+                   0x0011: "GPS GPSImgDirection",
+                   0x001D: "GPS GPSDate"}
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+# byte size of each exif field type
+FIELD_TYPE_SIZE = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8}
+
+
+class _ShortHeader(Exception):
+    '''
+    Raised when the bytes already read don't contain a needed value
+    '''
+    pass
+
+
+def _parse_ifd(tiff, offset, endian, wanted, tags):
+    '''
+    Parse an IFD of a TIFF block and fill tags with the wanted fields.
+    Return the value of the Exif and GPS IFD pointers if they exist.
+    '''
+    if offset + 2 > len(tiff):
+        raise _ShortHeader()
+    entry_count = struct.unpack_from(endian + "H", tiff, offset)[0]
+    if offset + 2 + entry_count * 12 > len(tiff):
+        raise _ShortHeader()
+    pointers = {}
+    for entry in range(entry_count):
+        entry_offset = offset + 2 + entry * 12
+        tag, field_type, count = struct.unpack_from(endian + "HHI", tiff, entry_offset)
+        if tag in (EXIF_IFD_POINTER, GPS_IFD_POINTER):
+            pointers[tag] = struct.unpack_from(endian + "I", tiff, entry_offset + 8)[0]
+            continue
+        if tag not in wanted or field_type not in FIELD_TYPE_SIZE:
+            continue
+        size = FIELD_TYPE_SIZE[field_type] * count
+        if size > 4:
+            value_offset = struct.unpack_from(endian + "I", tiff, entry_offset + 8)[0]
+        else:
+            value_offset = entry_offset + 8
+        if value_offset + size > len(tiff):
+            raise _ShortHeader()
+        raw = tiff[value_offset:value_offset + size]
+        if field_type == 2:
+            values = raw.split(b"\x00", 1)[0].decode("latin-1").strip()
+        elif field_type in (5, 10):
+            fmt = "I" if field_type == 5 else "i"
+            numbers = struct.unpack(endian + fmt * (2 * count), raw)
+            values = [Ratio(numbers[i], numbers[i + 1]) for i in range(0, len(numbers), 2)]
+        elif field_type == 3:
+            values = list(struct.unpack(endian + "H" * count, raw))
+        elif field_type == 4:
+            values = list(struct.unpack(endian + "I" * count, raw))
+        elif field_type == 9:
+            values = list(struct.unpack(endian + "i" * count, raw))
+        else:
+            values = list(raw)
+        tags[wanted[tag]] = HeaderTag(values)
+    return pointers
+
+
+def _parse_tiff(tiff):
+    '''
+    Parse the TIFF block of an APP1 segment and return the tags found
+    '''
+    if tiff[:2] == b"II":
+        endian = "<"
+    elif tiff[:2] == b"MM":
+        endian = ">"
+    else:
+        raise ValueError("Invalid TIFF header")
+    if len(tiff) < 8:
+        raise _ShortHeader()
+    ifd0_offset = struct.unpack_from(endian + "I", tiff, 4)[0]
+    tags = {}
+    pointers = _parse_ifd(tiff, ifd0_offset, endian, HEADER_IFD0_TAGS, tags)
+    if EXIF_IFD_POINTER in pointers:
+        _parse_ifd(tiff, pointers[EXIF_IFD_POINTER], endian, HEADER_EXIF_TAGS, tags)
+    if GPS_IFD_POINTER in pointers:
+        _parse_ifd(tiff, pointers[GPS_IFD_POINTER], endian, HEADER_GPS_TAGS, tags)
+    return tags
+
+
+def read_exif_header(fileobj, header_size=8192):
+    '''
+    Read the date/time and GPS tags from a jpeg file, looking only at its APP1 segment.
+    Only the first header_size bytes of the segment are read, unless the needed values
+    are further in the segment (the APP1 segment can't be larger than 64KB).
+    Raise ValueError if the file isn't a jpeg with an exif APP1 segment.
+
+    :param fileobj: a file object opened in binary mode
+    :param header_size: how many bytes of the APP1 segment to read first
+    :return: a dict of tags, with the same names as exifread
+    '''
+    if fileobj.read(2) != b"\xff\xd8":
+        raise ValueError("Not a jpeg file")
+    while True:
+        marker = fileobj.read(4)
+        if len(marker) < 4 or marker[0] != 0xFF:
+            raise ValueError("Invalid jpeg marker")
+        # Start of scan or end of image: no more metadata segments
+        if marker[1] in (0xDA, 0xD9):
+            raise ValueError("No exif APP1 segment")
+        length = struct.unpack(">H", marker[2:])[0] - 2
+        if marker[1] != 0xE1:
+            fileobj.seek(length, os.SEEK_CUR)
+            continue
+        segment = fileobj.read(min(length, header_size))
+        if segment[:6] != b"Exif\x00\x00":
+            fileobj.seek(length - len(segment), os.SEEK_CUR)
+            continue
+        try:
+            return _parse_tiff(segment[6:])
+        except _ShortHeader:
+            if len(segment) == length:
+                raise ValueError("Truncated exif APP1 segment")
+            segment += fileobj.read(length - len(segment))
+            try:
+                return _parse_tiff(segment[6:])
+            except _ShortHeader:
+                raise ValueError("Truncated exif APP1 segment")
+
+
 def exif_datetime_fields():
     '''
     Date time fields in EXIF
@@ -72,17 +222,35 @@ class ExifRead:
     EXIF class for reading exif from an image
     '''
 
-    def __init__(self, filename, details=False):
+    def __init__(self, filename, details=False, fast=False):
         '''
         Initialize EXIF object with FILE as filename or fileobj
+        With fast=True, only the exif APP1 segment header is read, and exifread
+        is used only if this fails or if there is no DateTimeOriginal tag.
         '''
         self.filename = filename
         if type(filename) == str:
             with open(filename, 'rb') as fileobj:
+                if fast and self._read_header(fileobj):
+                    return
+                fileobj.seek(0)
                 self.tags = exifread.process_file(fileobj, details=details)
         else:
             self.tags = exifread.process_file(filename, details=details)
 
+    def _read_header(self, fileobj):
+        '''
+        Try to fill the tags with the fast header reader
+        '''
+        try:
+            tags = read_exif_header(fileobj)
+        except (ValueError, struct.error):
+            return False
+        if "EXIF DateTimeOriginal" not in tags:
+            return False
+        self.tags = tags
+        return True
+
     def _extract_alternative_fields(self, fields, default=None, field_type=float):
         '''
         Extract a value for a list of ordered fields.
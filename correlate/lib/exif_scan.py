@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from .exif_read import ExifRead
+from .exif_cache import exif_infos_from_exif
+
+'''
+Parallel scanning of the jpeg capture times, for one or several camera folders.
+'''
+
+
+def list_jpeg(directory):
+    '''
+    Return the path of all the jpeg files found in a directory and its subdirectories
+    '''
+    file_list = []
+    for root, sub_folders, files in os.walk(directory):
+        file_list += [os.path.join(root, filename) for filename in files if filename.lower().endswith(".jpg")]
+    return file_list
+
+
+def read_exif_infos(filepath):
+    '''
+    Read the capture time and location of a single image.
+    This function runs inside the worker processes, so it returns plain tuples
+    (filepath, Exif_infos, error message) which can be pickled.
+    '''
+    try:
+        return filepath, exif_infos_from_exif(ExifRead(filepath, fast=True)), None
+    except KeyError as e:
+        return filepath, None, str(e)
+
+
+def scan_capture_times(file_lists, workers=None, chunksize=64, cache=None):
+    '''
+    Read the capture time of every image in several lists of files.
+    All the files from all the lists are sent to the same process pool, so a
+    camera with more pictures doesn't wait for the others.
+
+    :param file_lists: a list of list of jpeg paths (usually one list per camera)
+    :param workers: number of worker processes. None means one per cpu, 1 disables the pool
+    :param chunksize: how many files are sent at once to a worker
+    :param cache: an ExifCache object. Only the files missing from the cache are read.
+    :return: a list of list of (filepath, capture time) tuples, sorted by capture time,
+    in the same order as file_lists
+    '''
+    jobs = [(cam_idx, filepath) for cam_idx, file_list in enumerate(file_lists) for filepath in file_list]
+    results = [None] * len(jobs)
+    to_read = []
+    for job_idx, (cam_idx, filepath) in enumerate(jobs):
+        exif_infos = cache.get(filepath) if cache is not None else None
+        if exif_infos is not None:
+            results[job_idx] = (filepath, exif_infos, None)
+        else:
+            to_read.append(job_idx)
+    paths = [jobs[job_idx][1] for job_idx in to_read]
+
+    if workers == 1 or len(paths) < chunksize:
+        _store_results(to_read, map(read_exif_infos, paths), results, cache)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            _store_results(to_read, executor.map(read_exif_infos, paths, chunksize=chunksize), results, cache)
+
+    return _group_results(jobs, results, len(file_lists))
+
+
+def _store_results(to_read, read_results, results, cache):
+    '''
+    Put the freshly read exif data in the results list, and in the cache
+    '''
+    for job_idx, result in zip(to_read, read_results):
+        results[job_idx] = result
+        filepath, exif_infos, error = result
+        if cache is not None and exif_infos is not None:
+            cache.put(filepath, exif_infos)
+
+
+def _group_results(jobs, results, list_count):
+    '''
+    Dispatch the results back to their original list, and sort each list by capture time
+    '''
+    grouped = [[] for i in range(list_count)]
+    for (cam_idx, filepath), (path, exif_infos, error) in zip(jobs, results):
+        if exif_infos is None or exif_infos.capture_time is None:
+            # if any of the required tags are not set the image is not added to the list
+            print("Skipping {0}: {1}".format(path, error or "no capture time"))
+            continue
+        grouped[cam_idx].append((path, exif_infos.capture_time))
+
+    for files in grouped:
+        files.sort(key=lambda file: file[1])
+    return grouped
@@ -1,11 +1,48 @@
+import io
+import os
 import sys
 import json
+import struct
+import shutil
+import tempfile
+import threading
 import piexif
 
 from .geo import decimal_to_dms
 
 from .error import print_error
 
+EXIF_HEADER = b"Exif\x00\x00"
+# Write modes returned by ExifEdit.write
+WRITE_IN_PLACE = "in place"
+WRITE_REWRITE = "rewrite"
+# Free space added at the end of the Exif segment when the whole file is rewritten,
+# so the next changes (a new geotag for example) can be written in place.
+EXIF_PADDING = 1024
+# Maximum size of the Exif data in the APP1 segment (65535 minus the 2 bytes of the length field)
+MAX_EXIF_SIZE = 65533
+JOURNAL_FILENAME = "exif_journal.jsonl"
+
+
+def find_exif_segment(fileobj):
+    """Walk the jpeg markers until the Exif APP1 segment.
+    :return: (offset, size) of the whole segment, marker included, or None if there isn't one"""
+    if fileobj.read(2) != b"\xff\xd8":
+        return None
+    offset = 2
+    while True:
+        header = fileobj.read(4)
+        if len(header) < 4 or header[0] != 0xff:
+            return None
+        marker, length = header[1], struct.unpack(">H", header[2:])[0]
+        # start of scan, no more metadata after that
+        if marker == 0xda:
+            return None
+        if marker == 0xe1 and fileobj.read(6) == EXIF_HEADER:
+            return offset, length + 2
+        offset += length + 2
+        fileobj.seek(offset)
+
 
 class ExifEdit(object):
 
@@ -13,14 +50,26 @@ class ExifEdit(object):
         """Initialize the object"""
         self._filename = filename
         self._ef = None
+        # position and size of the Exif segment in the file
+        self._segment = None
         try:
-            self._ef = piexif.load(filename)
+            self._ef = self._load()
         except IOError:
             etype, value, traceback = sys.exc_info()
-            print >> sys.stderr, "Error opening file:", value
+            print("Error opening file:", value, file=sys.stderr)
         except ValueError:
             etype, value, traceback = sys.exc_info()
-            print >> sys.stderr, "Error opening file:", value
+            print("Error opening file:", value, file=sys.stderr)
+
+    def _load(self):
+        """Load the exif data, reading only the Exif segment if the file has one"""
+        with open(self._filename, "rb") as f:
+            self._segment = find_exif_segment(f)
+            if self._segment is not None:
+                offset, size = self._segment
+                f.seek(offset + 4)
+                return piexif.load(f.read(size - 4))
+        return piexif.load(self._filename)
 
     def add_image_description(self, dict):
         """Add a dict to image description."""
@@ -106,17 +155,115 @@ class ExifEdit(object):
                 tag_key, main_key, value))
 
     def write(self, filename=None):
-        """Save exif data to file."""
+        """Save exif data to file.
+        When the new exif data fits in the existing Exif segment, only this segment is
+        overwritten, and the rest of the file is left untouched. Otherwise the whole jpeg
+        is written to a temporary file, which then replaces the original.
+        :return: WRITE_IN_PLACE or WRITE_REWRITE, or None if the file couldn't be saved"""
         if filename is None:
             filename = self._filename
 
         exif_bytes = piexif.dump(self._ef)
 
-        with open(self._filename, "rb") as fin:
-            img = fin.read()
         try:
-            piexif.insert(exif_bytes, img, filename)
+            if filename == self._filename and self._write_in_place(exif_bytes):
+                return WRITE_IN_PLACE
+            self._rewrite(exif_bytes, filename)
+            return WRITE_REWRITE
 
         except IOError:
             type, value, traceback = sys.exc_info()
-            print >> sys.stderr, "Error saving file:", value
+            print("Error saving file:", value, file=sys.stderr)
+
+    def _write_in_place(self, exif_bytes):
+        """Overwrite the Exif segment, padded with zeros to keep its size.
+        :return: False if the exif data doesn't fit in the segment"""
+        if self._segment is None:
+            return False
+        offset, size = self._segment
+        if len(exif_bytes) + 4 > size:
+            return False
+        segment = b"\xff\xe1" + struct.pack(">H", size - 2) + exif_bytes
+        segment += b"\x00" * (size - len(segment))
+        fd = os.open(self._filename, os.O_WRONLY | getattr(os, "O_BINARY", 0))
+        try:
+            if hasattr(os, "pwrite"):
+                os.pwrite(fd, segment, offset)
+            else:
+                os.lseek(fd, offset, os.SEEK_SET)
+                os.write(fd, segment)
+        finally:
+            os.close(fd)
+        return True
+
+    def _rewrite(self, exif_bytes, filename):
+        """Write the whole jpeg with the new exif data in a temporary file, and rename it"""
+        with open(self._filename, "rb") as fin:
+            img = fin.read()
+        output = io.BytesIO()
+        # the padding must not push the segment over its maximum size
+        padding = max(0, min(EXIF_PADDING, MAX_EXIF_SIZE - len(exif_bytes)))
+        piexif.insert(exif_bytes + b"\x00" * padding, img, output)
+
+        directory = os.path.dirname(os.path.abspath(filename))
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as fout:
+                fout.write(output.getvalue())
+            if os.path.exists(filename):
+                shutil.copymode(filename, temp_path)
+            os.replace(temp_path, filename)
+        except:
+            os.remove(temp_path)
+            raise
+        if filename == self._filename:
+            with open(filename, "rb") as f:
+                self._segment = find_exif_segment(f)
+
+
+class WriteJournal(object):
+    """Record of the images whose exif data has been written, one json line per image
+    with its path and its new tags, so an interrupted write can be resumed."""
+
+    def __init__(self, directory, resume=False, filename=JOURNAL_FILENAME):
+        """Open the journal file in directory.
+        :param resume: keep the images already in the journal, instead of starting a new one"""
+        self.path = os.path.join(directory, filename)
+        self.done = {}
+        if resume and os.path.isfile(self.path):
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # last line of an interrupted write
+                        continue
+                    self.done[record["path"]] = record["tags"]
+        self._file = open(self.path, "a" if resume else "w")
+        if self._file.tell() > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # don't append the next record to an incomplete line
+                    self._file.write("\n")
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def is_done(self, filename, tags):
+        """True if the image has already been written with these tags"""
+        return self.done.get(os.path.abspath(filename)) == tags
+
+    def add(self, filename, tags):
+        """Record an image as written. Can be called from several threads."""
+        line = json.dumps({"path": os.path.abspath(filename), "tags": tags})
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
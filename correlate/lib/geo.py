@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import bisect
 import datetime
 import math
 
+import numpy as np
+import pyproj
+
 WGS84_a = 6378137.0
 WGS84_b = 6356752.314245
+WGS84_GEOD = pyproj.Geod(ellps='WGS84')
 
 
 def ecef_from_lla(lat, lon, alt):
@@ -148,12 +153,30 @@ def normalize_bearing(bearing, check_hex=False):
     return bearing
 
 
+def _bisect_time(points, t):
+    '''
+    Return the index of the first point strictly after time t (binary search)
+    '''
+    lo, hi = 0, len(points)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if t < points[mid][0]:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
 def interpolate_lat_lon(points, t, max_dt=1):
     '''
     Return interpolated lat, lon and compass bearing for time t.
 
     Points is a list of tuples (time, lat, lon, elevation), t a datetime object.
+    For many lookups in the same track, use a Track object instead.
     '''
+    if isinstance(points, Track):
+        return points.interpolate(t, max_dt)
+
     # find the enclosing points in sorted list
     if (t <= points[0][0]) or (t >= points[-1][0]):
         if t <= points[0][0]:
@@ -182,14 +205,9 @@ def interpolate_lat_lon(points, t, max_dt=1):
             x = points[-1]
             return (x[1], x[2], bearing, x[3])
     else:
-        for i, point in enumerate(points):
-            if t < point[0]:
-                if i > 0:
-                    before = points[i - 1]
-                else:
-                    before = points[i]
-                after = points[i]
-                break
+        i = _bisect_time(points, t)
+        before = points[i - 1]
+        after = points[i]
 
     # time diff
     dt_before = (t - before[0]).total_seconds()
@@ -210,3 +228,115 @@ def interpolate_lat_lon(points, t, max_dt=1):
         ele = None
 
     return lat, lon, bearing, ele
+
+
+def compute_bearings(start_lat, start_lon, end_lat, end_lon):
+    '''
+    Same as compute_bearing, for numpy arrays of coordinates.
+    '''
+    start_lat = np.radians(start_lat)
+    end_lat = np.radians(end_lat)
+    dLong = np.radians(end_lon) - np.radians(start_lon)
+
+    y = np.sin(dLong) * np.cos(end_lat)
+    x = np.cos(start_lat) * np.sin(end_lat) - \
+        np.sin(start_lat) * np.cos(end_lat) * np.cos(dLong)
+    return (np.degrees(np.arctan2(y, x)) + 360.0) % 360.0
+
+
+class Track(object):
+    '''
+    A gps track, indexed by time for fast interpolation.
+
+    It's built once from a list of tuples (time, lat, lon, elevation), as returned by the
+    gps_parser functions. The times are stored as an array of seconds since the first
+    point, and the bearing of each segment is computed in advance.
+    If the tuples have a fifth value (time, lat, lon, elevation, heading), like the ubx
+    points, the heading is used instead of the bearing of the segment when it's not None.
+    '''
+
+    def __init__(self, points, path=None):
+        if len(points) < 2:
+            raise ValueError("A track needs at least 2 points")
+        self.path = path
+        self.points = points
+        self.origin = points[0][0]
+        self.times = np.array([(point[0] - self.origin).total_seconds() for point in points])
+        self.lats = np.array([point[1] for point in points], dtype=float)
+        self.lons = np.array([point[2] for point in points], dtype=float)
+        # missing elevations are stored as nan
+        self.eles = np.array([np.nan if point[3] is None else point[3] for point in points], dtype=float)
+        self.bearings = compute_bearings(self.lats[:-1], self.lons[:-1], self.lats[1:], self.lons[1:])
+        if len(points[0]) > 4:
+            self.headings = np.array([np.nan if point[4] is None else point[4] for point in points], dtype=float)
+        else:
+            self.headings = None
+
+    def __len__(self):
+        return len(self.points)
+
+    def interpolate(self, t, max_dt=1):
+        '''
+        Return interpolated lat, lon, compass bearing and elevation for time t (a datetime object).
+        Raise a ValueError if t is more than max_dt seconds outside the track.
+        '''
+        lat, lon, bearing, ele, valid = self.interpolate_many([t], max_dt)
+        if not valid[0]:
+            raise ValueError("time t not in scope of gpx file")
+        return lat[0], lon[0], bearing[0], None if np.isnan(ele[0]) else ele[0]
+
+    def interpolate_many(self, times, max_dt=1):
+        '''
+        Interpolate the position for a list of datetime objects at once.
+
+        :param times: a list of datetime objects, or a numpy array of POSIX timestamps (in seconds)
+        :param max_dt: maximum extrapolation, in seconds, before and after the track
+        :return: numpy arrays (lat, lon, bearing, elevation, valid). Elevation is nan when unknown,
+        valid is False for the times which are too far outside the track.
+        '''
+        if isinstance(times, np.ndarray) and times.dtype.kind == 'f':
+            t = times - self.origin.timestamp()
+        else:
+            t = np.array([(date - self.origin).total_seconds() for date in times], dtype=float)
+        # index of the first point after t, which is the end of the segment used for interpolation.
+        # Out of scope times use the first or the last segment.
+        after = np.clip(np.searchsorted(self.times, t, side='right'), 1, len(self.times) - 1)
+        before = after - 1
+
+        dt_before = t - self.times[before]
+        dt_after = self.times[after] - t
+        span = dt_before + dt_after
+        weight = np.divide(dt_before, span, out=np.zeros_like(span), where=span != 0)
+
+        lat = self.lats[before] + (self.lats[after] - self.lats[before]) * weight
+        lon = self.lons[before] + (self.lons[after] - self.lons[before]) * weight
+        ele = self.eles[before] + (self.eles[after] - self.eles[before]) * weight
+        bearing = self.bearings[before]
+        if self.headings is not None:
+            # interpolate the heading on the shortest way around the circle
+            turn = (self.headings[after] - self.headings[before] + 180) % 360 - 180
+            heading = (self.headings[before] + turn * weight) % 360
+            bearing = np.where(np.isnan(heading), bearing, heading)
+
+        out_of_scope = np.maximum(self.times[0] - t, t - self.times[-1])
+        valid = out_of_scope <= max_dt
+        for dt in out_of_scope[valid & (out_of_scope > 0)]:
+            print("time t not in scope of gpx file by {} seconds, extrapolating...".format(dt))
+
+        return lat, lon, bearing, ele, valid
+
+    def geotag(self, times, offset_bearing=0, offset_distance=0, max_dt=1):
+        '''
+        Compute the location and direction of a batch of pictures taken by the same camera.
+
+        :param times: a list of datetime objects, or a numpy array of POSIX timestamps
+        :param offset_bearing: the angle to add to the direction of travel (for side cameras)
+        :param offset_distance: distance in meter to move the pictures, in the corrected direction
+        :param max_dt: maximum extrapolation, in seconds, before and after the track
+        :return: numpy arrays (lat, lon, bearing, elevation, valid), as interpolate_many
+        '''
+        lat, lon, bearing, ele, valid = self.interpolate_many(times, max_dt)
+        bearing = (bearing + offset_bearing) % 360
+        if offset_distance != 0 and len(lat):
+            lon, lat, back_azimuth = WGS84_GEOD.fwd(lon, lat, bearing, np.full(len(lat), float(offset_distance)))
+        return lat, lon, bearing, ele, valid
@@ -3,8 +3,13 @@
 import sys
 import os
 import datetime
+import mmap
+import struct
 import time
-from .geo import gpgga_to_dms, utc_to_localtime
+from functools import reduce
+from itertools import accumulate
+from operator import xor
+from .geo import gpgga_to_dms, utc_to_localtime, Track
 
 
 import gpxpy
@@ -14,6 +19,9 @@ import pynmea2
 Methods for parsing gps data from various file format e.g. GPX, NMEA, SRT.
 '''
 
+# Tracks already loaded by load_track, with the size and mtime of their file
+_loaded_tracks = {}
+
 
 def get_lat_lon_time_from_gpx(gpx_file, local_time=True):
     '''
@@ -48,7 +56,92 @@ def get_lat_lon_time_from_gpx(gpx_file, local_time=True):
     return points
 
 
-def get_lat_lon_time_from_nmea(nmea_file, local_time=True):
+NMEA_TALKERS = ("GN", "GP", "GL", "GB", "GA")
+
+
+def _nmea_fields(line):
+    '''
+    Split a nmea sentence into its fields, after checking its checksum if there is one.
+    Anything before the "$" is ignored.
+    Returns None if the line isn't a valid sentence.
+    '''
+    start = line.find("$")
+    if start < 0:
+        return None
+    end = line.find("*", start)
+    if end < 0:
+        body = line[start + 1:].rstrip("\r\n")
+    else:
+        body = line[start + 1:end]
+        try:
+            if reduce(xor, body.encode("ascii"), 0) != int(line[end + 1:end + 3], 16):
+                return None
+        except (ValueError, UnicodeEncodeError):
+            return None
+    return body.split(",")
+
+
+def _nmea_time(hhmmss):
+    hours, minutes, seconds = int(hhmmss[0:2]), int(hhmmss[2:4]), float(hhmmss[4:])
+    microseconds = int(round((seconds - int(seconds)) * 1000000))
+    return hours, minutes, int(seconds), min(microseconds, 999999)
+
+
+def _nmea_degrees(value, hemisphere, degree_digits):
+    decimal = int(value[:degree_digits]) + float(value[degree_digits:]) / 60
+    return -decimal if hemisphere in ("S", "W") else decimal
+
+
+def iter_nmea_points(nmea_file):
+    '''
+    Read location and time stamps from a NMEA file, in a single pass.
+
+    Only the GGA and RMC sentences are decoded: RMC for the date, GGA for the position.
+    GGA sentences without a fix, or with a wrong checksum, are skipped.
+    The GGA sentences found before the first RMC are kept until its date is known.
+
+    Yields tuples (time, lat, lon, altitude), time is an utc datetime.
+    '''
+    date = None
+    waiting = []
+    with open(nmea_file, "r") as f:
+        for line in f:
+            dollar = line.find("$")
+            if dollar < 0 or line[dollar + 1:dollar + 3] not in NMEA_TALKERS:
+                continue
+            sentence = line[dollar + 3:dollar + 6]
+            if sentence not in ("GGA", "RMC"):
+                continue
+            fields = _nmea_fields(line)
+            if fields is None:
+                continue
+            try:
+                if sentence == "RMC":
+                    if len(fields[9]) == 6:
+                        date = (2000 + int(fields[9][4:6]), int(fields[9][2:4]), int(fields[9][0:2]))
+                        for gga in waiting:
+                            yield _gga_point(date, gga)
+                        waiting = []
+                elif fields[1] and fields[2] and fields[4]:
+                    gga = (_nmea_time(fields[1]),
+                           _nmea_degrees(fields[2], fields[3], 2),
+                           _nmea_degrees(fields[4], fields[5], 3),
+                           float(fields[9]) if fields[9] else None)
+                    if date is None:
+                        waiting.append(gga)
+                    else:
+                        yield _gga_point(date, gga)
+            except (ValueError, IndexError):
+                continue
+
+
+def _gga_point(date, gga):
+    nmea_time, lat, lon, alt = gga
+    timestamp = datetime.datetime(*(date + nmea_time), tzinfo=datetime.timezone.utc)
+    return timestamp, lat, lon, alt
+
+
+def get_lat_lon_time_from_nmea(nmea_file, local_time=True, use_pynmea2=False):
     '''
     Read location and time stamps from a track in a NMEA file.
 
@@ -56,8 +149,22 @@ def get_lat_lon_time_from_nmea(nmea_file, local_time=True):
 
     GPX stores time in UTC, by default we assume your camera used the local time
     and convert accordingly.
+
+    The file is read with iter_nmea_points, or with pynmea2 if use_pynmea2 is True.
+    '''
+    if use_pynmea2:
+        return get_lat_lon_time_from_nmea_pynmea2(nmea_file, local_time)
+    points = list(iter_nmea_points(nmea_file))
+    points.sort(key=lambda point: point[0])
+    return points
+
+
+def get_lat_lon_time_from_nmea_pynmea2(nmea_file, local_time=True):
+    '''
+    Read location and time stamps from a track in a NMEA file, with pynmea2.
+
+    Returns a list of tuples (time, lat, lon).
     '''
-    
     gga_Talker_id = ("$GNGGA", "$GPGGA", "$GLGGA", "$GBGGA", "$GAGGA")
     rmc_Talker_id = ("$GNRMC", "$GPRMC", "$GLRMC", "$GBRMC", "$GARMC")
     
@@ -86,4 +193,116 @@ def get_lat_lon_time_from_nmea(nmea_file, local_time=True):
             points.append((timestamp, lat, lon, alt))
 
     points.sort()
-    return points
\ No newline at end of file
+    return points
+
+
+UBX_SYNC = b"\xb5\x62"
+UBX_NAV_PVT = (0x01, 0x07)
+UBX_NAV_ATT = (0x01, 0x05)
+# header: sync chars, class, id, payload length
+UBX_HEADER = struct.Struct("<2sBBH")
+# iTOW, year, month, day, hour, min, sec, valid, tAcc, nano, fixType, flags, flags2, numSV,
+# lon, lat, height, hMSL, hAcc, vAcc, velN, velE, velD, gSpeed, headMot, sAcc, headAcc, pDOP, (reserved),
+# headVeh, magDec, magAcc
+UBX_NAV_PVT_PAYLOAD = struct.Struct("<IHBBBBBBIiBBBBiiiiIIiiiiiIIH6xihH")
+# iTOW, version, (reserved), roll, pitch, heading, accRoll, accPitch, accHeading
+UBX_NAV_ATT_PAYLOAD = struct.Struct("<IB3xiiiIII")
+
+
+def _ubx_checksum(data):
+    '''
+    8-bit Fletcher checksum of the ubx messages. ck_b is the sum of the running sums.
+    '''
+    return sum(data) & 0xff, sum(accumulate(data)) & 0xff
+
+
+def iter_ubx_messages(data, messages=(UBX_NAV_PVT, UBX_NAV_ATT)):
+    '''
+    Yield (class, id, payload) for every valid ubx message of the given types found in
+    data (bytes or mmap). Anything between these messages, like the nmea sentences or the
+    other ubx messages, is skipped.
+    '''
+    position = data.find(UBX_SYNC)
+    while 0 <= position <= len(data) - 8:
+        sync, msg_class, msg_id, length = UBX_HEADER.unpack_from(data, position)
+        end = position + 6 + length
+        if (msg_class, msg_id) in messages and end + 2 <= len(data) and \
+                _ubx_checksum(data[position + 2:end]) == (data[end], data[end + 1]):
+            yield msg_class, msg_id, data[position + 6:end]
+            position = data.find(UBX_SYNC, end + 2)
+        else:
+            position = data.find(UBX_SYNC, position + 2)
+
+
+def _pvt_point(pvt):
+    (itow, year, month, day, hour, minute, second, valid, t_acc, nano, fix_type, flags, flags2, num_sv,
+     lon, lat, height, h_msl, h_acc, v_acc, vel_n, vel_e, vel_d, g_speed, head_mot, s_acc, head_acc, p_dop,
+     head_veh, mag_dec, mag_acc) = pvt
+    # validDate and validTime, gnssFixOK with at least a 2D fix
+    if valid & 0x03 != 0x03 or not flags & 0x01 or fix_type < 2:
+        return None
+    try:
+        timestamp = datetime.datetime(year, month, day, hour, minute, second, tzinfo=datetime.timezone.utc)
+    except ValueError:
+        return None
+    timestamp += datetime.timedelta(microseconds=nano / 1000.0)
+    # headVehValid
+    heading = head_veh * 1e-5 if flags & 0x20 else None
+    return timestamp, lat * 1e-7, lon * 1e-7, h_msl / 1000.0, heading
+
+
+def get_lat_lon_time_from_ubx(ubx_file, local_time=True):
+    '''
+    Read location and time stamps from the UBX-NAV-PVT messages of a binary u-blox log
+    (for example a gpspipe -R capture). The heading comes from the UBX-NAV-ATT message
+    with the same time of week if there is one (F9R dead reckoning), else from the vehicle
+    heading of the NAV-PVT message when it's valid.
+    Messages without a valid fix, date and time are skipped.
+
+    Returns a list of tuples (time, lat, lon, altitude, heading), heading is None if it's unknown.
+    Like with the nmea files, the time is in UTC.
+    '''
+    pvt_points = []
+    headings = {}
+    if os.path.getsize(ubx_file) > 0:
+        with open(ubx_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for msg_class, msg_id, payload in iter_ubx_messages(data):
+                if (msg_class, msg_id) == UBX_NAV_ATT and len(payload) == UBX_NAV_ATT_PAYLOAD.size:
+                    itow, version, roll, pitch, heading = UBX_NAV_ATT_PAYLOAD.unpack(payload)[:5]
+                    headings[itow] = heading * 1e-5
+                elif (msg_class, msg_id) == UBX_NAV_PVT and len(payload) == UBX_NAV_PVT_PAYLOAD.size:
+                    pvt = UBX_NAV_PVT_PAYLOAD.unpack(payload)
+                    point = _pvt_point(pvt)
+                    if point is not None:
+                        pvt_points.append((pvt[0], point))
+
+    points = [point[:4] + (headings.get(itow, point[4]),) for itow, point in pvt_points]
+    points.sort(key=lambda point: point[0])
+    return points
+
+
+def load_track(gnss_file, local_time=True):
+    '''
+    Read a gpx, nmea or ubx file and return a Track object.
+
+    The track is kept in memory, so loading the same file again returns the same
+    object without parsing it, unless the file has been modified.
+    '''
+    stat = os.stat(gnss_file)
+    key = (os.path.abspath(gnss_file), local_time)
+    file_state = (stat.st_size, stat.st_mtime_ns)
+    if key in _loaded_tracks and _loaded_tracks[key][0] == file_state:
+        return _loaded_tracks[key][1]
+
+    if gnss_file.lower().endswith(".gpx"):
+        points = get_lat_lon_time_from_gpx(gnss_file, local_time)
+    elif gnss_file.lower().endswith(".nmea"):
+        points = get_lat_lon_time_from_nmea(gnss_file, local_time)
+    elif gnss_file.lower().endswith(".ubx"):
+        points = get_lat_lon_time_from_ubx(gnss_file, local_time)
+    else:
+        raise ValueError("Wrong gnss file! It should be a .gpx, .nmea or .ubx file.")
+
+    track = Track(points, gnss_file)
+    _loaded_tracks[key] = (file_state, track)
+    return track
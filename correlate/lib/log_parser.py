@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import datetime
+from collections import namedtuple
+
+import numpy as np
+
+from .camera_table import log_infos
+
+'''
+Streaming parser for the cam_log files written by the Raspberry Pi.
+
+The first versions of the Pi software wrote python repr, a shutter line looks like:
+1531044000.123,('KTakepic', [15, 312, 42], 1531044000.435),0b1111,ok
+(timestamp, (command, [cameras mask, time to answer, picture number], return timestamp), ...)
+
+The current version writes a versioned log with fixed columns (see raspberry/session_log.py):
+#V4MPOD_LOG,1,record,timestamp,return_timestamp,cams,cams_return,time_to_answer,pic_number,status
+shutter,1531044000.123000,1531044000.435000,15,15,312,42,ok
+gnss,1531044001.000000,,,,,,pps
+'''
+
+SHUTTER_ACTION = "KTakepic"
+# the characters around the values of a shutter line, once split on the commas
+FIELD_DECORATION = "[]()' \t\r\n"
+
+LOG_MAGIC = "#V4MPOD_LOG"
+LOG_COLUMNS = ("record", "timestamp", "return_timestamp", "cams", "cams_return", "time_to_answer", "pic_number", "status")
+SHUTTER_RECORD = "shutter"
+GNSS_RECORD = "gnss"
+
+Log_arrays = namedtuple('Log_arrays', ['log_time', 'return_time', 'cams', 'cams_return', 'time_to_answer', 'pic_number', 'status'])
+Gnss_status = namedtuple('Gnss_status', ['time', 'status'])
+
+
+def log_version(path_to_logfile):
+    '''
+    The version of the log format, from its header line. 0 for the python repr logs, without header.
+    '''
+    with open(path_to_logfile, "r") as logfile:
+        first_line = logfile.readline()
+    if not first_line.startswith(LOG_MAGIC + ","):
+        return 0
+    try:
+        return int(first_line.split(",", 2)[1])
+    except ValueError:
+        return 0
+
+
+def iter_records(path_to_logfile, record):
+    '''
+    Read the records of a given type in a versioned log, one at a time.
+    The columns added by the next versions, at the end of the line, are ignored.
+    :param record: the record type, "shutter", "event" or "gnss"
+    :return: a generator of lists of string, one string per column of LOG_COLUMNS
+    '''
+    prefix = record + ","
+    last_column = len(LOG_COLUMNS) - 1
+    with open(path_to_logfile, "r") as logfile:
+        for line in logfile:
+            if line.startswith(prefix):
+                fields = line.rstrip("\r\n").split(",", last_column)
+                if len(fields) <= last_column:
+                    # truncated line, the end of the log of a power cut
+                    continue
+                # drop the columns of the next versions
+                fields[last_column] = fields[last_column].split(",", 1)[0]
+                yield fields
+
+
+def iter_log(path_to_logfile, stats=None):
+    '''
+    Read the shutter lines of a log file, one at a time.
+    The cameras answer is stored as an int bitfield: the camera at position pos answered if
+    cam_return >> pos & 1.
+
+    :param path_to_logfile: path to the logfile
+    :param stats: an optional dict, updated with the count of "lines", "shutters" and "malformed" lines
+    (shutter lines which can't be parsed) when the generator is exhausted or closed
+    :return: a generator of log_infos namedtuple
+    '''
+    fromtimestamp = datetime.datetime.fromtimestamp
+    lines = shutters = malformed = 0
+    try:
+        with open(path_to_logfile, "r") as logfile:
+            for lines, line in enumerate(logfile, 1):
+                if line.startswith(SHUTTER_RECORD + ","):
+                    # versioned log: shutter,timestamp,return_timestamp,cams,cams_return,time_to_answer,pic_number,...
+                    fields = line.split(",", 7)
+                    try:
+                        log_line = log_infos(fromtimestamp(float(fields[1])), SHUTTER_ACTION, fromtimestamp(float(fields[2])),
+                                             int(fields[5]), int(fields[4]), int(fields[6]))
+                    except (IndexError, ValueError, OverflowError, OSError):
+                        malformed += 1
+                        continue
+                    shutters += 1
+                    yield log_line
+                    continue
+                if SHUTTER_ACTION not in line or line.startswith("#"):
+                    continue
+                # timestamp, (action, [mask, time to answer, picture number], return timestamp), ...
+                fields = line.split(",", 6)
+                try:
+                    if fields[1].strip(FIELD_DECORATION) != SHUTTER_ACTION:
+                        raise ValueError
+                    log_line = log_infos(fromtimestamp(float(fields[0].strip(FIELD_DECORATION))),
+                                         SHUTTER_ACTION,
+                                         fromtimestamp(float(fields[5].strip(FIELD_DECORATION))),
+                                         int(fields[3].strip(FIELD_DECORATION)),
+                                         int(fields[2].strip(FIELD_DECORATION)),
+                                         int(fields[4].strip(FIELD_DECORATION)))
+                except (IndexError, ValueError, OverflowError, OSError):
+                    malformed += 1
+                    continue
+                shutters += 1
+                yield log_line
+    finally:
+        if stats is not None:
+            stats.update(lines=lines, shutters=shutters, malformed=malformed)
+
+
+def read_log_arrays(path_to_logfile):
+    '''
+    Read all the shutter records of a log file into arrays
+    :return: a Log_arrays namedtuple. The times are POSIX timestamps, the cameras bitfields and
+    the picture numbers are int arrays, status is a string array. The python repr logs don't
+    store the request bitfield and the status: cams is -1 and status is empty.
+    '''
+    if log_version(path_to_logfile):
+        records = list(iter_records(path_to_logfile, SHUTTER_RECORD))
+        columns = list(zip(*records)) if records else [()] * len(LOG_COLUMNS)
+        try:
+            return Log_arrays(np.array(columns[1], dtype=float),
+                              np.array(columns[2], dtype=float),
+                              np.array(columns[3], dtype=np.int64),
+                              np.array(columns[4], dtype=np.int64),
+                              np.array(columns[5], dtype=np.int64),
+                              np.array(columns[6], dtype=np.int64),
+                              np.array(columns[7], dtype=str))
+        except ValueError:
+            # some records can't be converted, fall back to the line by line parser which skips them
+            pass
+    loglist = list(iter_log(path_to_logfile))
+    return Log_arrays(np.array([log_line.log_timestamp.timestamp() for log_line in loglist], dtype=float),
+                      np.array([log_line.return_timestamp.timestamp() for log_line in loglist], dtype=float),
+                      np.full(len(loglist), -1, dtype=np.int64),
+                      np.array([log_line.cam_return for log_line in loglist], dtype=np.int64),
+                      np.array([log_line.time_to_answer for log_line in loglist], dtype=np.int64),
+                      np.array([log_line.pic_number for log_line in loglist], dtype=np.int64),
+                      np.full(len(loglist), "", dtype=str))
+
+
+def read_gnss_status(path_to_logfile):
+    '''
+    Read the GNSS/PPS status records of a versioned log file
+    :return: a Gnss_status namedtuple with an array of POSIX timestamps and an array of status strings
+    (like "pps", "no pps" or "fix 3"). Both are empty for the python repr logs.
+    '''
+    records = list(iter_records(path_to_logfile, GNSS_RECORD))
+    return Gnss_status(np.array([fields[1] for fields in records], dtype=float),
+                       np.array([fields[7] for fields in records], dtype=str))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import namedtuple
+
+import numpy as np
+
+'''
+Scoring of a correlation: statistics of the time deltas between the log timestamps and the
+pictures timestamps, computed on arrays of POSIX timestamps (nan for the missing pictures).
+'''
+
+Delta_stats = namedtuple('Delta_stats', ['count', 'mean', 'std', 'median', 'mad'])
+
+
+def time_deltas(log_times, pic_times):
+    '''
+    The time deltas (log - picture) in seconds, for each log timestamp with a picture.
+    When the lists don't have the same length, the extra items are ignored.
+    '''
+    length = min(len(log_times), len(pic_times))
+    deltas = np.asarray(log_times[:length], dtype=float) - np.asarray(pic_times[:length], dtype=float)
+    return deltas[~np.isnan(deltas)]
+
+
+def delta_stats(log_times, pic_times):
+    '''
+    Compute the statistics of the time deltas between the log and the pictures
+    :param log_times: the log timestamps, in seconds
+    :param pic_times: the pictures timestamps, in seconds, nan when there is no picture
+    :return: a Delta_stats namedtuple: the number of deltas, their mean and standard deviation, and
+    the robust equivalents, median and median absolute deviation. The values are nan without any delta.
+    '''
+    return stats_of_deltas(time_deltas(log_times, pic_times))
+
+
+def stats_of_deltas(deltas):
+    '''
+    Compute the statistics of time deltas already computed, nan for the missing pictures
+    :return: a Delta_stats namedtuple, as delta_stats
+    '''
+    deltas = np.asarray(deltas, dtype=float)
+    deltas = deltas[~np.isnan(deltas)]
+    if len(deltas) == 0:
+        return Delta_stats(0, np.nan, np.nan, np.nan, np.nan)
+    median = np.median(deltas)
+    return Delta_stats(len(deltas), float(deltas.mean()), float(deltas.std()), float(median),
+                       float(np.median(np.abs(deltas - median))))
+
+
+class IncrementalScore(object):
+    '''
+    Standard deviation of the time deltas between the log and the pictures, updated in O(1) when the
+    timestamp of a single picture changes. Useful to evaluate many candidate alignments.
+
+    The sums are computed around the first delta, to keep the precision with large timestamps.
+    '''
+
+    def __init__(self, log_times, pic_times):
+        length = min(len(log_times), len(pic_times))
+        self.log_times = np.asarray(log_times[:length], dtype=float)
+        self.deltas = self.log_times - np.asarray(pic_times[:length], dtype=float)
+        valid = ~np.isnan(self.deltas)
+        self.reference = self.deltas[valid][0] if valid.any() else 0.0
+        centered = self.deltas[valid] - self.reference
+        self.count = int(valid.sum())
+        self.sum = float(centered.sum())
+        self.sum_sq = float((centered ** 2).sum())
+
+    def _moments(self, count, total, total_sq):
+        if count == 0:
+            return np.nan, np.nan
+        mean = total / count
+        return self.reference + mean, max(total_sq / count - mean ** 2, 0.0) ** 0.5
+
+    @property
+    def mean(self):
+        return self._moments(self.count, self.sum, self.sum_sq)[0]
+
+    @property
+    def std(self):
+        return self._moments(self.count, self.sum, self.sum_sq)[1]
+
+    def _update(self, idx, pic_time):
+        '''
+        The count and sums after setting the timestamp of the picture idx (nan to remove it)
+        '''
+        count, total, total_sq = self.count, self.sum, self.sum_sq
+        old, new = self.deltas[idx], self.log_times[idx] - pic_time
+        if not np.isnan(old):
+            count, total, total_sq = count - 1, total - (old - self.reference), total_sq - (old - self.reference) ** 2
+        if not np.isnan(new):
+            count, total, total_sq = count + 1, total + (new - self.reference), total_sq + (new - self.reference) ** 2
+        return count, total, total_sq, new
+
+    def try_set(self, idx, pic_time):
+        '''
+        The standard deviation if the picture idx had this timestamp (nan for no picture). Nothing is changed.
+        '''
+        count, total, total_sq, new = self._update(idx, pic_time)
+        return self._moments(count, total, total_sq)[1]
+
+    def set(self, idx, pic_time):
+        '''
+        Change the timestamp of the picture idx (nan for no picture), and return the new standard deviation
+        '''
+        self.count, self.sum, self.sum_sq, self.deltas[idx] = self._update(idx, pic_time)
+        return self.std
+
+    def stats(self):
+        '''
+        The full Delta_stats of the current deltas (O(n), for the median)
+        '''
+        return stats_of_deltas(self.deltas)
@@ -0,0 +1,80 @@
+import unittest
+
+from lib.align import align_times, find_missing_pictures, consensus_missing_pictures
+
+"""Initialize all the neccessary data"""
+
+LOG_TIMES = [0.0, 2.0, 4.1, 6.0, 8.2, 10.0, 12.1, 14.0]
+
+
+class AlignTimesTests(unittest.TestCase):
+    """tests for the log/pictures alignment"""
+
+    def test_exact(self):
+
+        pic_times = [t + 0.05 for t in LOG_TIMES]
+
+        self.assertEqual(align_times(LOG_TIMES, pic_times, 1), list(range(len(LOG_TIMES))))
+
+    def test_missing_pictures(self):
+
+        pic_times = [t + 0.05 for i, t in enumerate(LOG_TIMES) if i not in (2, 5)]
+
+        self.assertEqual(align_times(LOG_TIMES, pic_times, 1), [0, 1, None, 2, 3, None, 4, 5])
+
+    def test_extra_picture(self):
+
+        pic_times = sorted([t - 0.1 for t in LOG_TIMES] + [7.0])
+
+        self.assertEqual(align_times(LOG_TIMES, pic_times, 1), [0, 1, 2, 3, 5, 6, 7, 8])
+
+    def test_anchor(self):
+
+        # an anchored picture only matches a log timestamp equal to its own
+        pic_times = [0.0, 2.0, 4.1, 8.0]
+
+        self.assertEqual(align_times(LOG_TIMES, pic_times, 1),
+                         [0, 1, 2, None, 3, None, None, None])
+        self.assertEqual(align_times(LOG_TIMES, pic_times, 1, anchors=[False, False, False, True]),
+                         [0, 1, 2, None, None, None, None, None])
+
+    def test_narrow_band(self):
+
+        pic_times = [t + 0.05 for i, t in enumerate(LOG_TIMES) if i != 3]
+
+        self.assertEqual(align_times(LOG_TIMES, pic_times, 1, band=0), [0, 1, 2, None, 3, 4, 5, 6])
+
+
+class MissingPicturesTests(unittest.TestCase):
+    """tests for the double difference detector"""
+
+    def setUp(self):
+        # the picture of the log timestamp 4.1 is missing
+        self.pic_times = [t - 0.5 for i, t in enumerate(LOG_TIMES) if i != 2]
+
+    def test_forward(self):
+
+        missing = find_missing_pictures(LOG_TIMES, self.pic_times, 1)
+
+        self.assertEqual([position for position, inter_delta in missing], [1])
+        self.assertAlmostEqual(missing[0][1], -1.9)
+
+    def test_backward(self):
+
+        missing = find_missing_pictures(LOG_TIMES, self.pic_times, 1, reverse=True)
+
+        self.assertEqual([position for position, inter_delta in missing], [1])
+
+    def test_consensus(self):
+
+        missing = consensus_missing_pictures(LOG_TIMES, self.pic_times, 1)
+
+        self.assertEqual([position for position, inter_delta in missing], [1])
+
+    def test_nothing_missing(self):
+
+        self.assertEqual(find_missing_pictures(LOG_TIMES, LOG_TIMES, 0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
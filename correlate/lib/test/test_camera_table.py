@@ -0,0 +1,87 @@
+import datetime
+import unittest
+
+import numpy as np
+
+from lib.camera_table import CameraTable, Picture_infos, New_Picture_infos, datetimes_to_epoch
+from lib.geo import Track
+
+"""Initialize all the neccessary data"""
+
+T0 = datetime.datetime(2018, 7, 8, 10, 0, 0, 250000)
+FILES = [("pic{0}.jpg".format(i), T0 + datetime.timedelta(seconds=2 * i)) for i in range(5)]
+
+
+def new_picture(i, latitude="", longitude=""):
+    return New_Picture_infos("pic{0}.jpg".format(i), FILES[i][1], None, FILES[i][1] + datetime.timedelta(seconds=1),
+                             None, longitude, latitude, "", "")
+
+
+class CameraTableTests(unittest.TestCase):
+    """tests for the columnar pictures storage"""
+
+    def test_from_files(self):
+
+        table = CameraTable.from_files(FILES)
+        self.assertEqual(len(table), 5)
+        pictures = table.to_pictures()
+        self.assertEqual([pic.path for pic in pictures], [path for path, t in FILES])
+        self.assertEqual([pic.DateTimeOriginal for pic in pictures], [t for path, t in FILES])
+        self.assertTrue(all(pic.Latitude is None for pic in pictures))
+
+    def test_roundtrip(self):
+
+        piclist = [new_picture(0, 48.5, 2.25), None, False, Picture_infos._replace(DateTimeOriginal=T0), new_picture(4)]
+        pictures = CameraTable.from_pictures(piclist).to_pictures()
+        self.assertEqual(pictures[0].New_DateTimeOriginal, piclist[0].New_DateTimeOriginal)
+        self.assertEqual((pictures[0].Latitude, pictures[0].Longitude), (48.5, 2.25))
+        self.assertEqual(pictures[1:3], [None, None])
+        self.assertIsNone(pictures[3].path)
+        self.assertEqual(pictures[3].DateTimeOriginal, T0)
+        self.assertIsNone(pictures[4].Latitude)
+
+    def test_filter(self):
+
+        piclist = [new_picture(0, 48.5, 2.25), None, Picture_infos._replace(DateTimeOriginal=T0), new_picture(4)]
+        table = CameraTable.from_pictures(piclist).filter()
+        self.assertEqual(list(table.path), ["pic0.jpg", "pic4.jpg"])
+        self.assertEqual(list(table.filter_no_latlon().path), ["pic0.jpg"])
+
+    def test_insert_virtual(self):
+
+        table = CameraTable.from_files(FILES[:3])
+        log_times = datetimes_to_epoch([T0 + datetime.timedelta(seconds=i) for i in range(6)])
+        expanded = table.insert_virtual([True, False, True, False, True, True], log_times)
+        self.assertEqual(list(expanded.path), ["pic0.jpg", None, "pic1.jpg", None, "pic2.jpg"])
+        self.assertEqual(expanded.time[1], log_times[1])
+        self.assertEqual(expanded.time[2], table.time[1])
+
+    def test_take(self):
+
+        table = CameraTable.from_files(FILES[:3])
+        table.new_time[:] = table.time + 1
+        taken = table.take([2, -1, 0])
+        self.assertEqual(list(taken.path), ["pic2.jpg", None, "pic0.jpg"])
+        self.assertEqual(list(taken.valid), [True, False, True])
+        self.assertTrue(np.isnan(taken.new_time[1]))
+        self.assertEqual(taken.to_pictures()[1], None)
+        # the rows are copied
+        taken.new_time[0] = 0
+        self.assertEqual(table.new_time[2], table.time[2] + 1)
+        self.assertEqual(list(CameraTable([], []).take([-1, -1]).valid), [False, False])
+
+    def test_geotag(self):
+
+        track = Track([(T0 + datetime.timedelta(seconds=i), 48 + i * 0.001, 2.0, 100.0) for i in range(4)])
+        piclist = [New_Picture_infos("a.jpg", T0, None, T0 + datetime.timedelta(seconds=1.5), None, "", "", "", ""),
+                   New_Picture_infos("b.jpg", T0, None, T0 + datetime.timedelta(seconds=60), None, "", "", "", "")]
+        table = CameraTable.from_pictures(piclist)
+        geotagged = table.geotag(track, offset_bearing=90)
+        self.assertEqual(list(geotagged), [True, False])
+        self.assertAlmostEqual(table.lat[0], 48.0015)
+        self.assertAlmostEqual(table.direction[0], 90)
+        self.assertTrue(np.isnan(table.lat[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from lib.exif_read import ExifRead
+from lib.exif_cache import ExifCache, CACHE_FILENAME
+
+"""Initialize all the neccessary data"""
+
+this_file = os.path.abspath(__file__)
+this_file_dir = os.path.dirname(this_file)
+data_dir = os.path.join(this_file_dir, "data")
+
+FIXED_EXIF_FILE = os.path.join(data_dir, "fixed_exif.jpg")
+# the copy of the module used by the scripts
+SCRIPTS_EXIF_CACHE = os.path.join(this_file_dir, "..", "..", "..", "scripts", "lib", "exif_cache.py")
+
+
+class ExifCacheTests(unittest.TestCase):
+    """tests for the sqlite exif cache"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmp_dir, "fixed_exif.jpg")
+        shutil.copy2(FIXED_EXIF_FILE, self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_read_twice(self):
+
+        with ExifCache(self.tmp_dir) as cache:
+            first = cache.read(self.filename, ExifRead)
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp_dir, CACHE_FILENAME)))
+
+        with ExifCache(self.tmp_dir) as cache:
+            self.assertEqual(first, cache.get(self.filename))
+            self.assertEqual(cache.hits, 1)
+
+    def test_modified_file(self):
+
+        with ExifCache(self.tmp_dir) as cache:
+            cache.read(self.filename, ExifRead)
+
+        stat = os.stat(self.filename)
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        with ExifCache(self.tmp_dir) as cache:
+            self.assertIsNone(cache.get(self.filename))
+            self.assertEqual(cache.misses, 1)
+
+    @unittest.skipUnless(os.path.exists(SCRIPTS_EXIF_CACHE), "scripts folder not available")
+    def test_same_as_scripts_copy(self):
+
+        with open(os.path.join(this_file_dir, "..", "exif_cache.py")) as f1, open(SCRIPTS_EXIF_CACHE) as f2:
+            self.assertEqual(f1.read(), f2.read(), "correlate/lib/exif_cache.py and scripts/lib/exif_cache.py differ")
+
+
+if __name__ == '__main__':
+    unittest.main()
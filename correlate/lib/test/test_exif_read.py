@@ -0,0 +1,63 @@
+import os
+import unittest
+
+from lib.exif_read import ExifRead, read_exif_header
+
+"""Initialize all the neccessary data"""
+
+this_file = os.path.abspath(__file__)
+this_file_dir = os.path.dirname(this_file)
+data_dir = os.path.join(this_file_dir, "data")
+
+EMPTY_EXIF_FILE = os.path.join(data_dir, "empty_exif.jpg")
+CORRUPT_EXIF_FILE = os.path.join(data_dir, "corrupt_exif.jpg")
+FIXED_EXIF_FILE = os.path.join(data_dir, "fixed_exif.jpg")
+FIXED_EXIF_FILE_2 = os.path.join(data_dir, "fixed_exif_2.jpg")
+
+
+def compare_readers(test_obj, filename):
+
+    full = ExifRead(filename)
+    fast = ExifRead(filename, fast=True)
+
+    test_obj.assertEqual(full.extract_capture_time(), fast.extract_capture_time())
+    test_obj.assertEqual(full.extract_geo(), fast.extract_geo())
+    test_obj.assertEqual(full.extract_direction(), fast.extract_direction())
+
+
+class ExifReadHeaderTests(unittest.TestCase):
+    """tests for the header only exif reader"""
+
+    def test_fast_read_fixed_exif(self):
+
+        compare_readers(self, FIXED_EXIF_FILE)
+
+    def test_fast_read_fixed_exif_2(self):
+
+        compare_readers(self, FIXED_EXIF_FILE_2)
+
+    def test_fast_read_corrupt_exif(self):
+
+        compare_readers(self, CORRUPT_EXIF_FILE)
+
+    def test_fast_read_empty_exif(self):
+
+        compare_readers(self, EMPTY_EXIF_FILE)
+
+    def test_small_header_size(self):
+
+        with open(FIXED_EXIF_FILE, "rb") as fileobj:
+            tags = read_exif_header(fileobj)
+        with open(FIXED_EXIF_FILE, "rb") as fileobj:
+            small_read_tags = read_exif_header(fileobj, header_size=64)
+
+        self.assertEqual(tags, small_read_tags)
+
+    def test_not_a_jpeg(self):
+
+        with open(this_file, "rb") as fileobj:
+            self.assertRaises(ValueError, read_exif_header, fileobj)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+
+import piexif
+
+from lib.exif_read import ExifRead
+from lib.exif_write import ExifEdit, WriteJournal, find_exif_segment, WRITE_IN_PLACE, WRITE_REWRITE, MAX_EXIF_SIZE
+
+"""Initialize all the neccessary data"""
+
+this_file = os.path.abspath(__file__)
+this_file_dir = os.path.dirname(this_file)
+data_dir = os.path.join(this_file_dir, "data")
+
+FIXED_EXIF_FILE = os.path.join(data_dir, "fixed_exif.jpg")
+EMPTY_EXIF_FILE = os.path.join(data_dir, "empty_exif.jpg")
+
+
+def add_geotag(filename, direction):
+
+    metadata = ExifEdit(filename)
+    metadata.add_date_time_original(datetime.datetime(2018, 6, 15, 8, 18, 36, 500000))
+    metadata.add_lat_lon(48.1173, -1.6778)
+    metadata.add_direction(direction)
+    return metadata.write()
+
+
+class ExifWriteModeTests(unittest.TestCase):
+    """tests for the in place and full rewrite modes of ExifEdit.write"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def copy(self, filename):
+        test_file = os.path.join(self.tmp_dir, os.path.basename(filename))
+        shutil.copy2(filename, test_file)
+        return test_file
+
+    def test_rewrite_then_in_place(self):
+
+        test_file = self.copy(FIXED_EXIF_FILE)
+
+        self.assertEqual(add_geotag(test_file, 90), WRITE_REWRITE)
+        size = os.path.getsize(test_file)
+        self.assertEqual(add_geotag(test_file, 180), WRITE_IN_PLACE)
+        self.assertEqual(size, os.path.getsize(test_file))
+
+        metadata = ExifRead(test_file)
+        self.assertEqual(metadata.extract_direction(), 180)
+        self.assertAlmostEqual(metadata.extract_geo()["latitude"], 48.1173)
+        self.assertEqual(os.listdir(self.tmp_dir), [os.path.basename(test_file)])
+
+    def test_in_place_keeps_image_data(self):
+
+        test_file = self.copy(FIXED_EXIF_FILE)
+        add_geotag(test_file, 90)
+        with open(test_file, "rb") as f:
+            offset, size = find_exif_segment(f)
+            f.seek(offset + size)
+            image_data = f.read()
+
+        add_geotag(test_file, 270)
+        with open(test_file, "rb") as f:
+            self.assertEqual((offset, size), find_exif_segment(f))
+            f.seek(offset + size)
+            self.assertEqual(image_data, f.read())
+
+    def test_write_to_other_file(self):
+
+        test_file = self.copy(EMPTY_EXIF_FILE)
+        other_file = os.path.join(self.tmp_dir, "other.jpg")
+        metadata = ExifEdit(test_file)
+        metadata.add_direction(45)
+
+        self.assertEqual(metadata.write(other_file), WRITE_REWRITE)
+        self.assertEqual(ExifRead(other_file).extract_direction(), 45)
+
+    def test_rewrite_big_exif(self):
+
+        # an Exif segment near its maximum size, the padding must be reduced
+        test_file = self.copy(EMPTY_EXIF_FILE)
+        comment = b"ASCII\x00\x00\x00" + b"x" * 64900
+        piexif.insert(piexif.dump({"Exif": {piexif.ExifIFD.UserComment: comment}}), test_file)
+
+        self.assertEqual(add_geotag(test_file, 90), WRITE_REWRITE)
+        with open(test_file, "rb") as f:
+            offset, size = find_exif_segment(f)
+        self.assertLessEqual(size, MAX_EXIF_SIZE + 4)
+        self.assertEqual(ExifRead(test_file).extract_direction(), 90)
+
+
+class WriteJournalTests(unittest.TestCase):
+    """tests for the exif write journal"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_resume(self):
+
+        tags = {"Latitude": 48.1173, "Longitude": -1.6778, "ImgDirection": 90.0}
+        with WriteJournal(self.tmp_dir) as journal:
+            journal.add(FIXED_EXIF_FILE, tags)
+        # interrupted while writing a line
+        with open(journal.path, "a") as f:
+            f.write('{"path": "/tmp/')
+
+        with WriteJournal(self.tmp_dir, resume=True) as journal:
+            self.assertTrue(journal.is_done(FIXED_EXIF_FILE, tags))
+            self.assertFalse(journal.is_done(FIXED_EXIF_FILE, dict(tags, ImgDirection=180.0)))
+            self.assertFalse(journal.is_done(EMPTY_EXIF_FILE, tags))
+            journal.add(EMPTY_EXIF_FILE, tags)
+
+        with WriteJournal(self.tmp_dir, resume=True) as journal:
+            self.assertTrue(journal.is_done(EMPTY_EXIF_FILE, tags))
+
+        with WriteJournal(self.tmp_dir) as journal:
+            self.assertFalse(journal.is_done(FIXED_EXIF_FILE, tags))
+
+
+if __name__ == '__main__':
+    unittest.main()
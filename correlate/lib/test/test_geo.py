@@ -0,0 +1,73 @@
+import datetime
+import unittest
+
+from lib.geo import Track, interpolate_lat_lon, gps_distance
+
+"""Initialize all the neccessary data"""
+
+START = datetime.datetime(2018, 6, 15, 10, 0, 0)
+POINTS = [(START + datetime.timedelta(seconds=i), 48.0 + i * 0.0001, 2.0 + i * 0.0002, 100.0 + i)
+          for i in range(10)]
+
+
+class TrackTests(unittest.TestCase):
+    """tests for the time indexed gps track"""
+
+    def setUp(self):
+        self.track = Track(POINTS)
+
+    def test_interpolate_between_points(self):
+
+        t = START + datetime.timedelta(seconds=2.5)
+        lat, lon, bearing, ele = self.track.interpolate(t)
+
+        self.assertAlmostEqual(lat, 48.00025)
+        self.assertAlmostEqual(lon, 2.0005)
+        self.assertAlmostEqual(ele, 102.5)
+
+    def test_same_result_as_points_list(self):
+
+        for seconds in (0.2, 3, 4.75, 8.999, 9, 9.5):
+            t = START + datetime.timedelta(seconds=seconds)
+            expected = interpolate_lat_lon(POINTS, t)
+            result = self.track.interpolate(t)
+            for a, b in zip(expected, result):
+                self.assertAlmostEqual(a, b)
+
+    def test_interpolate_many_out_of_scope(self):
+
+        times = [START - datetime.timedelta(seconds=5), START + datetime.timedelta(seconds=1),
+                 START + datetime.timedelta(seconds=9.5), START + datetime.timedelta(seconds=20)]
+        lat, lon, bearing, ele, valid = self.track.interpolate_many(times)
+
+        self.assertEqual(list(valid), [False, True, True, False])
+        self.assertAlmostEqual(lat[1], 48.0001)
+        self.assertRaises(ValueError, self.track.interpolate, times[0])
+
+    def test_missing_elevation(self):
+
+        points = [(t, lat, lon, None) for t, lat, lon, ele in POINTS]
+        lat, lon, bearing, ele = Track(points).interpolate(START + datetime.timedelta(seconds=1.5))
+
+        self.assertIsNone(ele)
+
+    def test_geotag_offsets(self):
+
+        times = [START + datetime.timedelta(seconds=seconds) for seconds in (1.5, 4, 7.25)]
+        lat, lon, bearing, ele, valid = self.track.interpolate_many(times)
+        new_lat, new_lon, new_bearing, new_ele, new_valid = self.track.geotag(times, 90, 3)
+
+        for i in range(len(times)):
+            self.assertAlmostEqual(new_bearing[i], (bearing[i] + 90) % 360)
+            self.assertAlmostEqual(gps_distance((lat[i], lon[i]), (new_lat[i], new_lon[i])), 3, places=2)
+
+    def test_heading(self):
+
+        points = [point + (350.0 + 5 * i,) for i, point in enumerate(POINTS)]
+        lat, lon, bearing, ele = Track(points).interpolate(START + datetime.timedelta(seconds=2.5))
+
+        self.assertAlmostEqual(bearing, 2.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+from lib.gps_parser import load_track, get_lat_lon_time_from_nmea, iter_nmea_points, get_lat_lon_time_from_ubx
+
+"""Initialize all the neccessary data"""
+
+NMEA_LINES = [
+    "$GPRMC,081836.00,A,4807.038,N,01131.000,E,022.4,084.4,150618,003.1,W*49",
+    "$GPGGA,081836.00,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*60",
+    "$GPRMC,081837.00,A,4807.040,N,01131.010,E,022.4,084.4,150618,003.1,W*46",
+    "$GPGGA,081837.00,4807.040,N,01131.010,E,1,08,0.9,545.6,M,46.9,M,,*6D",
+    "$GPGGA,081838.00,4807.042,N,01131.020,E,1,08,0.9,545.8,M,46.9,M,,*6D",
+]
+
+
+def ubx_message(msg_class, msg_id, payload):
+    body = struct.pack("<BBH", msg_class, msg_id, len(payload)) + payload
+    ck_a = ck_b = 0
+    for byte in body:
+        ck_a = (ck_a + byte) & 0xff
+        ck_b = (ck_b + ck_a) & 0xff
+    return b"\xb5\x62" + body + bytes((ck_a, ck_b))
+
+
+def nav_pvt(itow, second, lat, lon, h_msl, fix_type=3, head_veh=None):
+    flags = 0x01 if head_veh is None else 0x21
+    payload = struct.pack("<IHBBBBBBIiBBBBiiiiIIiiiiiIIH6xihH", itow, 2018, 6, 15, 8, 18, second, 0x07, 0, 0,
+                          fix_type, flags, 0, 12, int(lon * 1e7), int(lat * 1e7), h_msl + 47000, h_msl,
+                          0, 0, 0, 0, 0, 0, 0, 0, 0, 0, int((head_veh or 0) * 1e5), 0, 0)
+    return ubx_message(0x01, 0x07, payload)
+
+
+def nav_att(itow, heading):
+    payload = struct.pack("<IB3xiiiIII", itow, 0, 0, 0, int(heading * 1e5), 0, 0, 0)
+    return ubx_message(0x01, 0x05, payload)
+
+
+class LoadTrackTests(unittest.TestCase):
+    """tests for the gnss track loader"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.nmea_file = os.path.join(self.tmp_dir, "track.nmea")
+        with open(self.nmea_file, "w") as f:
+            f.write("\n".join(NMEA_LINES) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_load_nmea(self):
+
+        track = load_track(self.nmea_file)
+
+        self.assertEqual(len(track), 3)
+        self.assertAlmostEqual(track.lats[0], 48.1173)
+        self.assertAlmostEqual(track.eles[2], 545.8)
+
+    def test_track_is_reused(self):
+
+        track = load_track(self.nmea_file)
+
+        self.assertIs(track, load_track(self.nmea_file))
+
+    def test_modified_file_is_parsed_again(self):
+
+        track = load_track(self.nmea_file)
+        with open(self.nmea_file, "a") as f:
+            f.write("$GPGGA,081839.00,4807.044,N,01131.030,E,1,08,0.9,546.0,M,46.9,M,,*60\n")
+
+        self.assertEqual(len(load_track(self.nmea_file)), 4)
+
+    def test_same_points_as_pynmea2(self):
+
+        self.assertEqual(get_lat_lon_time_from_nmea(self.nmea_file),
+                         get_lat_lon_time_from_nmea(self.nmea_file, use_pynmea2=True))
+
+    def test_skip_bad_sentences(self):
+
+        with open(self.nmea_file, "a") as f:
+            # wrong checksum, then no fix
+            f.write("$GPGGA,081839.00,4807.044,N,01131.030,E,1,08,0.9,546.0,M,46.9,M,,*00\n")
+            f.write("$GPGGA,081840.00,,,,,0,00,,,M,,M,,\n")
+
+        self.assertEqual(len(list(iter_nmea_points(self.nmea_file))), 3)
+
+    def test_ubx(self):
+
+        ubx_file = os.path.join(self.tmp_dir, "track.ubx")
+        with open(ubx_file, "wb") as f:
+            f.write(nav_pvt(1000, 36, 48.1173, 11.5166, 545400))
+            f.write(nav_att(1000, 84.5))
+            f.write((NMEA_LINES[1] + "\r\n").encode())
+            f.write(nav_pvt(2000, 37, 48.1174, 11.5168, 545600, head_veh=85.25))
+            # no fix
+            f.write(nav_pvt(3000, 38, 0, 0, 0, fix_type=0))
+            # corrupted message
+            f.write(nav_pvt(4000, 39, 48.1175, 11.5170, 545800)[:-1] + b"\x00")
+            f.write(nav_pvt(5000, 40, 48.1176, 11.5172, 546000))
+
+        points = get_lat_lon_time_from_ubx(ubx_file)
+
+        self.assertEqual([point[0].second for point in points], [36, 37, 40])
+        self.assertAlmostEqual(points[0][1], 48.1173)
+        self.assertAlmostEqual(points[1][2], 11.5168)
+        self.assertAlmostEqual(points[0][3], 545.4)
+        self.assertEqual([point[4] for point in points], [84.5, 85.25, None])
+        self.assertEqual(len(load_track(ubx_file)), 3)
+
+    def test_wrong_extension(self):
+
+        self.assertRaises(ValueError, load_track, __file__)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from lib.log_parser import iter_log, log_version, read_log_arrays, read_gnss_status
+
+"""Initialize all the neccessary data"""
+
+LOG_LINES = ["Yi set clock: OK",
+             "1531044000.5,('KTakepic', [15, 312, 1], 1531044000.812),0b1111,ok",
+             "1531044002.5,('KTakepic', [13, 298, 2], 1531044002.798),0b1111,cam error",
+             "# 1531044003.5,('KTakepic', [15, 312, 3], 1531044003.812),0b1111,ok",
+             "1531044004.5,('KTakepic', [15, 3",
+             "[1531044006.5, 'KTakepic', 7, 305, 4, 1531044006.805]",
+             "Exiting"]
+
+VERSIONED_LOG_LINES = ["#V4MPOD_LOG,1,record,timestamp,return_timestamp,cams,cams_return,time_to_answer,pic_number,status",
+                       "gnss,1531043990.000000,,,,,,pps",
+                       "event,1531043995.000000,,,,,,Yi set clock: OK",
+                       "shutter,1531044000.500000,1531044000.812000,15,15,312,1,ok",
+                       "shutter,1531044002.500000,1531044002.798000,15,13,298,2,cam error",
+                       "shutter,1531044004.500000,1531044004.805000,15,15,305,3,ok,a column of the next version",
+                       "shutter,1531044006.5"]
+
+
+class LogParserTests(unittest.TestCase):
+    """tests for the Raspberry Pi log parser"""
+
+    def setUp(self):
+
+        self.test_dir = tempfile.mkdtemp()
+        self.logfile = os.path.join(self.test_dir, "cam_log_test.log")
+        with open(self.logfile, "w") as f:
+            f.write("\n".join(LOG_LINES) + "\n")
+
+    def tearDown(self):
+
+        shutil.rmtree(self.test_dir)
+
+    def test_shutter_lines(self):
+
+        stats = {}
+        loglist = list(iter_log(self.logfile, stats))
+        self.assertEqual([log_line.pic_number for log_line in loglist], [1, 2, 4])
+        self.assertEqual(stats, {"lines": 7, "shutters": 3, "malformed": 1})
+
+        first = loglist[0]
+        self.assertEqual(first.log_timestamp, datetime.datetime.fromtimestamp(1531044000.5))
+        self.assertEqual(first.return_timestamp, datetime.datetime.fromtimestamp(1531044000.812))
+        self.assertEqual(first.action, "KTakepic")
+        self.assertEqual(first.time_to_answer, 312)
+
+    def test_cam_return_mask(self):
+
+        loglist = list(iter_log(self.logfile))
+        self.assertEqual([log_line.cam_return for log_line in loglist], [15, 13, 7])
+        # the camera at position 1 didn't answer to the second shutter
+        self.assertEqual([log_line.cam_return >> 1 & 1 for log_line in loglist], [1, 0, 1])
+
+    def test_lazy(self):
+
+        log_lines = iter_log(self.logfile)
+        self.assertEqual(next(log_lines).pic_number, 1)
+
+    def test_legacy_arrays(self):
+
+        self.assertEqual(log_version(self.logfile), 0)
+        arrays = read_log_arrays(self.logfile)
+        np.testing.assert_array_equal(arrays.pic_number, [1, 2, 4])
+        np.testing.assert_array_equal(arrays.cams, [-1, -1, -1])
+        self.assertEqual(len(read_gnss_status(self.logfile).time), 0)
+
+
+class VersionedLogTests(unittest.TestCase):
+    """tests for the versioned log written by the Raspberry Pi"""
+
+    def setUp(self):
+
+        self.test_dir = tempfile.mkdtemp()
+        self.logfile = os.path.join(self.test_dir, "cam_log_test.log")
+        with open(self.logfile, "w") as f:
+            f.write("\n".join(VERSIONED_LOG_LINES) + "\n")
+
+    def tearDown(self):
+
+        shutil.rmtree(self.test_dir)
+
+    def test_version(self):
+
+        self.assertEqual(log_version(self.logfile), 1)
+
+    def test_iter_log(self):
+
+        stats = {}
+        loglist = list(iter_log(self.logfile, stats))
+        self.assertEqual([log_line.pic_number for log_line in loglist], [1, 2, 3])
+        self.assertEqual([log_line.cam_return for log_line in loglist], [15, 13, 15])
+        self.assertEqual(stats, {"lines": 7, "shutters": 3, "malformed": 1})
+        self.assertEqual(loglist[1].time_to_answer, 298)
+        self.assertEqual(loglist[0].return_timestamp, datetime.datetime.fromtimestamp(1531044000.812))
+
+    def test_arrays(self):
+
+        arrays = read_log_arrays(self.logfile)
+        np.testing.assert_allclose(arrays.log_time, [1531044000.5, 1531044002.5, 1531044004.5])
+        np.testing.assert_array_equal(arrays.cams, [15, 15, 15])
+        np.testing.assert_array_equal(arrays.cams_return, [15, 13, 15])
+        np.testing.assert_array_equal(arrays.time_to_answer, [312, 298, 305])
+        self.assertEqual(list(arrays.status), ["ok", "cam error", "ok"])
+        # the cameras which didn't answer
+        np.testing.assert_array_equal(arrays.cams & ~arrays.cams_return, [0, 2, 0])
+
+    def test_gnss_status(self):
+
+        gnss = read_gnss_status(self.logfile)
+        np.testing.assert_allclose(gnss.time, [1531043990.0])
+        self.assertEqual(list(gnss.status), ["pps"])
+
+
+if __name__ == '__main__':
+    unittest.main()
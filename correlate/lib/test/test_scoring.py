@@ -0,0 +1,71 @@
+import unittest
+
+import numpy as np
+
+from lib.scoring import time_deltas, delta_stats, IncrementalScore
+
+"""Initialize all the neccessary data"""
+
+# POSIX timestamps, like the ones of a real session
+LOG_TIMES = 1531044000 + np.array([0.0, 2.1, 4.0, 6.2, 8.1, 10.0])
+PIC_TIMES = LOG_TIMES - np.array([1.2, 1.1, 1.3, 1.2, 1.0, 1.2])
+PIC_TIMES[3] = np.nan
+
+
+class DeltaStatsTests(unittest.TestCase):
+    """tests for the time deltas statistics"""
+
+    def test_time_deltas(self):
+
+        deltas = time_deltas(LOG_TIMES, PIC_TIMES[:5])
+        np.testing.assert_allclose(deltas, [1.2, 1.1, 1.3, 1.0], atol=1e-6)
+
+    def test_delta_stats(self):
+
+        stats = delta_stats(LOG_TIMES, PIC_TIMES)
+        deltas = np.array([1.2, 1.1, 1.3, 1.0, 1.2])
+        self.assertEqual(stats.count, 5)
+        self.assertAlmostEqual(stats.mean, deltas.mean(), places=6)
+        self.assertAlmostEqual(stats.std, deltas.std(), places=6)
+        self.assertAlmostEqual(stats.median, 1.2, places=6)
+        self.assertAlmostEqual(stats.mad, 0.1, places=6)
+
+    def test_no_delta(self):
+
+        stats = delta_stats(LOG_TIMES, np.full(6, np.nan))
+        self.assertEqual(stats.count, 0)
+        self.assertTrue(np.isnan(stats.std))
+
+
+class IncrementalScoreTests(unittest.TestCase):
+    """tests for the O(1) deviation updates"""
+
+    def test_initial(self):
+
+        score = IncrementalScore(LOG_TIMES, PIC_TIMES)
+        self.assertAlmostEqual(score.std, delta_stats(LOG_TIMES, PIC_TIMES).std, places=6)
+        self.assertAlmostEqual(score.mean, delta_stats(LOG_TIMES, PIC_TIMES).mean, places=6)
+
+    def test_updates(self):
+
+        score = IncrementalScore(LOG_TIMES, PIC_TIMES)
+        pic_times = PIC_TIMES.copy()
+        rng = np.random.RandomState(0)
+        for i in range(200):
+            idx = rng.randint(len(pic_times))
+            value = np.nan if rng.rand() < 0.2 else LOG_TIMES[idx] - rng.uniform(0.5, 2)
+            expected_try = delta_stats(LOG_TIMES, np.where(np.arange(6) == idx, value, pic_times)).std
+            try_std = score.try_set(idx, value)
+            pic_times[idx] = value
+            std = score.set(idx, value)
+            expected = delta_stats(LOG_TIMES, pic_times).std
+            if np.isnan(expected):
+                self.assertTrue(np.isnan(std) and np.isnan(try_std))
+            else:
+                self.assertAlmostEqual(std, expected, places=6)
+                self.assertAlmostEqual(try_std, expected_try, places=6)
+        self.assertEqual(score.stats().count, delta_stats(LOG_TIMES, pic_times).count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Versioned session log written by the V4MPOD.
+
+Each line is a record with fixed columns, separated by commas:
+record,timestamp,return_timestamp,cams,cams_return,time_to_answer,pic_number,status
+
+- shutter: a shutter request sent to the cameras. cams and cams_return are the
+  cameras bitfields (request and answer), time_to_answer is in milliseconds.
+- event: a message (power up, clock set, ...) in the status column.
+- gnss: the GNSS/PPS status in the status column.
+
+The first line is the header, with the version of the format and the columns name.
+The reader is correlate/lib/log_parser.py, keep them in sync. New columns must be
+added at the end of the line, with a new version number.
+
+The records are written by a log_writer thread, by batch.
+"""
+import os
+import queue
+import threading
+import time
+
+LOG_MAGIC = "#V4MPOD_LOG"
+LOG_VERSION = 1
+LOG_COLUMNS = ("record", "timestamp", "return_timestamp", "cams", "cams_return", "time_to_answer", "pic_number", "status")
+
+
+def header():
+    return ",".join((LOG_MAGIC, str(LOG_VERSION)) + LOG_COLUMNS) + "\n"
+
+def _text(value):
+    # the text is the last column, it can't contain a newline, and no comma
+    # to keep the columns count fixed.
+    return str(value).replace(",", ";").replace("\r", " ").replace("\n", " ")
+
+def _mask(cams):
+    # the cameras bitfield can be an int, or a string like '0b1111'
+    return cams if isinstance(cams, int) else int(cams, 0)
+
+def shutter_record(timestamp, pic_return, cams, status):
+    """
+    :param timestamp: the time.time() when the shutter request was sent
+    :param pic_return: the arduino answer ('KTakepic', [cams_return, time_to_answer, pic_number], return_timestamp)
+    :param cams: the cameras bitfield of the request
+    :param status: "ok" or "cam error"
+    """
+    cams_return, time_to_answer, pic_number = pic_return[1][:3]
+    return "shutter,{0:.6f},{1:.6f},{2:d},{3:d},{4:d},{5:d},{6}\n".format(timestamp, pic_return[2], _mask(cams), cams_return,
+                                                                      time_to_answer, pic_number, _text(status))
+
+def event_record(timestamp, message):
+    return "event,{0:.6f},,,,,,{1}\n".format(timestamp, _text(message))
+
+def gnss_record(timestamp, status):
+    """
+    :param status: the GNSS/PPS status, like "pps", "no pps" or "fix 3"
+    """
+    return "gnss,{0:.6f},,,,,,{1}\n".format(timestamp, _text(status))
+
+
+class log_writer(threading.Thread):
+    """Write the records of a queue to the logfile, by batch (group commit)
+
+    The thread blocks on the queue. When a record arrives, it waits for more
+    records, up to batch_size records or batch_time seconds after the first one,
+    then writes the whole batch and fsync the file. A power cut can only lose
+    the current batch.
+    """
+    _STOP = object()
+
+    def __init__(self, log_queue, logfile, batch_size=50, batch_time=0.5):
+        """
+        param: log_queue: A queue.Queue object with the records
+        param: logfile: the file object to write to
+        param: batch_size: the maximum number of records in a batch
+        param: batch_time: the maximum time to wait for a full batch, in seconds
+        """
+        threading.Thread.__init__(self, name="flushlog")
+        self.queue = log_queue
+        self.logfile = logfile
+        self.batch_size = batch_size
+        self.batch_time = batch_time
+        # counters
+        self.records = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.write_latency = 0
+        self.max_write_latency = 0
+        self.write_errors = 0
+
+    def run(self):
+        stopping = False
+        while not stopping:
+            record = self.queue.get()
+            if record is self._STOP:
+                self.queue.task_done()
+                break
+            self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize() + 1)
+            batch = [record]
+            deadline = time.monotonic() + self.batch_time
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if record is self._STOP:
+                    self.queue.task_done()
+                    stopping = True
+                    break
+                batch.append(record)
+            self.write(batch)
+
+    def write(self, batch):
+        start = time.monotonic()
+        try:
+            self.logfile.write("".join(batch))
+            self.logfile.flush()
+            #since Python 3.4 file are inheritable. I think it's why
+            #flush() alone doesn't work in this thread.
+            os.fsync(self.logfile.fileno())
+        except (OSError, ValueError) as e:
+            # ValueError: the logfile is closed
+            self.write_errors += 1
+            print("Error writing the log: {}".format(e))
+        self.write_latency = time.monotonic() - start
+        self.max_write_latency = max(self.max_write_latency, self.write_latency)
+        self.records += len(batch)
+        self.batches += 1
+        for _record in batch:
+            self.queue.task_done()
+
+    def stop(self, timeout=None):
+        """Write the records already in the queue, and stop the thread"""
+        self.queue.put(self._STOP)
+        self.join(timeout)
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        return {"queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "records": self.records,
+                "batches": self.batches,
+                "write_latency": self.write_latency,
+                "max_write_latency": self.max_write_latency,
+                "write_errors": self.write_errors}
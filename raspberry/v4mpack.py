@@ -17,6 +17,7 @@ import re
 import Adafruit_Nokia_LCD as LCD
 import Adafruit_GPIO.SPI as SPI
 import lcd_menu as menu
+import session_log
 
 from queue import Queue
 from PIL import Image
@@ -308,7 +309,7 @@ def beep(duration=0.2, pause=0.2, repeat=0):
 def cams_takePic(cameras_obj, log_queue, pic_id=1, *cams):
     pic_answer = cameras_obj.takePic(*cams)
     #pic_answer is a tuple: timestamp, pic_return, cam, status
-    log_queue.put(str(pic_answer[0]) + "," + str(pic_answer[1]) + "," + str(pic_answer[2]) + "," + pic_answer[3] + "\n")
+    log_queue.put(session_log.shutter_record(*pic_answer))
     if pic_answer[3] == "ok":
         beep(0.1)
     else:
@@ -337,28 +338,28 @@ def stop_Timelapse():
 
 def cams_take_first_pic(camera_obj, *cams):
     timestamp, answer = camera_obj.take_first_pic(*cams)
-    logfile.write(str(timestamp) + "," + "first pic: " + "," + str(answer) + "\n")
+    logfile.write(session_log.event_record(timestamp, "first pic: " + str(answer)))
     return answer
 
 def cams_arduino_connect(camera_obj):
     timestamp, answer = camera_obj.connect()
-    logfile.write(str(timestamp) + "," + "Arduino connection: " + "," + str(answer) + "\n")
+    logfile.write(session_log.event_record(timestamp, "Arduino connection: " + str(answer)))
     return answer
 
 def cams_power_up(cameras_obj, *cams):
     timestamp, answer, cams = cameras_obj.power_up(*cams)
-    logfile.write(str(timestamp) + "," + str(answer) + "," + str(cams) + "\n")
+    logfile.write(session_log.event_record(timestamp, str(answer) + " " + str(cams)))
     return answer
 
 def cams_power_down(cameras_obj, *cams):
     timestamp, answer, cams = cameras_obj.power_down(*cams)
-    logfile.write(str(timestamp) + "," + "Power down" + "," + str(cams) + "\n")
+    logfile.write(session_log.event_record(timestamp, "Power down " + str(cams)))
     return answer
 
 def cams_ping(camera_obj, *cams, timeout=10):
     timestamp = time.time()
     answer = camera_obj.ping_cams(*cams, timeout=timeout)
-    logfile.write(str(timestamp) + "," + str(answer) + "\n")
+    logfile.write(session_log.event_record(timestamp, answer))
     return answer
 
 def start_gnss_log(gnss_session_name):
@@ -368,7 +369,7 @@ def start_gnss_log(gnss_session_name):
         subprocess.call(["gpspipe -d -R -o" + str(gnss_filename)], shell=True)
     except Exception as e:
         print("error during starting gnss log")
-        logfile.write("Error during starting gnss log: {}".format(str(e)))
+        logfile.write(session_log.event_record(time.time(), "Error during starting gnss log: {}".format(str(e))))
         return False
     return gnss_filename
     
@@ -418,29 +419,29 @@ def check_timesync():
 def cams_set_clocks(cameras_obj, *cams, beeper = True):
     timestamp, answer = cameras_obj.set_clocks(*cams)
     if answer:
-        logfile.write(str(timestamp) + "," + "Yi set clock: OK" + "\n")
+        logfile.write(session_log.event_record(timestamp, "Yi set clock: OK"))
         if beeper == True :
             beep(0.1)
         return True
     else:
-        logfile.write(str(timestamp) + "," + "Yi set clock: Can't set clock, communication error" + "\n")
+        logfile.write(session_log.event_record(timestamp, "Yi set clock: Can't set clock, communication error"))
         if beeper == True:
             beep(0.4, 0.1, 2)
         return False
 def cams_set_setting(camera_obj, setting_type, setting_value, *cams):
     #setting is a tuple with setting type and setting param/value
     timestamp, answer = camera_obj.set_setting(setting_type, setting_value, *cams)
-    logfile.write(str(timestamp) + "," + str(setting_type) + "," + str(setting_value) + "," + str(answer) + "\n")
+    logfile.write(session_log.event_record(timestamp, "{} {} {}".format(setting_type, setting_value, answer)))
     return answer
 
 def cams_send_file_settings(cameras_obj, file_path, *cams):
     answer = cameras_obj.send_file_settings(file_path, *cams)
     if answer[1]:
-        logfile.write(str(answer[0]) + "," + "Yi send settings: OK" + "\n")
+        logfile.write(session_log.event_record(answer[0], "Yi send settings: OK"))
         beep(0.1)
         return True
     else:
-        logfile.write(str(answer[0]) + "," + "Yi send settings: Can't send settings, communication error" + "\n")
+        logfile.write(session_log.event_record(answer[0], "Yi send settings: Can't send settings, communication error"))
         beep(0.4, 0.1, 2)
         return False
         
@@ -483,7 +484,6 @@ def power_down_pi(reboot=False):
         os.system("sudo shutdown -h now")
         
 def exit_prog():
-    #TODO : stop the flush thread
     global keepRunning
     #try:
     #reset interrupt on mcp    
@@ -491,9 +491,10 @@ def exit_prog():
     bus.read_byte_data(DEVICE, INTCAPA)
     bus.close()
     stop_gnss_log()
-    logfile.write("Exiting" + "\n")
+    flushthread.stop()
+    print(flushthread.stats())
+    logfile.write(session_log.event_record(time.time(), "Exiting"))
     logfile.close()
-    flushthread.do_run = False
     GPIO.cleanup()
     print("Exiting program A")
     keepRunning=False
@@ -509,7 +510,8 @@ def open_file(log_session_name):
     now=datetime.datetime.now()
     log_filename = os.path.expanduser("~") + "/Documents/Sessions_V4MPOD/cam_log_" + str(log_session_name) + "_" + now.strftime("%Y-%m-%d_%H.%M.%S") + ".log"
     logfile=open(log_filename, "w")
-    flushthread=threading.Thread(target=flush_log, args=(logqueue,), name="flushlog")
+    logfile.write(session_log.header())
+    flushthread=session_log.log_writer(logqueue, logfile)
     flushthread.start()
     return logfile
 
@@ -521,9 +523,10 @@ def new_session(session_name=None, restart_gnss_log=False):
     session_name = slugify(session_name)
     #Closing current logfile if it exists
     try:
-        logfile.write("Close logfile" + "\n")
+        if flushthread is not None:
+            flushthread.stop()
+        logfile.write(session_log.event_record(time.time(), "Close logfile"))
         logfile.close()
-        flushthread.do_run = False
         #stop gnss log
         stop_gnss_log()
     except NameError:
@@ -533,6 +536,8 @@ def new_session(session_name=None, restart_gnss_log=False):
     
     #start new logfile
     logfile = open_file(session_name)
+    #record the GNSS/PPS time sync status
+    logqueue.put(session_log.gnss_record(time.time(), "pps" if check_timesync() else "no pps"))
     #start new gnss log
     if restart_gnss_log:
         start_gnss_log(session_name)
@@ -541,25 +546,6 @@ def new_session(session_name=None, restart_gnss_log=False):
     #TODO gérer erreurs
     
 
-def flush_log(logqueue):
-    #since Python 3.4 file are inheritable. I think it's why
-    #flush() alone doesn't work in this thread.
-    
-    t = threading.currentThread()
-    while getattr(t, "do_run", True):
-        time.sleep(10)
-        try:
-            while not logqueue.empty():
-                #logfile.write(logqueue.get())
-                logline = logqueue.get()
-                print (logline)
-                logfile.write(logline)
-                logqueue.task_done()
-            logfile.flush()
-            os.fsync(logfile.fileno())
-        except:
-            None
-
 def menu_previous_line():
     global menuA
     pos = menuA[-2]
@@ -607,6 +593,7 @@ def index():
     data['session_name'] = os.path.basename(logfile.name)
     data['pic_count'] = MyCams.pic_count
     data['errors'] = MyCams.shutter_error
+    data['log_stats'] = flushthread.stats()
     return render_template("index.html", data = data)
 
 #tuto used for login:
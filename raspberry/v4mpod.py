@@ -9,11 +9,13 @@ import PyCmdMessenger
 import subprocess
 import gpsd
 import threading
+import queue
 import runpy
 
 import Adafruit_Nokia_LCD as LCD
 import Adafruit_GPIO.SPI as SPI
 import lcd_menu as menu
+import session_log
 
 from queue import Queue
 from PIL import Image
@@ -214,7 +216,7 @@ class shutter_ctrl(threading.Thread):
         param: time_interval: the time interval between each picture in time-base mode
         param: distance_obj: a speedometer class instance
         param: mode: "distance" or "time" base mode
-        param: rate: refresh rate
+        param: rate: not used anymore, the thread waits for the next shutter deadline
         """ 
         threading.Thread.__init__(self)
         self.queue = queue
@@ -229,66 +231,89 @@ class shutter_ctrl(threading.Thread):
         self.prev_sht_rtn = time.time()
         self.shutter_count = 0
         self.cam_range = 15
+        # pause, resume, stop and the speedometer pulses wake up the thread
+        self._condition = threading.Condition()
         self._pause = True
-        self._stop = False
+        self._stopped = False
+        if self.speed_obj is not None:
+            self.speed_obj.add_listener(self.wake_up)
         
     def run(self):
-        while not self._stop:
-            
-            while not self._pause:
-                if self.mode == "time":
-                    self.time_base()
-                elif self.mode == "distance":
-                    self.distance_base()
-                time.sleep(self.rate)
-            time.sleep(self.rate)
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if self._pause:
+                        self._condition.wait()
+                        continue
+                    delay = self.time_to_next_shutter()
+                    if delay is not None and delay <= 0:
+                        break
+                    # delay is None when the bike doesn't move: wait for a pulse
+                    self._condition.wait(delay)
+                if self._stopped:
+                    break
+            if self.mode == "distance":
+                self.prev_distance = self.distance()
+            self.time_base()
+        
+    def time_to_next_shutter(self):
+        """The time to wait before the next shutter, in seconds, or None
+        if it can't be computed (the bike doesn't move)"""
+        if self.mode == "time":
+            return self.prev_time + self.time_interval - time.time()
+        remaining = self.prev_distance + self.distance_interval - self.distance()
+        if remaining <= 0:
+            # on respecte quand même le délai lié au temps de réponse des caméras
+            return self.prev_time - time.time()
+        if self.speed_obj.speed <= 0:
+            return None
+        return remaining / self.speed_obj.speed
+        
+    def distance(self):
+        """The distance travelled, extrapolated from the last pulse with the current speed"""
+        return self.speed_obj.total_distance + self.speed_obj.speed * max(time.time() - self.speed_obj.prev_time, 0)
         
     def time_base(self):
         
-        if self.prev_time + self.time_interval <= time.time():
-            self.prev_time = time.time()
-            print("shutter: {0} for cams {1:b}".format(self.shutter_count, self.cam_range))
-            pic_return = mycams.takePic(logqueue, self.cam_range)
-            self.shutter_count +=1
-            # retardement du prochain déclenchement si la réponse des
-            # caméras est trop lente. Il faut ajouter 1 seconde au temps
-            # de réponse.
-            answer_delay = pic_return[1][1]/1000
-            if answer_delay + 1 > self.time_interval:
-                self.prev_time += (answer_delay + 1) - self.time_interval
-            
-            #TODO tenir compte d'un temps minimum entre la réponse et 
-            # le prochain déclenchement.
-            # A voir si ça ne doit pas plutôt être géré du côté de la gestion
-            # des caméras
-            #TODO reprendre le code qui vérifie que le déclenchement a eu lieu       
-            
-    def distance_base(self):
-        try:
-            time_interval = self.distance_interval / self.speed_obj.speed
-            
-        except ZeroDivisionError:
-            # when speed is 0, add a very long time
-            time_interval = time.time() + 360000
+        self.prev_time = time.time()
+        print("shutter: {0} for cams {1:b}".format(self.shutter_count, self.cam_range))
+        pic_return = mycams.takePic(logqueue, self.cam_range)
+        self.shutter_count +=1
+        # retardement du prochain déclenchement si la réponse des
+        # caméras est trop lente. Il faut ajouter 1 seconde au temps
+        # de réponse.
+        answer_delay = pic_return[1][1]/1000
+        if self.mode == "distance":
+            self.prev_time += answer_delay + 1
+        elif answer_delay + 1 > self.time_interval:
+            self.prev_time += (answer_delay + 1) - self.time_interval
         
-        self.time_interval = time_interval
-        #control de l'augmentation de la distance.
-        if self.speed_obj.total_distance > self.prev_distance:
-            self.time_base()
-            self.prev_distance = self.speed_obj.total_distance
+        #TODO tenir compte d'un temps minimum entre la réponse et 
+        # le prochain déclenchement.
+        # A voir si ça ne doit pas plutôt être géré du côté de la gestion
+        # des caméras
+        #TODO reprendre le code qui vérifie que le déclenchement a eu lieu       
             
-        #TODO regarder pourquoi le premier déclenchement après un arrêt
-        # du vélo (speed = 0), arrive un peu trop vite.
+    def wake_up(self):
+        """Compute again the next shutter deadline (new speed or distance)"""
+        with self._condition:
+            self._condition.notify()
             
     def stop(self):
-        self._pause = True
-        self._stop = True
+        with self._condition:
+            self._pause = True
+            self._stopped = True
+            self._condition.notify()
             
     def pause(self):
-        self._pause = True
+        with self._condition:
+            self._pause = True
+            self._condition.notify()
         
     def resume(self):
-        self._pause = False
+        with self._condition:
+            self._pause = False
+            self._condition.notify()
         
 
 class speedometer(threading.Thread):
@@ -297,12 +322,12 @@ class speedometer(threading.Thread):
     distance.
     Each pulse should be a timestamp and is in a queue.
     """
-    def __init__(self, wheel_radius, magnet, queue, rate=0.01):
+    def __init__(self, wheel_radius, magnet, queue, timeout=2):
         """init the class with these parameters
         :param wheel_radius: the wheel radius, in meters
         :param magnet: how many magnets are on the wheel
         :param queue: The queue the class should get pulses timestamps from
-        :param rate: Refresh speed rate (default to 10 milliseconds)
+        :param timeout: the speed is set to 0 without pulse during this time (default to 2 seconds)
         """
         threading.Thread.__init__(self)
         self.pulse_distance = wheel_radius*2*3.1415 / magnet
@@ -310,39 +335,46 @@ class speedometer(threading.Thread):
         self.prev_time = time.time()
         self.total_distance = 0
         self.speed = 0
-        self.rate = rate
-        self._stop = False
+        self.timeout = timeout
+        self.listeners = []
+        self._stopped = False
     
     def run(self):
-        while not self._stop:
+        while not self._stopped:
             self.read_queue()
-            time.sleep(self.rate)
+        
+    def add_listener(self, callback):
+        """callback is called after each change of speed or distance"""
+        self.listeners.append(callback)
         
     def read_queue(self):
-                    
-        for pulse_count in range(self.queue.qsize() + 1):
-            try:
-                pulse_timestamp = self.queue.get(timeout = 2)
-                elapsed_time = pulse_timestamp - self.prev_time
-                self.speed = self.pulse_distance / elapsed_time
-                self.total_distance += self.pulse_distance
-                self.prev_time = pulse_timestamp
-                
-            except queue.Empty:
+        """Wait for the next pulse, and update the speed and distance"""
+        try:
+            pulse_timestamp = self.queue.get(timeout = self.timeout)
+        except queue.Empty:
+            # the wheel doesn't turn anymore
+            if self.speed != 0:
                 self.speed = 0
-            
-            finally:
-                pass
-                #print("Distance : {0} - Vitesse : {1}m/s".format(self.total_distance, self.speed))
-        # Revéfifier la pertinence de cette solution dans les différents cas :
-        # Il faut tenir compte de la vitesse de la rotation de la roue
-        # ainsi que de la fréquence d'appel de cette méthode
-        # Il y a plusieurs cas "délicats" :
-        # la fréquence d'appel de la méthode est inférieure à celle de l'arrivée des pulses
-        # la fréquence d'appel de la méthode est supérieure à celle de l'arrivée des pulses
+                self.notify()
+            return
+        if pulse_timestamp is None:
+            # stop() wakes up the thread
+            return
+        elapsed_time = pulse_timestamp - self.prev_time
+        if elapsed_time > 0:
+            self.speed = self.pulse_distance / elapsed_time
+        self.total_distance += self.pulse_distance
+        self.prev_time = pulse_timestamp
+        self.notify()
+        #print("Distance : {0} - Vitesse : {1}m/s".format(self.total_distance, self.speed))
+        
+    def notify(self):
+        for callback in self.listeners:
+            callback()
  
     def stop(self):
-        self._stop = True
+        self._stopped = True
+        self.queue.put(None)
         
         
 
@@ -596,7 +628,7 @@ class Yi2K_cam_ctrl(object):
         #version avec time.gmtime
         #print(pic_return[0], pic_return[1][1:3], bin(pic_return[1][0])[2:].zfill(8), time.gmtime(pic_return[2]))
 
-        log_queue.put(str(timestamp) + "," + str(pic_return) + "," + str(bin(cam)) + "," + status + "\n")
+        log_queue.put(session_log.shutter_record(timestamp, pic_return, cam, status))
         
         
         self.pic_count += 1
@@ -609,7 +641,7 @@ class Yi2K_cam_ctrl(object):
         self.c.send("KPower_up", cam)
         time.sleep(6)
         start_return = self.c.receive(arg_formats="b")
-        logfile.write(str(start_return) + "\n")
+        logfile.write(session_log.event_record(time.time(), start_return))
         print(start_return)
 
     def power_down(self, cam=None):
@@ -618,7 +650,7 @@ class Yi2K_cam_ctrl(object):
             
         self.c.send("KPower_down", cam)
         down_return=self.c.receive()
-        logfile.write(str(down_return) + "\n")
+        logfile.write(session_log.event_record(time.time(), down_return))
         return self.c.receive()
 
 # Initialize an ArduinoBoard instance.  This is where you specify baud rate and
@@ -665,7 +697,7 @@ def takePic(cam, log_queue, pic_id=1):
     #version avec time.gmtime
     #print(pic_return[0], pic_return[1][1:3], bin(pic_return[1][0])[2:].zfill(8), time.gmtime(pic_return[2]))
 
-    log_queue.put(str(timestamp) + "," + str(pic_return) + "," + str(bin(cam)) + "," + status + "\n")
+    log_queue.put(session_log.shutter_record(timestamp, pic_return, cam, status))
     
     
     global pic_count
@@ -696,13 +728,13 @@ def power_up(cam=0b00000001):
     c.send("KPower_up", cam)
     time.sleep(6)
     start_return = c.receive(arg_formats="b")
-    logfile.write(str(start_return) + "\n")
+    logfile.write(session_log.event_record(time.time(), start_return))
     print(start_return)
     
 def power_down(cam=0b00000001):
     c.send("KPower_down", cam)
     down_return=c.receive()
-    logfile.write(str(down_return) + "\n")
+    logfile.write(session_log.event_record(time.time(), down_return))
     return c.receive()
 
 
@@ -727,6 +759,7 @@ def gnss_fix():
             pass
             
     print("Gnss Fix")
+    logqueue.put(session_log.gnss_record(time.time(), "fix {}".format(mode)))
     time.sleep(10)
 
 def gnss_localization():
@@ -747,19 +780,19 @@ def gnss_localization():
 def _4Yi_set_clock():
     try:
         runpy.run_path("/home/pi/V4MPod/raspberry/Yi2k_scripts/_4Yi_set_clock.py")
-        logfile.write("Yi set clock: OK" + "\n")
+        logfile.write(session_log.event_record(time.time(), "Yi set clock: OK"))
         beep(0.1)
     except:
-        logfile.write("Yi set clock: Can't set clock, communication error" + "\n")
+        logfile.write(session_log.event_record(time.time(), "Yi set clock: Can't set clock, communication error"))
         beep(0.4, 0.1, 2)
 
 def _4Yi_set_settings():
     try:
         runpy.run_path("/home/pi/V4MPod/raspberry/Yi2k_scripts/_4Yi_set_param.py")
-        logfile.write("Yi send settings: OK" + "\n")
+        logfile.write(session_log.event_record(time.time(), "Yi send settings: OK"))
         beep(0.1)
     except:
-        logfile.write("Yi send settings: Can't send settings, communication error" + "\n")
+        logfile.write(session_log.event_record(time.time(), "Yi send settings: Can't send settings, communication error"))
         beep(0.4, 0.1, 2)
 
 def exit_loop():
@@ -771,7 +804,6 @@ def power_down_pi():
     os.system("sudo shutdown -h now")
         
 def exit_prog():
-    #TODO : stop the flush thread
     global keepRunning
     #try:
     #reset interrupt on mcp    
@@ -779,9 +811,10 @@ def exit_prog():
     bus.read_byte_data(MCP2, INTCAPA)
     bus.close()
     stop_gnss_log()
-    logfile.write("Exiting" + "\n")
+    flushthread.stop()
+    print(flushthread.stats())
+    logfile.write(session_log.event_record(time.time(), "Exiting"))
     logfile.close()
-    flushthread.do_run = False
     GPIO.cleanup()
     print("Exiting program A")
     keepRunning=False
@@ -794,29 +827,11 @@ def open_file():
     now=datetime.datetime.now()
     filename = os.path.expanduser("~") + "/Documents/Sessions_V4MPOD/cam_log_" + now.strftime("%Y-%m-%d_%H.%M.%S") + ".log"
     logfile=open(filename, "w")
-    flushthread=threading.Thread(target=flush_log, args=(logqueue,), name="flushlog")
+    logfile.write(session_log.header())
+    flushthread=session_log.log_writer(logqueue, logfile)
     flushthread.start()
     return logfile
     
-def flush_log(logqueue):
-    #since Python 3.4 file are inheritable. I think it's why
-    #flush() alone doesn't work in this thread.
-    
-    t = threading.currentThread()
-    while getattr(t, "do_run", True):
-        time.sleep(10)
-        try:
-            while not logqueue.empty():
-                #logfile.write(logqueue.get())
-                logline = logqueue.get()
-                print (logline)
-                logfile.write(logline)
-                logqueue.task_done()
-            logfile.flush()
-            os.fsync(logfile.fileno())
-        except:
-            None
-
 def menu_previous_line():
     global menuA
     pos = menuA[-2]
@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 
 """
-Script for simultaneously copying the pictures from up to 6 cameras.
+Script for simultaneously copying the pictures from several cameras.
 The primary goal is to copy the pictures from 4 action-cams, make groups of pictures with a cutoff time, create
 a subfolder for each cam and copy the renamed pictures (timestamp added to the filename).
 Let's say you have two cams, with sd cards named "front" and "back".
@@ -43,17 +43,32 @@ In your test folder you will get:
 			   |2017-02-01_11h26mn43s-Cam_back-YDXJ0116.jpg
 
 
+Each picture is hashed during the copy and recorded in the copy_manifest.jsonl file of the destination.
+If the copy is interrupted, run the same command again: the pictures already copied are skipped,
+once the hash of their copy is checked.
+Before formatting the cards, check the copies with:
+python copy_pic ~/test --verify
+
 #source : http://stackoverflow.com/questions/12672981/python-os-independent-list-of-available-storage-devices
 """
-""" TODO :
-- Calculate the total size to copy, and the space left on the destination
-"""
-import os, subprocess, sys, datetime, shutil, time, argparse
+import os, subprocess, sys, datetime, shutil, time, argparse, errno, hashlib, json, heapq, queue
+from contextlib import contextmanager
 from lib.exif_read import ExifRead as EXIF
-from threading import Thread
+from threading import Thread, Event, Lock
 from queue import Queue
 from concurrent.futures import ThreadPoolExecutor
 
+# size of the buffer when the zero-copy functions can't be used
+COPY_BUFFER_SIZE = 4 * 1024 * 1024
+# maximum number of pictures waiting to be copied, for each device
+QUEUE_SIZE = 200
+# list of the copied pictures, in the destination folder
+MANIFEST_FILENAME = "copy_manifest.jsonl"
+# number of pictures buffered to put back in time order the pictures of a card
+REORDER_WINDOW = 32
+# maximum number of scanned pictures waiting to be grouped, for each card
+SCAN_QUEUE_SIZE = 500
+
 
 def arg_parse():
     """ Parse the command line you use to launch the script """
@@ -66,11 +81,43 @@ def arg_parse():
     parser.add_argument("-c", "--cut", help="Min time between two pictures to create a new group (in seconds)",
                         default=10, type=int)
     parser.add_argument("-a", "--allgroups", help="Copy all groups of pictures without asking.", action="store_true")
+    parser.add_argument("-w", "--workers", help="Number of copy threads for each source device", default=1, type=int)
+    parser.add_argument("-n", "--no_hash", help="Don't hash the pictures and don't use the manifest (faster, "
+                                                "but the copies can't be verified and all the pictures are copied again). Without it, "
+                                                "the pictures already copied are skipped if the hash of their copy is right", action="store_true")
+    parser.add_argument("--verify", help="Hash again all the pictures of the manifest in the destination and "
+                                         "compare them to the hash computed during the copy", action="store_true")
     args = parser.parse_args()
     print(args)
     return args
 
 
+def iter_jpg(directory, camid=None):
+    """ Search for all the jpg found in a folder and all the subfolders, one at a time.
+	The folders and files are read in name order, which is the shooting order of the cameras.
+
+	Yield lists containing the camid, the complete path of the
+	picture (string), and its DatetimeOriginal (datetime object from the Exif header)
+	['camid', '/mypath/mydirectory/mypicture.jpg', 'datetime.datetime']
+	"""
+
+    for root, subfolders, files in os.walk(directory):
+        subfolders.sort()
+        for filename in sorted(files):
+            if not filename.lower().endswith(".jpg"):
+                continue
+            filepath = os.path.join(root, filename)
+            try:
+                t = EXIF(filepath).extract_capture_time()
+            except KeyError as e:
+                t = None
+            if t is None:
+                # if any of the required tags are not set the image is not added to the list
+                print("Skipping {0}: no capture time".format(filepath))
+                continue
+            yield [camid, filepath, t]
+
+
 def list_jpg(directory, camid=None):
     """ Search for all the jpg found in a folder and all the subfolders
 
@@ -78,29 +125,60 @@ def list_jpg(directory, camid=None):
 	picture (string), and its DatetimeOriginal (datetime object from the Exif header)
 	[['camid', '/mypath/mydirectory/mypicture.jpg', 'datetime.datetime']]
 	"""
+    return list(iter_jpg(directory, camid))
+
+
+def reorder(pictures, window=REORDER_WINDOW):
+    """Sort a stream of pictures by time, when they are out of order by less than window pictures
+	(a camera clock set during a session, a folder renamed...)"""
+    heap = []
+    for count, picture in enumerate(pictures):
+        heapq.heappush(heap, (picture[2], count, picture))
+        if len(heap) > window:
+            yield heapq.heappop(heap)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+def scan_in_thread(directory, camid, stop_scan):
+    """Scan a card in its own thread, and return a generator of its pictures, in time order.
+	The scan stops when stop_scan is set."""
+    scan_queue = Queue(maxsize=SCAN_QUEUE_SIZE)
+    end_of_scan = object()
+
+    def put(item):
+        # don't block forever if nobody reads the stream anymore
+        while not stop_scan.is_set():
+            try:
+                scan_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
 
-    file_list = []
-    for root, subfolders, files in os.walk(directory):
-        file_list += [os.path.join(root, filename) for filename in files if filename.lower().endswith(".jpg")]
-    files = []
-    # get DateTimeOriginal data from the images and sort the list by timestamp
-    for filepath in file_list:
-        metadata = EXIF(filepath)
-        
+    def scan():
         try:
-            t = metadata.extract_capture_time()
-            #s = int(t.microsecond / 1000000)
-            # print t
-            # print type(t)
-            # s = metadata["Exif.Photo.SubSecTimeOriginal"].value
-            files.append([camid, filepath, t])
-        except KeyError as e:
-            # if any of the required tags are not set the image is not added to the list
-            print("Skipping {0}: {1}".format(filename, e))
-
-    # files.sort(key=lambda timestamp: timestamp[1])
-    # print_list(files)
-    return files
+            for picture in reorder(iter_jpg(directory, camid)):
+                if not put(picture):
+                    return
+        except Exception as e:
+            print("Error while scanning {0}: {1}".format(directory, e))
+        put(end_of_scan)
+
+    Thread(target=scan, name="scan_" + str(camid), daemon=True).start()
+    while True:
+        picture = scan_queue.get()
+        if picture is end_of_scan:
+            return
+        yield picture
+
+
+def scan_cards(drivelist, stop_scan):
+    """Scan all the cards in parallel, and merge their pictures in a single time ordered stream
+	:param drivelist: a list of [drive path, volume name]
+	"""
+    return heapq.merge(*[scan_in_thread(drivepath + "/DCIM/", volume, stop_scan) for drivepath, volume in drivelist],
+                       key=lambda picture: picture[2])
 
 
 # return file_list
@@ -201,110 +279,599 @@ def listgroup():
         print("fin de groupe")
 
 def make_groups(piclist, cutoff):
-    """ make groups depending on cut time"""
+    """ make groups depending on cut time, return the index of the first picture of each group"""
 
-    groups = []
-    groups.append(piclist[0][1])
-    ziplist = zip(piclist, piclist[1:])
+    groups = [0]
     # print 'cutoff vaut', cutoff
     print("Computing groups...")
 
-    for pic_couple in ziplist:
+    for i, pic_couple in enumerate(zip(piclist, piclist[1:])):
         id1, path1, t1 = pic_couple[0]
         id2, path2, t2 = pic_couple[1]
         gap = (t2 - t1)
         # print gap.total_seconds()
         if gap.total_seconds() >= cutoff:
-            groups.append(path2)
+            groups.append(i + 1)
 
     for i, group in enumerate(groups):
-        groups[i] = find_in_sublist(piclist, group)
-        print("Group {0} start : {1}".format(i + 1, piclist[groups[i]][2].strftime("%Y-%m-%d_%HH%Mmn%Ss")))
+        print("Group {0} start : {1}".format(i + 1, piclist[group][2].strftime("%Y-%m-%d_%HH%Mmn%Ss")))
     return groups
 
 def make_pics_groups(piclist, groups):
     """This compare the piclist and the group to generate the group path, and
-	send the picture to the "dispatch_to_queue function" """
-    groups.reverse()
+	yield each picture with its group path. The pictures before the first group are skipped."""
+    groups = sorted(groups, reverse=True)
     cut = groups.pop()
+    group_path = None
     for i, pic in enumerate(piclist):
         if i == cut:
             group_path = piclist[i][2].strftime("%Y-%m-%d_%HH%Mmn%Ss")
+            cut = groups.pop() if groups else None
+        if group_path is not None:
+            yield pic, group_path
+
+
+class OutOfOrderError(ValueError):
+    """A picture of the stream is older than the previous one"""
+
+
+def stream_groups(pictures, cutoff, first_group=1, last_group=None):
+    """Make the groups depending on cut time, on a time ordered stream of pictures, and
+	yield each picture of the groups first_group to last_group with its group path.
+	The stream isn't read after the last group.
+	Raise OutOfOrderError if a picture is older than the previous one (the pictures of a card
+	weren't in time order, even with the reorder window): the groups would be wrong.
+	"""
+    group = 0
+    prev_time = None
+    for picture in pictures:
+        if prev_time is not None and picture[2] < prev_time:
+            raise OutOfOrderError("{0} ({1}) is older than the previous picture ({2})".format(picture[1], picture[2], prev_time))
+        if prev_time is None or (picture[2] - prev_time).total_seconds() >= cutoff:
+            group += 1
+            if last_group is not None and group > last_group:
+                return
+            group_path = picture[2].strftime("%Y-%m-%d_%HH%Mmn%Ss")
+            print("Group {0} start : {1}".format(group, group_path))
+        prev_time = picture[2]
+        if group >= first_group:
+            yield picture, group_path
+
+
+@contextmanager
+def open_copy(source, destination):
+    """Open the source and the destination of a copy.
+	If the copy fails, the destination is removed, but only if it was opened (created or truncated)
+	for this copy: an error on the source doesn't delete an existing picture.
+	"""
+    with open(source, "rb") as fsrc:
+        fdst = open(destination, "wb")
+        try:
+            with fdst:
+                yield fsrc, fdst
+        except BaseException:
+            # don't keep a truncated picture
             try:
-                cut = groups.pop()
-            except:
+                os.remove(destination)
+            except OSError:
                 pass
-        # print group_path, piclist[i][1]
-        # rename_and_copy_pic(piclist[i], group_path)
-        try:
-            dispatch_to_queue(piclist[i], group_path)
-        except:
-            pass
+            raise
 
 
-def dispatch_to_queue(pic, group_path):
-    """Send a picture to be copied and his path destination, to a specific queue.
-	One queue for each camera/sdcard
+def copy_file(source, destination):
+    """Copy the content of a file, with a zero-copy system call when it's possible
+	(os.copy_file_range or os.sendfile), and a large buffer otherwise.
+	Return the number of bytes copied.
+	"""
+    with open_copy(source, destination) as (fsrc, fdst):
+        size = os.fstat(fsrc.fileno()).st_size
+        copied = 0
+        for zero_copy in (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)):
+            if zero_copy is None:
+                continue
+            try:
+                while copied < size:
+                    if zero_copy is os.sendfile:
+                        sent = os.sendfile(fdst.fileno(), fsrc.fileno(), copied, size - copied)
+                    else:
+                        sent = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied, copied, copied)
+                    if sent == 0:
+                        break
+                    copied += sent
+                return copied
+            except OSError as e:
+                # not supported between these filesystems, try the next one
+                if copied or e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSUP, errno.EBADF):
+                    raise
+        shutil.copyfileobj(fsrc, fdst, COPY_BUFFER_SIZE)
+        return fdst.tell()
+
+
+def new_hash():
+    return hashlib.blake2b(digest_size=32)
+
+
+def copy_and_hash(source, destination):
+    """Copy the content of a file, and compute its hash in the same pass.
+	The copy is synced to the disk before returning, so it's safe to record it in the manifest.
+	Return the number of bytes copied and the hash (hex string).
+	"""
+    file_hash = new_hash()
+    buffer = bytearray(COPY_BUFFER_SIZE)
+    view = memoryview(buffer)
+    size = 0
+    with open_copy(source, destination) as (fsrc, fdst):
+        while True:
+            length = fsrc.readinto(buffer)
+            if not length:
+                break
+            file_hash.update(view[:length])
+            fdst.write(view[:length])
+            size += length
+        fdst.flush()
+        os.fsync(fdst.fileno())
+    return size, file_hash.hexdigest()
+
+
+def fsync_directory(path):
+    """Sync the entries of a directory (the new and renamed files) to the disk.
+	Nothing is done where a directory can't be opened (Windows)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def hash_file(path):
+    """Return the hash (hex string) of a file"""
+    file_hash = new_hash()
+    buffer = bytearray(COPY_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb") as f:
+        while True:
+            length = f.readinto(buffer)
+            if not length:
+                break
+            file_hash.update(view[:length])
+    return file_hash.hexdigest()
+
+
+class Manifest(object):
+    """The list of the pictures copied in a destination folder, with their hash.
+	It's a json file with one record per line, appended after each copy, so an interrupted
+	offload can be resumed: the pictures already copied are skipped, if their copy has the hash
+	of the manifest (see verified_copy).
+
+	Copy record: {"cam", "source", "size", "mtime", "hash", "destination"}
+	Verification record: {"destination", "hash", "verified"}
+	The destination paths are relative to the destination folder.
+	"""
+
+    def __init__(self, dest_folder):
+        self.dest_folder = dest_folder
+        self.path = os.path.join(dest_folder, MANIFEST_FILENAME)
+        self.copies = {}  # source key -> copy record
+        self.verified = {}  # destination -> verified hash
+        self._directories = set()  # folders of the copies, to sync on close
+        self._file = None
+        self._lock = Lock()
+        self.load()
+
+    @staticmethod
+    def source_key(camid, source, size, mtime):
+        # the mount point of a card can change, and the camera file names come back after
+        # a counter reset, so the key is the camera, the file name, the size and the mtime.
+        return camid, os.path.basename(source), size, mtime
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line of an interrupted copy
+                    continue
+                if "verified" in record:
+                    if record["verified"]:
+                        self.verified[record["destination"]] = record["hash"]
+                    else:
+                        self.verified.pop(record["destination"], None)
+                else:
+                    self.copies[self.source_key(record["cam"], record["source"], record["size"], record["mtime"])] = record
+
+    def copied(self, camid, source, stat):
+        """Return the copy record of a source file, if it was already copied and the copy is still there,
+		with the right size. The content isn't checked, it's only for the estimates (see verified_copy).
+		"""
+        record = self.copies.get(self.source_key(camid, source, stat.st_size, stat.st_mtime))
+        if record is None:
+            return None
+        destination = os.path.join(self.dest_folder, record["destination"])
+        if not os.path.exists(destination) or os.path.getsize(destination) != record["size"]:
+            return None
+        return record
+
+    def verified_copy(self, camid, source, stat):
+        """Return the copy record of a source file, if it was already copied and the copy has the hash
+		computed during the copy. The copies not verified yet are hashed, and the result is recorded.
+		"""
+        record = self.copied(camid, source, stat)
+        if record is None:
+            return None
+        with self._lock:
+            verified_hash = self.verified.get(record["destination"])
+        if verified_hash == record["hash"]:
+            return record
+        try:
+            verified = hash_file(os.path.join(self.dest_folder, record["destination"])) == record["hash"]
+        except OSError:
+            return None
+        self.add({"destination": record["destination"], "hash": record["hash"], "verified": verified})
+        return record if verified else None
+
+    def add(self, record):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a")
+                self._directories.add(self.dest_folder)
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            if "verified" in record:
+                if record["verified"]:
+                    self.verified[record["destination"]] = record["hash"]
+                else:
+                    self.verified.pop(record["destination"], None)
+            else:
+                self.copies[self.source_key(record["cam"], record["source"], record["size"], record["mtime"])] = record
+                # the cam folder and the group folder
+                cam_folder = os.path.dirname(os.path.join(self.dest_folder, record["destination"]))
+                self._directories.update((cam_folder, os.path.dirname(cam_folder)))
+
+    def close(self):
+        """Sync the folders of the copies and the manifest to the disk, and close the manifest"""
+        with self._lock:
+            for directory in self._directories:
+                fsync_directory(directory)
+            self._directories.clear()
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+
+def rename_and_copy_pic(picture, group_path, dest_folder, manifest=None):
+    """Copy a picture to the destination, with a new name.
+	With a manifest, the picture is hashed during the copy, and skipped if it was already copied
+	and its copy is verified. A copy made in another group (another cutoff) is moved to this group.
+	Return the number of bytes copied (0 if the picture is skipped).
 	"""
+    camid, picture_path, timestamp = picture
+    dest_path = os.path.join(dest_folder, group_path, camid)
+    picture_name = timestamp.strftime("%Y-%m-%d_%HH%Mmn%Ss") + "-Cam_" + camid + "-" + os.path.basename(
+        picture_path)
+    destination = os.path.join(dest_path, picture_name)
+    if manifest is not None:
+        stat = os.stat(picture_path)
+        record = manifest.verified_copy(camid, picture_path, stat)
+        if record is not None:
+            if record["destination"] != os.path.relpath(destination, dest_folder):
+                move_copy(record, destination, dest_folder, manifest)
+            else:
+                print("skipping", picture_path, "(already copied)")
+            return 0
+    os.makedirs(dest_path, exist_ok=True)
+    print("copying", picture_path, " to ", destination)
+    if manifest is None:
+        return copy_file(picture_path, destination)
+    size, file_hash = copy_and_hash(picture_path, destination)
+    manifest.add({"cam": camid, "source": picture_path, "size": size, "mtime": stat.st_mtime,
+                  "hash": file_hash, "destination": os.path.relpath(destination, dest_folder)})
+    return size
+
+
+def move_copy(record, destination, dest_folder, manifest):
+    """Move a verified copy of the manifest to a new destination, and remove its old folders if they're empty"""
+    old_destination = os.path.join(dest_folder, record["destination"])
+    print("moving", old_destination, " to ", destination)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(old_destination, destination)
+    fsync_directory(os.path.dirname(destination))
+    new_record = dict(record, destination=os.path.relpath(destination, dest_folder))
+    manifest.add(new_record)
+    manifest.add({"destination": new_record["destination"], "hash": new_record["hash"], "verified": True})
+    # the cam folder, then the group folder
+    for folder in (os.path.dirname(old_destination), os.path.dirname(os.path.dirname(old_destination))):
+        try:
+            os.rmdir(folder)
+        except OSError:
+            break
+
+
+class ThroughputMeter(object):
+    """Count the pictures and bytes copied from a device"""
+
+    def __init__(self, device):
+        self.device = device
+        self.cams = []
+        self.files = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.errors = 0
+        self.start_time = None
+        self.end_time = None
+        self._lock = Lock()
+
+    def start(self):
+        """Record the start of the copies, when a worker takes its first picture"""
+        with self._lock:
+            if self.start_time is None:
+                self.start_time = time.time()
+                self.end_time = self.start_time
+
+    def add(self, size):
+        with self._lock:
+            self.end_time = time.time()
+            self.files += 1
+            self.bytes += size
+
+    def add_skipped(self):
+        with self._lock:
+            self.skipped += 1
+
+    def add_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def elapsed(self):
+        if self.start_time is None:
+            return 0
+        return self.end_time - self.start_time
+
+    def rate(self):
+        """Throughput in MB/s"""
+        elapsed = self.elapsed()
+        return self.bytes / 1e6 / elapsed if elapsed > 0 else 0
+
+    def __str__(self):
+        return "{0}: {1} pictures, {2:.1f} MB in {3:.1f} s ({4:.1f} MB/s){5}{6}".format(
+            ", ".join(self.cams), self.files, self.bytes / 1e6, self.elapsed(), self.rate(),
+            ", {0} already copied".format(self.skipped) if self.skipped else "",
+            ", {0} errors".format(self.errors) if self.errors else "")
+
+
+class CopyEngine(object):
+    """Copy the pictures with one pool of threads for each physical source device,
+	so each sd card reader is busy, whatever the number of cameras.
+	The queues are bounded, the workers stop on a sentinel, and everything stops when the
+	destination is full.
+	"""
+
+    def __init__(self, dest_folder, workers_per_device=1, queue_size=QUEUE_SIZE, manifest=None):
+        self.dest_folder = dest_folder
+        self.manifest = manifest
+        self.workers_per_device = max(workers_per_device, 1)
+        self.queue_size = queue_size
+        self.devices = {}  # camid -> device id
+        self.pools = {}  # device id -> (queue, threads, throughput meter)
+        self.disk_full = Event()
+
+    def _pool(self, picture):
+        camid, picture_path, timestamp = picture
+        if camid not in self.devices:
+            self.devices[camid] = os.stat(picture_path).st_dev
+            device = self.devices[camid]
+            if device not in self.pools:
+                pic_queue = Queue(maxsize=self.queue_size)
+                meter = ThroughputMeter(device)
+                threads = [Thread(target=self._worker, args=(pic_queue, meter), name="copy_{0}_{1}".format(device, i))
+                           for i in range(self.workers_per_device)]
+                for thread in threads:
+                    thread.start()
+                self.pools[device] = (pic_queue, threads, meter)
+            self.pools[device][2].cams.append(camid)
+        return self.pools[self.devices[camid]]
+
+    def put(self, picture, group_path):
+        """Send a picture to be copied in group_path. Return False if the destination is full.
+		It blocks while the queue of the device is full.
+		"""
+        if self.disk_full.is_set():
+            return False
+        pic_queue, threads, meter = self._pool(picture)
+        pic_queue.put((picture, group_path))
+        return True
 
-    if volume_names[0] in pic:
-        picQueue0.put([pic, group_path])
-    elif volume_names[1] in pic:
-        picQueue1.put([pic, group_path])
-    elif volume_names[2] in pic:
-        picQueue2.put([pic, group_path])
-    elif volume_names[3] in pic:
-        picQueue3.put([pic, group_path])
-    elif volume_names[4] in pic:
-        picQueue4.put([pic, group_path])
-    elif volume_names[5] in pic:
-        picQueue5.put([pic, group_path])
-
-
-def start_copy_thread():
-    """Create a thread for each queue, and send it to the "rename_and_copy_pic" function
+    def _worker(self, pic_queue, meter):
+        while True:
+            job = pic_queue.get()
+            try:
+                if job is None:
+                    return
+                if self.disk_full.is_set():
+                    continue
+                picture, group_path = job
+                meter.start()
+                try:
+                    size = rename_and_copy_pic(picture, group_path, self.dest_folder, self.manifest)
+                    if size:
+                        meter.add(size)
+                    else:
+                        meter.add_skipped()
+                except OSError as e:
+                    if e.errno in (errno.ENOSPC, errno.EDQUOT):
+                        print("Destination is full, stopping the copy")
+                        self.disk_full.set()
+                    else:
+                        meter.add_error()
+                        print("Error while copying {0}: {1}".format(picture[1], e))
+                except Exception as e:
+                    # the worker must keep draining the queue until the sentinel
+                    meter.add_error()
+                    print("Error while copying {0}: {1}".format(picture[1], e))
+            finally:
+                pic_queue.task_done()
+
+    def close(self):
+        """Wait for the end of the copies, and return the throughput meters"""
+        for pic_queue, threads, meter in self.pools.values():
+            for thread in threads:
+                pic_queue.put(None)
+        for pic_queue, threads, meter in self.pools.values():
+            for thread in threads:
+                thread.join()
+        return [meter for pic_queue, threads, meter in self.pools.values()]
+
+
+def copy_pictures(jobs, dest_folder, workers_per_device=1, manifest=None):
+    """Copy the pictures with a CopyEngine, as soon as they come, and print the throughput of each device
+	:param jobs: an iterable of (picture, group path)
+	:param manifest: a Manifest object, to hash and record the copies
 	"""
     start_time = datetime.datetime.now()
-    worker0 = Thread(target=rename_and_copy_pic, args=(picQueue0,))
-    worker0.start()
-    worker1 = Thread(target=rename_and_copy_pic, args=(picQueue1,))
-    worker1.start()
-    worker2 = Thread(target=rename_and_copy_pic, args=(picQueue2,))
-    worker2.start()
-    worker3 = Thread(target=rename_and_copy_pic, args=(picQueue3,))
-    worker3.start()
-    worker4 = Thread(target=rename_and_copy_pic, args=(picQueue4,))
-    worker4.start()
-    worker5 = Thread(target=rename_and_copy_pic, args=(picQueue5,))
-    worker5.start()
-    picQueue0.join()
-    picQueue1.join()
-    picQueue2.join()
-    picQueue3.join()
-    picQueue4.join()
-    picQueue5.join()
-    print(len(piclist[:pic_end]), "pictures copied in", (
+    engine = CopyEngine(dest_folder, workers_per_device, manifest=manifest)
+    try:
+        for picture, group_path in jobs:
+            if not engine.put(picture, group_path):
+                # the destination is full
+                break
+    finally:
+        meters = engine.close()
+        if manifest is not None:
+            manifest.close()
+    for meter in meters:
+        print(meter)
+    copied = sum(meter.files for meter in meters)
+    skipped = sum(meter.skipped for meter in meters)
+    print(copied, "pictures copied in", (
         datetime.datetime.now() - start_time).total_seconds(), "seconds")
+    if skipped:
+        print(skipped, "pictures already copied")
+    if engine.disk_full.is_set():
+        sys.exit("Destination is full, the copy is incomplete")
+    if sum(meter.errors for meter in meters):
+        sys.exit("{0} pictures not copied".format(sum(meter.errors for meter in meters)))
+
 
+def check_free_space(total_size, dest_folder):
+    """Warn the user if the pictures to copy don't fit on the destination"""
+    free_space = shutil.disk_usage(dest_folder).free
+    if total_size > free_space:
+        print("Warning: {0:.1f} MB to copy, but only {1:.1f} MB free on the destination".format(total_size / 1e6, free_space / 1e6))
 
-def rename_and_copy_pic(queue):
-    """Take each picture in the queue, and copy it to the destination, with a new name.
+
+def cards_size(drivelist, manifest=None):
+    """Size of the jpg files of each card, without the ones already copied according to the manifest.
+	The Exif data aren't read, it's only a walk of the folders.
+	Return a dict {volume name: size in bytes}
 	"""
-    while not queue.empty():
-        picture, group_path = queue.get()
-        camid, picture_path, timestamp = picture
-        dest_path = os.path.join(dest_folder, group_path, camid)
-        if not os.path.exists(dest_path):
-            try:
-                os.makedirs(dest_path)
-            except:
-                pass
-        picture_name = timestamp.strftime("%Y-%m-%d_%HH%Mmn%Ss") + "-Cam_" + camid + "-" + os.path.basename(
-            picture_path)
-        print("copying", picture_path, " to ", os.path.join(dest_path, picture_name))
-        shutil.copyfile(picture_path, os.path.join(dest_path,
-                                                   picture_name))  # TODO: add an option to choose overwrite destination, or skip
-        queue.task_done()
+    sizes = {}
+    for drivepath, volume in drivelist:
+        sizes[volume] = 0
+        for root, subfolders, files in os.walk(drivepath + "/DCIM/"):
+            for filename in files:
+                if not filename.lower().endswith(".jpg"):
+                    continue
+                stat = os.stat(os.path.join(root, filename))
+                if manifest is None or not manifest.copied(volume, filename, stat):
+                    sizes[volume] += stat.st_size
+    return sizes
+
+
+def start_copy(piclist, groups, dest_folder, workers_per_device=1, use_manifest=True):
+    """Copy the pictures of the groups, after checking the free space on the destination
+	With use_manifest, the pictures are hashed and recorded in the manifest of the destination
+	"""
+    os.makedirs(dest_folder, exist_ok=True)
+    manifest = Manifest(dest_folder) if use_manifest else None
+    # the pictures before the first group aren't copied
+    to_copy = piclist[groups[0]:] if groups else []
+    total_size = 0
+    for pic in to_copy:
+        stat = os.stat(pic[1])
+        if manifest is None or not manifest.copied(pic[0], pic[1], stat):
+            total_size += stat.st_size
+    check_free_space(total_size, dest_folder)
+    copy_pictures(make_pics_groups(piclist, groups), dest_folder, workers_per_device, manifest)
+
+
+def stream_copy(drivelist, cutoff, dest_folder, workers_per_device=1, use_manifest=True):
+    """Scan the cards, group the pictures and copy them at the same time: a picture is copied
+	as soon as it's scanned and its group is known.
+	If the pictures aren't in time order, the cards are scanned again and the pictures sorted before
+	making the groups. With the manifest, the pictures already copied in a wrong group are moved.
+	Without it, they couldn't be found again: the pictures are sorted before making the groups.
+	"""
+    os.makedirs(dest_folder, exist_ok=True)
+    if not use_manifest:
+        print("Without the manifest, the pictures are sorted before the copy")
+        copy_sorted(drivelist, cutoff, dest_folder, workers_per_device, use_manifest)
+        return
+    manifest = Manifest(dest_folder)
+    sizes = cards_size(drivelist, manifest)
+    for volume, size in sizes.items():
+        print("{0}: {1:.1f} MB to copy".format(volume, size / 1e6))
+    check_free_space(sum(sizes.values()), dest_folder)
+    stop_scan = Event()
+    try:
+        copy_pictures(stream_groups(scan_cards(drivelist, stop_scan), cutoff), dest_folder, workers_per_device, manifest)
+        return
+    except OutOfOrderError as e:
+        print("Warning: {0}".format(e))
+        print("The pictures aren't in time order, sorting all the pictures before making the groups...")
+    finally:
+        stop_scan.set()
+    copy_sorted(drivelist, cutoff, dest_folder, workers_per_device, use_manifest)
+
+
+def copy_sorted(drivelist, cutoff, dest_folder, workers_per_device=1, use_manifest=True):
+    """Scan all the cards, sort the pictures by time, and copy all the groups"""
+    piclist = sorted(scan_cards(drivelist, Event()), key=lambda timestamp: timestamp[2])
+    if not piclist:
+        print("No picture found !")
+        return
+    start_copy(piclist, make_groups(piclist, cutoff), dest_folder, workers_per_device, use_manifest)
+
+
+def verify_manifest(dest_folder, workers=None):
+    """Hash again, in parallel, the copies listed in the manifest of dest_folder, and compare them
+	with the hash computed during the copy. The results are added to the manifest.
+	Return the list of the destination paths which are missing or different.
+	"""
+    manifest = Manifest(dest_folder)
+    records = list(manifest.copies.values())
+    if not records:
+        print("No manifest in", dest_folder)
+        return []
+
+    def verify(record):
+        try:
+            return record, hash_file(os.path.join(dest_folder, record["destination"]))
+        except OSError as e:
+            print("Can't read {0}: {1}".format(record["destination"], e))
+            return record, None
+
+    errors = []
+    start_time = datetime.datetime.now()
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for record, file_hash in executor.map(verify, records):
+            verified = file_hash == record["hash"]
+            if not verified:
+                errors.append(record["destination"])
+                print("Error: {0} doesn't match {1}".format(record["destination"], record["source"]))
+            manifest.add({"destination": record["destination"], "hash": record["hash"], "verified": verified})
+    manifest.close()
+    print(len(records) - len(errors), "pictures verified,", len(errors), "errors in", (
+        datetime.datetime.now() - start_time).total_seconds(), "seconds")
+    return errors
 
 
 def check_user_choice(user_input):
@@ -332,6 +899,10 @@ if __name__ == '__main__':
 
     args = arg_parse()
     dest_folder = args.destination
+    if args.verify:
+        if verify_manifest(dest_folder):
+            sys.exit("Some pictures are missing or different, don't format the cards !")
+        sys.exit()
     cutoff = args.cut
     allgroups = args.allgroups
     volume_names = [volume.strip() for volume in args.source.lower().split(",")]
@@ -347,46 +918,35 @@ if __name__ == '__main__':
         print("Volume found: {}   ({})".format(drive[0], drive[1]))
     if len(drivelist) == 0:
         sys.exit("No Volume found !")
-    if len(drivelist) > 6:
-        sys.exit("Sorry, this script can't manage more than 6 sources \
-				If you need more, add some queues and thread, or \
-				rewrite the multithread part of this script to dynamicaly handle the number of sources")
-
     # Check if destination is a source too (bad idea)
     check_dest = find_in_sublist([[drive.lower() for drive in drivedetail] for drivedetail in drivelist],
                        os.path.splitdrive(dest_folder)[0].lower())
     if  type(check_dest) == int:
         sys.exit("Destination is the same as one source.... Exiting")
 
-    piclist = []
-    print("Searching for pictures...")
-    
-    workers_cnt = len(drivelist)
-    with ThreadPoolExecutor(max_workers = workers_cnt) as executor:
-        future_lst = []
-        for drive in drivelist:
-            drivepath, volume = drive
-            future_itm = executor.submit(list_jpg, drivepath + "/DCIM/", volume)
-            future_lst.append(future_itm)
-        for future in future_lst:
-            result = future.result()
-            piclist.extend(result)
+    if allgroups:
+        # no need to choose the groups: copy the pictures while the cards are scanned
+        print("Searching and copying pictures...")
+        stream_copy(drivelist, cutoff, dest_folder, args.workers, not args.no_hash)
+        sys.exit()
 
+    print("Searching for pictures...")
+    stop_scan = Event()
+    piclist = list(scan_cards(drivelist, stop_scan))
+    # the stream is only sorted inside a reorder window
     piclist.sort(key=lambda timestamp: timestamp[2])
+    if len(piclist) == 0:
+        sys.exit("No picture found !")
     groups = make_groups(piclist, cutoff)
 
     input_validity = False
     while input_validity == False:
-        if not allgroups:
-            user_input = input(
-                "\nEnter the group' number you want to copy\nOr enter the group range (e.g. 2-4 to copy the groups 2,3 and 4),\nOr press enter to copy all groups,\nOr enter c+value to change the cut value (e.g. c600 for 600 seconds) : ").split(
-                "-")
-        else:
-            user_input = ['']
+        user_input = input(
+            "\nEnter the group' number you want to copy\nOr enter the group range (e.g. 2-4 to copy the groups 2,3 and 4),\nOr press enter to copy all groups,\nOr enter c+value to change the cut value (e.g. c600 for 600 seconds) : ").split(
+            "-")
 
         if user_input == ['']:
-            user_input[0] = 1
-            user_input.append(len(groups))
+            user_input = ['1', str(len(groups))]
         if len(user_input) == 1:
             user_input.append(user_input[0])
         if user_input[0].startswith('c'):
@@ -402,12 +962,4 @@ if __name__ == '__main__':
     groups_start = int(user_input[0]) - 1
     groups_end = int(user_input[1])
 
-    picQueue0 = Queue()
-    picQueue1 = Queue()
-    picQueue2 = Queue()
-    picQueue3 = Queue()
-    picQueue4 = Queue()
-    picQueue5 = Queue()
-
-    make_pics_groups(piclist[:pic_end], groups[groups_start:groups_end])
-    start_copy_thread()
+    start_copy(piclist[:pic_end], groups[groups_start:groups_end], dest_folder, args.workers, not args.no_hash)
@@ -7,6 +7,7 @@ import os, sys, datetime
 #from datetime import datetime
 from dateutil.tz import tzlocal
 from lib.exif_read import ExifRead as EXIF
+from lib.exif_cache import ExifCache
 from lib.exif_write import ExifEdit
 
 def print_list(list):
@@ -25,18 +26,14 @@ def list_images(directory):
 
     files = []
     # get DateTimeOriginal data from the images and sort the list by timestamp
-    for filepath in file_list:
-        metadata = EXIF(filepath)
-        #metadata.read()
-        try:
-            t = metadata.extract_capture_time()
-            #print(t)
-            #print(type(t))
-            #s = metadata["Exif.Photo.SubSecTimeOriginal"].value
-            files.append((filepath, t))
-        except KeyError as e:
-            # if any of the required tags are not set the image is not added to the list
-            print("Skipping {0}: {1}".format(filename, e))
+    with ExifCache(directory) as exif_cache:
+        for filepath in file_list:
+            try:
+                t = exif_cache.read(filepath, EXIF).capture_time
+                files.append((filepath, t))
+            except KeyError as e:
+                # if any of the required tags are not set the image is not added to the list
+                print("Skipping {0}: {1}".format(filepath, e))
     
     files.sort(key=lambda timestamp: timestamp[1])
     #print_list(files)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import datetime
+from collections import namedtuple
+
+'''
+On-disk cache of the exif metadata, stored in a sqlite file inside the session folder.
+Each record is keyed on the file path, and is only used if the file size and
+modification time didn't change since it was stored.
+
+The same module is used by correlate (correlate/lib/exif_cache.py) and by the scripts
+(scripts/lib/exif_cache.py), as these folders are run on their own. Both copies must stay
+identical, a change of the cache key or of the table must be made in both.
+'''
+
+CACHE_FILENAME = ".exif_cache.sqlite"
+
+Exif_infos = namedtuple('Exif_infos', ['capture_time', 'subsec', 'latitude', 'longitude', 'altitude', 'direction'])
+
+
+def exif_infos_from_exif(metadata):
+    '''
+    Extract the cached values from an ExifRead object
+    '''
+    capture_time = metadata.extract_capture_time()
+    geo = metadata.extract_geo()
+    return Exif_infos(capture_time=capture_time or None,
+                      subsec=metadata.extract_subsec(),
+                      latitude=geo.get("latitude"),
+                      longitude=geo.get("longitude"),
+                      altitude=geo.get("altitude"),
+                      direction=metadata.extract_direction())
+
+
+class ExifCache(object):
+    '''
+    Exif metadata cache for the images of a session folder
+    '''
+
+    def __init__(self, directory, filename=CACHE_FILENAME):
+        '''
+        Open (or create) the cache file in directory.
+        If the directory isn't writable, the cache is kept in memory.
+        '''
+        self.path = os.path.join(directory, filename)
+        try:
+            self._db = sqlite3.connect(self.path)
+            self._create_table()
+        except sqlite3.Error as e:
+            print("Can't open the exif cache {0}: {1}, using a memory cache".format(self.path, e))
+            self.path = ":memory:"
+            self._db = sqlite3.connect(self.path)
+            self._create_table()
+        self.hits = 0
+        self.misses = 0
+
+    def _create_table(self):
+        self._db.execute("CREATE TABLE IF NOT EXISTS exif ("
+                         "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, "
+                         "capture_time TEXT, subsec TEXT, latitude REAL, longitude REAL, "
+                         "altitude REAL, direction REAL)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, filepath):
+        '''
+        Return the cached Exif_infos of a file, or None if the file isn't in the cache
+        or has changed since.
+        '''
+        stat = os.stat(filepath)
+        row = self._db.execute("SELECT size, mtime, capture_time, subsec, latitude, longitude, altitude, direction "
+                               "FROM exif WHERE path = ?", (os.path.abspath(filepath),)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            self.misses += 1
+            return None
+        self.hits += 1
+        capture_time = datetime.datetime.fromisoformat(row[2]) if row[2] is not None else None
+        return Exif_infos(capture_time, *row[3:])
+
+    def put(self, filepath, exif_infos):
+        '''
+        Store the Exif_infos of a file
+        '''
+        stat = os.stat(filepath)
+        capture_time = exif_infos.capture_time.isoformat() if exif_infos.capture_time is not None else None
+        self._db.execute("INSERT OR REPLACE INTO exif VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns, capture_time,
+                          *exif_infos[1:]))
+
+    def read(self, filepath, reader):
+        '''
+        Return the Exif_infos of a file, from the cache if it's up to date, or read
+        with reader (an ExifRead class) and stored in the cache.
+        '''
+        exif_infos = self.get(filepath)
+        if exif_infos is None:
+            exif_infos = exif_infos_from_exif(reader(filepath))
+            self.put(filepath, exif_infos)
+        return exif_infos
+
+    def close(self):
+        '''
+        Save the new records and close the cache file
+        '''
+        if self.hits or self.misses:
+            print("Exif cache: {0} up to date, {1} read from the images".format(self.hits, self.misses))
+        self._db.commit()
+        self._db.close()
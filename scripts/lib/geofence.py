@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from shapely.strtree import STRtree
+
+'''
+Geofence polygons loaded from a geojson file, with an STRtree spatial index and prepared
+geometries, so finding the polygon of a point doesn't need to check every polygon.
+'''
+
+
+class Geofence(object):
+    '''
+    The polygons of a geofence, with their name.
+
+    It can be used like the dict {name: shape} of the first versions of photo_filter. The polygons
+    with the same name are merged in a single shape: find and classify search all of them, the dict
+    kept only the last one.
+    '''
+
+    def __init__(self, names, shapes):
+        self.names = list(names)
+        self.shapes = np.array(shapes, dtype=object)
+        shapely.prepare(self.shapes)
+        self.tree = STRtree(self.shapes)
+        self._by_name = {}
+        for name, polygon in zip(self.names, self.shapes):
+            self._by_name.setdefault(name, []).append(polygon)
+        for name, polygons in self._by_name.items():
+            if len(polygons) == 1:
+                self._by_name[name] = polygons[0]
+            else:
+                self._by_name[name] = shapely.union_all(polygons)
+                shapely.prepare(self._by_name[name])
+
+    @classmethod
+    def from_geojson(cls, geojson_file, properties_key):
+        '''
+        Create the geofence from a geojson file
+        :param properties_key: the property used as the name of the polygons
+        '''
+        with open(geojson_file) as f:
+            features = json.load(f)["features"]
+        return cls([feature["properties"][properties_key] for feature in features],
+                   [shape(feature["geometry"]) for feature in features])
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def __iter__(self):
+        return iter(self._by_name)
+
+    def __getitem__(self, name):
+        return self._by_name[name]
+
+    def find(self, point, first_check=None):
+        '''
+        Find the polygon containing a point
+        :param point: a shapely Point
+        :param first_check: the name of the polygon to check first (the polygon of the previous
+        point, as the next point will probably be in the same one)
+        :return: the polygon name, or None
+        '''
+        if first_check is not None and self[first_check].contains(point):
+            return first_check
+        # the tree only checks the bounding boxes, the polygons are prepared for contains
+        candidates = self.tree.query(point)
+        candidates = candidates[shapely.contains(self.shapes[candidates], point)]
+        if len(candidates) == 0:
+            return None
+        return self.names[candidates.min()]
+
+    def classify(self, lon, lat):
+        '''
+        Find the polygon containing each point of an array
+        :param lon: array of longitudes
+        :param lat: array of latitudes, nan for the points without location
+        :return: an int array with the index of the polygon (in self.names) of each point, -1 outside
+        of the geofence. When polygons overlap, the first one of the file is used.
+        '''
+        lon = np.asarray(lon, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+        result = np.full(len(lon), len(self.shapes), dtype=np.int64)
+        located = np.flatnonzero(~np.isnan(lon) & ~np.isnan(lat))
+        if len(located) and len(self.shapes):
+            points = shapely.points(lon[located], lat[located])
+            # a query with a predicate would prepare the points, not the polygons: the tree only checks
+            # the bounding boxes, then the prepared polygons check the candidates
+            point_idx, shape_idx = self.tree.query(points)
+            inside = shapely.contains(self.shapes[shape_idx], points[point_idx])
+            np.minimum.at(result, located[point_idx[inside]], shape_idx[inside])
+        result[result == len(self.shapes)] = -1
+        return result
+
+    def contains(self, lon, lat):
+        '''
+        :return: a boolean array, True for the points inside the geofence
+        '''
+        return self.classify(lon, lat) >= 0
@@ -0,0 +1,173 @@
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+
+from copy_pic import Manifest, rename_and_copy_pic, copy_file, open_copy, verify_manifest, MANIFEST_FILENAME, \
+    stream_groups, OutOfOrderError, cards_size
+
+"""Initialize all the neccessary data"""
+
+PICTURE_TIME = datetime.datetime(2017, 2, 1, 11, 21, 10)
+GROUP_PATH = PICTURE_TIME.strftime("%Y-%m-%d_%HH%Mmn%Ss")
+
+
+class ManifestTests(unittest.TestCase):
+    """tests for the copy manifest, and the resume of an interrupted copy"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.source_dir = os.path.join(self.tmp_dir, "front", "DCIM")
+        self.dest_folder = os.path.join(self.tmp_dir, "dest")
+        os.makedirs(self.source_dir)
+        os.makedirs(self.dest_folder)
+        self.source = os.path.join(self.source_dir, "YDXJ0025.jpg")
+        with open(self.source, "wb") as f:
+            f.write(os.urandom(100000))
+        self.picture = ["front", self.source, PICTURE_TIME]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def copy(self):
+        manifest = Manifest(self.dest_folder)
+        size = rename_and_copy_pic(self.picture, GROUP_PATH, self.dest_folder, manifest)
+        manifest.close()
+        return size
+
+    def destination(self):
+        manifest = Manifest(self.dest_folder)
+        record = manifest.copied("front", self.source, os.stat(self.source))
+        return os.path.join(self.dest_folder, record["destination"])
+
+    def assert_same_content(self, path1, path2):
+        with open(path1, "rb") as f1, open(path2, "rb") as f2:
+            self.assertEqual(f1.read(), f2.read())
+
+    def test_resume_skip(self):
+
+        self.assertEqual(self.copy(), 100000)
+        self.assertEqual(self.copy(), 0)
+        # the copy was hashed by the second run, the third one uses the verification record
+        manifest = Manifest(self.dest_folder)
+        record = manifest.copied("front", self.source, os.stat(self.source))
+        self.assertEqual(manifest.verified[record["destination"]], record["hash"])
+        self.assertEqual(self.copy(), 0)
+
+    def test_size_mismatch(self):
+
+        self.copy()
+        destination = self.destination()
+        with open(destination, "r+b") as f:
+            f.truncate(5000)
+
+        self.assertEqual(self.copy(), 100000)
+        self.assert_same_content(self.source, destination)
+
+    def test_corrupted_copy_not_skipped(self):
+
+        self.copy()
+        destination = self.destination()
+        with open(destination, "r+b") as f:
+            data = f.read(1)
+            f.seek(0)
+            f.write(bytes([data[0] ^ 0xff]))
+
+        self.assertEqual(self.copy(), 100000)
+        self.assert_same_content(self.source, destination)
+
+    def test_truncated_last_line(self):
+
+        self.copy()
+        # interrupted while writing a line
+        with open(os.path.join(self.dest_folder, MANIFEST_FILENAME), "a") as f:
+            f.write('{"cam": "front", "source": "/media/front/DCIM/YDX')
+
+        manifest = Manifest(self.dest_folder)
+        self.assertEqual(len(manifest.copies), 1)
+        self.assertEqual(self.copy(), 0)
+
+    def test_verify_manifest(self):
+
+        self.copy()
+        self.assertEqual(verify_manifest(self.dest_folder, workers=1), [])
+
+        destination = self.destination()
+        with open(destination, "r+b") as f:
+            f.seek(50000)
+            f.write(b"corrupted")
+        self.assertEqual(verify_manifest(self.dest_folder, workers=1),
+                         [os.path.relpath(destination, self.dest_folder)])
+        # a copy which failed the verification isn't skipped
+        self.assertEqual(self.copy(), 100000)
+        self.assertEqual(verify_manifest(self.dest_folder, workers=1), [])
+
+    def test_moved_to_another_group(self):
+
+        self.copy()
+        old_destination = self.destination()
+        manifest = Manifest(self.dest_folder)
+        self.assertEqual(rename_and_copy_pic(self.picture, "2017-02-01_11H00mn00s", self.dest_folder, manifest), 0)
+        manifest.close()
+
+        destination = self.destination()
+        self.assertNotEqual(destination, old_destination)
+        self.assert_same_content(self.source, destination)
+        self.assertFalse(os.path.exists(os.path.join(self.dest_folder, GROUP_PATH)))
+        self.assertEqual(verify_manifest(self.dest_folder, workers=1), [])
+
+    def test_cards_size(self):
+
+        with open(os.path.join(self.source_dir, "YDXJ0026.jpg"), "wb") as f:
+            f.write(os.urandom(5000))
+        drivelist = [[os.path.join(self.tmp_dir, "front"), "front"]]
+        self.assertEqual(cards_size(drivelist), {"front": 105000})
+        # the pictures already copied aren't counted
+        self.copy()
+        self.assertEqual(cards_size(drivelist, Manifest(self.dest_folder)), {"front": 5000})
+
+    def test_source_error_keeps_destination(self):
+
+        destination = os.path.join(self.dest_folder, "picture.jpg")
+        shutil.copy(self.source, destination)
+        with self.assertRaises(OSError):
+            copy_file(os.path.join(self.source_dir, "missing.jpg"), destination)
+        self.assertTrue(os.path.exists(destination))
+
+    def test_interrupted_copy_removed(self):
+
+        destination = os.path.join(self.dest_folder, "picture.jpg")
+
+        def failing_write(fsrc, fdst):
+            fdst.write(fsrc.read(10))
+            raise OSError("read error")
+
+        with self.assertRaises(OSError):
+            with open_copy(self.source, destination) as (fsrc, fdst):
+                failing_write(fsrc, fdst)
+        self.assertFalse(os.path.exists(destination))
+
+
+class StreamGroupsTests(unittest.TestCase):
+    """tests for the groups made on the stream of pictures"""
+
+    def pictures(self, seconds):
+        return [["front", "YDXJ{0:04d}.jpg".format(i), PICTURE_TIME + datetime.timedelta(seconds=second)]
+                for i, second in enumerate(seconds)]
+
+    def test_groups(self):
+
+        groups = [group_path for picture, group_path in stream_groups(self.pictures([0, 1, 2, 40, 41, 100]), 10)]
+        self.assertEqual(groups, [GROUP_PATH] * 3 + ["2017-02-01_11H21mn50s"] * 2 + ["2017-02-01_11H22mn50s"])
+        groups = [group_path for picture, group_path in stream_groups(self.pictures([0, 1, 2, 40, 41, 100]), 10, 2, 2)]
+        self.assertEqual(groups, ["2017-02-01_11H21mn50s"] * 2)
+
+    def test_out_of_order(self):
+
+        with self.assertRaises(OutOfOrderError):
+            list(stream_groups(self.pictures([0, 1, 40, 2, 41]), 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from shapely.geometry import Point, box
+
+from lib.geofence import Geofence
+
+"""Initialize all the neccessary data"""
+
+# two overlapping squares, and a third one split in two polygons with the same name
+NAMES = ["west", "center", "east", "east"]
+SHAPES = [box(0, 0, 2, 2), box(1, 0, 3, 2), box(5, 0, 6, 2), box(6, 0, 7, 2)]
+
+
+class GeofenceTests(unittest.TestCase):
+    """tests for the geofence polygons"""
+
+    def setUp(self):
+        self.geofence = Geofence(NAMES, SHAPES)
+
+    def test_classify(self):
+
+        lon = [0.5, 1.5, 2.5, 5.5, 6.5, 4.0, np.nan, 0.5]
+        lat = [1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, np.nan]
+        # the first polygon is used when they overlap, -1 outside or without location
+        np.testing.assert_array_equal(self.geofence.classify(lon, lat), [0, 0, 1, 2, 3, -1, -1, -1])
+        np.testing.assert_array_equal(self.geofence.contains(lon, lat),
+                                      [True, True, True, True, True, False, False, False])
+
+    def test_classify_empty(self):
+
+        self.assertEqual(len(self.geofence.classify([], [])), 0)
+        np.testing.assert_array_equal(Geofence([], []).classify([1.0], [1.0]), [-1])
+
+    def test_find(self):
+
+        self.assertEqual(self.geofence.find(Point(1.5, 1)), "west")
+        self.assertEqual(self.geofence.find(Point(1.5, 1), first_check="center"), "center")
+        self.assertEqual(self.geofence.find(Point(0.5, 1), first_check="center"), "west")
+        self.assertEqual(self.geofence.find(Point(6.5, 1)), "east")
+        self.assertIsNone(self.geofence.find(Point(4, 1)))
+
+    def test_duplicate_names(self):
+
+        self.assertEqual(len(self.geofence), 3)
+        self.assertEqual(list(self.geofence), ["west", "center", "east"])
+        # the polygon of a name contains all the points found in it
+        for lon in (5.5, 6.5):
+            point = Point(lon, 1)
+            self.assertTrue(self.geofence[self.geofence.find(point)].contains(point))
+
+    def test_from_geojson(self):
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            geojson_file = os.path.join(tmp_dir, "geofence.geojson")
+            with open(geojson_file, "w") as f:
+                json.dump({"type": "FeatureCollection",
+                           "features": [{"type": "Feature", "properties": {"name": name}, "geometry": polygon.__geo_interface__}
+                                        for name, polygon in zip(NAMES, SHAPES)]}, f)
+            geofence = Geofence.from_geojson(geojson_file, "name")
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertEqual(geofence.names, NAMES)
+        np.testing.assert_array_equal(geofence.classify([2.5], [1.0]), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import datetime
+import unittest
+
+import numpy as np
+from shapely.geometry import Point, box
+
+from lib.geofence import Geofence
+from photo_filter import Picture_infos, ComputeDist, find_polygon, filter_images, duplicate_mask, enclosing_mask
+
+"""Initialize all the neccessary data"""
+
+DUPLICATE_DISTANCE = 0.5
+MAX_TURN_ANGLE = 80
+TRAILING_PICS = 10
+AREAS = {"north": box(-1.6790, 48.1190, -1.6750, 48.1200), "center": box(-1.6780, 48.1170, -1.6760, 48.1180)}
+
+
+def reference_filter(images_list, duplicate_distance, max_turn_angle, trailing_pics, area_dict=None):
+    """The loop of the first versions of photo_filter.main, with a dict of polygons"""
+    prev_lat = 0
+    prev_long = 0
+    prev_direction = images_list[0].ImgDirection
+    previous_area = None
+    duplicate_list = []
+    geofence_list = []
+    reverse_list = []
+    for i, image in enumerate(images_list):
+        current_lat = image.Latitude
+        current_long = image.Longitude
+        current_direction = image.ImgDirection
+        img_distance = ComputeDist(prev_lat, prev_long, current_lat, current_long)
+        if img_distance < duplicate_distance:
+            duplicate_list.append(image)
+            continue
+        prev_lat = current_lat
+        prev_long = current_long
+        if area_dict is not None:
+            area = find_polygon(Point(image.Longitude, image.Latitude), area_dict, previous_area)
+            if area is not None:
+                previous_area = area
+                geofence_list.append(image)
+                continue
+        if abs((current_direction - prev_direction + 180) % 360 - 180) > max_turn_angle:
+            try:
+                for idx in range(trailing_pics):
+                    if i-2+idx >= 0 and images_list[i-2+idx] not in reverse_list:
+                        reverse_list.append(images_list[i-2+idx])
+            except IndexError:
+                pass
+        prev_direction = current_direction
+    return duplicate_list, geofence_list, reverse_list
+
+
+def make_images(seed, count=400):
+    """A random track: runs of duplicates, images without location and sharp turns, up to the last images"""
+    rng = np.random.RandomState(seed)
+    lat, lon, direction = 48.1170, -1.6790, 0.0
+    start = datetime.datetime(2018, 6, 15, 8, 0, 0)
+    images = []
+    for i in range(count):
+        step = rng.choice([0, 0.1, 1, 3, 5], p=[0.1, 0.15, 0.05, 0.35, 0.35])
+        if rng.rand() < 0.08 or i >= count - 3:
+            direction = (direction + rng.choice([-1, 1]) * rng.uniform(60, 180)) % 360
+        else:
+            direction = (direction + rng.uniform(-10, 10)) % 360
+        lat += step * np.cos(np.radians(direction)) / 111000
+        lon += step * np.sin(np.radians(direction)) / 74000
+        located = rng.rand() > 0.05
+        images.append(Picture_infos(path="/tmp/pic{0:04d}.jpg".format(i),
+                                    DateTimeOriginal=start + datetime.timedelta(seconds=i), SubSecTimeOriginal=None,
+                                    Longitude=float(lon) if located else None, Latitude=float(lat) if located else None,
+                                    Ele=None, ImgDirection=float(direction)))
+    return images
+
+
+class FilterImagesTests(unittest.TestCase):
+    """tests for the vectorized filters, against the loop of the first versions"""
+
+    def assert_same_filter(self, images, area_dict=None, geofence=None):
+        expected = reference_filter(images, DUPLICATE_DISTANCE, MAX_TURN_ANGLE, TRAILING_PICS, area_dict)
+        result = filter_images(images, DUPLICATE_DISTANCE, MAX_TURN_ANGLE, TRAILING_PICS, geofence)
+        self.assertEqual(result[0], expected[0])
+        self.assertEqual(result[1], expected[1])
+        # the reference list is in the turns order
+        self.assertEqual(result[2], sorted(expected[2], key=lambda image: image.path))
+
+    def test_random_tracks(self):
+
+        for seed in range(20):
+            images = make_images(seed)
+            self.assert_same_filter(images)
+            self.assert_same_filter(images, AREAS, Geofence(list(AREAS), list(AREAS.values())))
+
+    def test_no_location(self):
+
+        images = make_images(0, 20)
+        images = [image._replace(Latitude=None, Longitude=None) if 5 <= i < 9 or i == 19 else image
+                  for i, image in enumerate(images)]
+        self.assert_same_filter(images)
+        self.assertEqual(duplicate_mask(np.array([48.1, np.nan]), np.array([-1.6, -1.6]), 0.5).tolist(), [False, True])
+
+    def test_duplicate_runs(self):
+
+        images = make_images(1, 30)
+        # the images 10 to 19 don't move, the image 20 is 0.3 m away from the image 9
+        images = [image._replace(Latitude=images[9].Latitude + (0.3 / 111000 if i == 20 else 0),
+                                 Longitude=images[9].Longitude) if 10 <= i <= 20 else image
+                  for i, image in enumerate(images)]
+        self.assert_same_filter(images)
+        duplicate, geofence, reverse = filter_images(images, DUPLICATE_DISTANCE, MAX_TURN_ANGLE, TRAILING_PICS)
+        self.assertEqual([image.path for image in duplicate if image in images[10:21]],
+                         [image.path for image in images[10:21]])
+
+    def test_turn_at_the_end(self):
+
+        images = make_images(2, 15)
+        images = [image._replace(ImgDirection=0.0) for image in images]
+        images[-1] = images[-1]._replace(ImgDirection=180.0)
+        self.assert_same_filter(images)
+        self.assertEqual(enclosing_mask(np.array([14]), TRAILING_PICS).tolist(), [False] * 12 + [True] * 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,7 @@ import math
 import argparse
 import csv
 from exif_read import ExifRead as EXIFRead
+from lib.exif_cache import ExifCache
 from collections import namedtuple
 
 Master_Picture_infos = namedtuple('Picture_infos', ['path', 'DateTimeOriginal', 'SubSecTimeOriginal', 'Latitude', 'Longitude', 'Ele', 'ImgDirection'])
@@ -39,24 +40,21 @@ def get_image_list(path_to_pics):
 
         files = []
         # get DateTimeOriginal data from the images and sort the list by timestamp
-        for filepath in file_list:
-            #print(filepath)
-            metadata = EXIFRead(filepath)
-            try:
-                t = metadata.extract_capture_time()
-                s = int(t.microsecond / 1000000)
-                geo = metadata.extract_geo()
-                lat = geo.get("latitude")
-                lon = geo.get("longitude")
-                ele = geo.get("altitude")
-                direction = metadata.extract_direction()
-                files.append(Picture_infos._replace(path=filepath, DateTimeOriginal = t, SubSecTimeOriginal = s,
-                                                                Latitude = lat, Longitude = lon, Ele = ele, ImgDirection = direction))
-                # print t
-                # print type(t)
-            except KeyError as e:
-                # if any of the required tags are not set the image is not added to the list
-                print("Skipping {0}: {1}".format(filepath, e))
+        with ExifCache(path_to_pics) as exif_cache:
+            for filepath in file_list:
+                #print(filepath)
+                try:
+                    metadata = exif_cache.read(filepath, EXIFRead)
+                    t = metadata.capture_time
+                    s = int(t.microsecond / 1000000)
+                    files.append(Picture_infos._replace(path=filepath, DateTimeOriginal = t, SubSecTimeOriginal = s,
+                                                                    Latitude = metadata.latitude, Longitude = metadata.longitude,
+                                                                    Ele = metadata.altitude, ImgDirection = metadata.direction))
+                    # print t
+                    # print type(t)
+                except KeyError as e:
+                    # if any of the required tags are not set the image is not added to the list
+                    print("Skipping {0}: {1}".format(filepath, e))
 
         files.sort(key=lambda file: file.DateTimeOriginal)
         # print_list(files)
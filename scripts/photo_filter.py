@@ -9,8 +9,10 @@ from math import sin, cos, sqrt, atan2, asin, radians
 from dateutil.tz import tzlocal
 import time
 from lib_temp.exif_read import ExifRead as EXIF
+from lib.exif_cache import ExifCache
+from lib.geofence import Geofence
 import json
-from shapely.geometry import Point, GeometryCollection, shape
+import numpy as np
 from collections import namedtuple
 import xml.etree.ElementTree as ET
 import urllib.request, urllib.parse, urllib.error
@@ -89,25 +91,20 @@ def list_images(directory):
 
     files = []
     # get DateTimeOriginal data from the images and sort the list by timestamp
-    for filepath in file_list:
-        metadata = EXIF(filepath)
-        #metadata.read()
-        try:
-            t = metadata.extract_capture_time()
-            lon, lat = metadata.extract_lon_lat()
-            img_direction = metadata.extract_direction()
-            #print(filepath, lon, lat)
-            #print(type(t))
-            #s = metadata["Exif.Photo.SubSecTimeOriginal"].value
-            files.append(Picture_infos(path=filepath, DateTimeOriginal = t,
-                                                                SubSecTimeOriginal = None,
-                                                                Latitude = lat,
-                                                                Longitude = lon,
-                                                                Ele = None,
-                                                                ImgDirection = img_direction))
-        except KeyError as e:
-            # if any of the required tags are not set the image is not added to the list
-            print("Skipping {0}: {1}".format(filepath, e))
+    with ExifCache(directory) as exif_cache:
+        for filepath in file_list:
+            try:
+                metadata = exif_cache.read(filepath, EXIF)
+                #print(filepath, lon, lat)
+                files.append(Picture_infos(path=filepath, DateTimeOriginal = metadata.capture_time,
+                                                                    SubSecTimeOriginal = None,
+                                                                    Latitude = metadata.latitude,
+                                                                    Longitude = metadata.longitude,
+                                                                    Ele = None,
+                                                                    ImgDirection = metadata.direction))
+            except KeyError as e:
+                # if any of the required tags are not set the image is not added to the list
+                print("Skipping {0}: {1}".format(filepath, e))
     
     files.sort(key=lambda file: file.DateTimeOriginal)
     #print_list(files)
@@ -115,19 +112,10 @@ def list_images(directory):
 
 def import_geojson(geojson_file, properties_key):
     """
-    import the geojson file and create a dict with the commune's name as the key
-    and a shape object as the value
+    import the geojson file and create a Geofence object, with the commune's name as the key
+    and a shape object as the value, and a spatial index
     """
-    with open(geojson_file) as f:
-        features = json.load(f)["features"]
-    GeometryCollection([shape(feature["geometry"]).buffer(0) for feature in features])
-    areas = {}
-    for feature in features:
-        area_name = feature["properties"][properties_key]
-        area_shape = shape(feature["geometry"])
-        areas[area_name] = area_shape
-
-    return areas
+    return Geofence.from_geojson(geojson_file, properties_key)
 
 
 def check_point_in_polygon(point, area_shape):
@@ -140,6 +128,9 @@ def find_polygon(point, area_shapes, first_check=None):
     find outer polygon for each image (store the previous correct polygon to speed up calculation
      time as the next image will probably be in the same one)
     """
+    if isinstance(area_shapes, Geofence):
+        return area_shapes.find(point, first_check)
+
     if first_check is not None:
         if check_point_in_polygon(point, area_shapes[first_check]):
             return first_check
@@ -182,6 +173,81 @@ def ComputeDist(PLat, PLon, CLat, CLon):
         print("   !!! ComputeDist EXCEPT [%s] " % e)
     return dDST
 
+def compute_dist_array(PLat, PLon, CLat, CLon):
+    """
+    ComputeDist on numpy arrays: distance in meters between the points (PLat, PLon) and (CLat, CLon)
+    """
+    rEquateur = 6378.137
+    rPole =     6356.752
+    CLat = np.asarray(CLat, dtype=float)
+    radius = rPole + (CLat * (rEquateur - rPole) / 90)
+    CLon, CLat, PLon, PLat = (np.radians(np.asarray(value, dtype=float)) for value in (CLon, CLat, PLon, PLat))
+    a = np.sin((CLat - PLat) / 2) ** 2 + np.cos(CLat) * np.cos(PLat) * np.sin((CLon - PLon) / 2) ** 2
+    return radius * 2 * np.arcsin(np.sqrt(a)) * 1000
+
+def duplicate_mask(lat, lon, min_distance):
+    """
+    Find the duplicate images: the images closer than min_distance from the previous image which
+    isn't a duplicate. The images without location are duplicates too.
+    The distances between subsequent images are computed at once, the distances from the last
+    kept image are only computed again inside the series of close images.
+    :param lat: array of latitudes, nan without location
+    :param lon: array of longitudes, nan without location
+    :return: a boolean array, True for the duplicates
+    """
+    duplicate = np.isnan(lat) | np.isnan(lon)
+    located = np.flatnonzero(~duplicate)
+    lat, lon = lat[located], lon[located]
+    # distance from the previous image (from 0, 0 for the first one)
+    prev_lat = np.concatenate(([0], lat[:-1]))
+    prev_lon = np.concatenate(([0], lon[:-1]))
+    close = np.flatnonzero(compute_dist_array(prev_lat, prev_lon, lat, lon) < min_distance)
+    close_dup = np.zeros(len(located), dtype=bool)
+    lat, lon = lat.tolist(), lon.tolist()
+    # index of the first image after the last series of duplicates
+    j = 0
+    for start in close.tolist():
+        if start < j:
+            # already checked
+            continue
+        # the previous image isn't a duplicate
+        anchor_lat, anchor_lon = (lat[start - 1], lon[start - 1]) if start > 0 else (0, 0)
+        j = start
+        while j < len(lat) and ComputeDist(anchor_lat, anchor_lon, lat[j], lon[j]) < min_distance:
+            close_dup[j] = True
+            j += 1
+        # the image j is kept, the next one is compared with it
+        j += 1
+    duplicate[located[close_dup]] = True
+    return duplicate
+
+def turn_mask(direction, first_direction, max_turn_angle):
+    """
+    Find the sharp turns: the images with a direction too different from the previous one
+    :param direction: array of the images directions
+    :param first_direction: the direction to compare the first image with
+    :return: a boolean array
+    """
+    prev_direction = np.concatenate(([first_direction], direction[:-1]))
+    with np.errstate(invalid="ignore"):
+        return np.abs((direction - prev_direction + 180) % 360 - 180) > max_turn_angle
+
+def enclosing_mask(turns, count, before=2):
+    """
+    Select the images around each turn: before images before the turn, and count - before
+    images from the turn
+    :param turns: array of the turns indices
+    :param count: the number of images to select for each turn
+    :return: a boolean array, up to the last selected index (it can be longer than the images list)
+    """
+    starts = np.maximum(turns - before, 0)
+    ends = turns - before + count
+    starts, ends = starts[ends > starts], ends[ends > starts]
+    bounds = np.zeros((ends.max() if len(ends) else 0) + 1, dtype=np.int64)
+    np.add.at(bounds, starts, 1)
+    np.add.at(bounds, ends, -1)
+    return np.cumsum(bounds)[:-1] > 0
+
 def ConvertDMS_DDD(pos):
     dd = float(pos[0]) + float(pos[1])/60 + float(pos[2])/(60*60)
     return dd
@@ -306,55 +372,49 @@ def open_session_in_josm(session_file_path, remote_port=8111):
         return False
     return True
 
+def filter_images(images_list, duplicate_distance, max_turn_angle, trailing_pics, area_dict=None):
+    """
+    Find the duplicate images, the images inside the geofence, and the images around the sharp turns
+    :param images_list: a list of Picture_infos namedtuple, sorted by time
+    :param area_dict: the Geofence object, or None
+    :return: the lists of the duplicate images, the images inside the geofence and the images around the turns
+    """
+    lat = np.array([np.nan if image.Latitude is None else image.Latitude for image in images_list], dtype=float)
+    lon = np.array([np.nan if image.Longitude is None else image.Longitude for image in images_list], dtype=float)
+    direction = np.array([np.nan if image.ImgDirection is None else image.ImgDirection for image in images_list], dtype=float)
+    #Check distance between images
+    duplicate = duplicate_mask(lat, lon, duplicate_distance)
+    #Check geofence
+    geofence = np.zeros(len(images_list), dtype=bool)
+    if area_dict is not None:
+        remaining = np.flatnonzero(~duplicate)
+        geofence[remaining] = area_dict.contains(lon[remaining], lat[remaining])
+    #Check angle
+    remaining = np.flatnonzero(~duplicate & ~geofence)
+    first_direction = np.nan if images_list[0].ImgDirection is None else images_list[0].ImgDirection
+    turns = remaining[turn_mask(direction[remaining], first_direction, max_turn_angle)]
+    enclosing = enclosing_mask(turns, trailing_pics)
+    if len(enclosing) > len(images_list):
+        print("Info: no more image available")
+
+    duplicate_list = [images_list[i] for i in np.flatnonzero(duplicate)]
+    geofence_list = [images_list[i] for i in np.flatnonzero(geofence)]
+    reverse_list = [images_list[i] for i in np.flatnonzero(enclosing[:len(images_list)])]
+    return duplicate_list, geofence_list, reverse_list
+
 def main(path):
-    trailing_pics = 10
+    area_dict = None
     if args.json_file is not None:
         area_dict = import_geojson(args.json_file, "name")
         print("{} polygons loaded".format(len(area_dict)))
-        previous_area = None
-        geofence_list = []
     #print(area_dict)
     images_list=list_images(path)
     print("{} images found".format(len(images_list)))
     if len(images_list) == 0:
         return
     #print("type path is: ", type(path))
-    prev_lat = 0
-    prev_long = 0
-    prev_direction = images_list[0].ImgDirection
-    #pp = pprint.PrettyPrinter()
-    #pp.pprint(images_list)
-    starttime = images_list[0].DateTimeOriginal
-    duplicate_list = []
-    geofence_list = []
-    reverse_list = []
-    for i, image in enumerate(images_list):
-        current_lat = image.Latitude
-        current_long = image.Longitude
-        current_direction = image.ImgDirection
-        #Check distance between images
-        img_distance = ComputeDist(prev_lat, prev_long, current_lat, current_long)
-        if img_distance < args.duplicate_distance:
-            duplicate_list.append(image)
-            continue
-        #Check geofence
-        prev_lat = current_lat
-        prev_long = current_long
-        if args.json_file is not None:
-            area = find_polygon(Point(image.Longitude, image.Latitude), area_dict, previous_area)
-            if area is not None:
-                previous_area = area
-                geofence_list.append(image)
-                continue
-        #Check angle
-        if abs((current_direction - prev_direction + 180) % 360 - 180) > args.max_turn_angle:
-            try:
-                for idx in range(trailing_pics):
-                    if i-2+idx >= 0 and images_list[i-2+idx] not in reverse_list:
-                        reverse_list.append(images_list[i-2+idx])
-            except IndexError:
-                print("Info: no more image available")
-        prev_direction = current_direction
+    duplicate_list, geofence_list, reverse_list = filter_images(images_list, args.duplicate_distance, args.max_turn_angle,
+                                                                args.enclosing_images, area_dict)
 
     print("{} duplicates found".format(len(duplicate_list)))
     print("{} images inside geofence zone".format(len(geofence_list)))